@@ -0,0 +1,89 @@
+"""Email template rendering benchmark for the CRM service.
+
+Composes a mix of every notification email (confirmation, status, facilitator,
+cancellation and waitlist) through the compiled template cache, and through
+a cold path that reads and compiles the templates for every message, which is
+what rendering costs without the cache.
+
+    python backend/benchmarks/email_render_bench.py --messages 10000
+"""
+import argparse
+import contextlib
+import io
+import json
+import os
+import random
+import sys
+import time
+
+CRM_SERVICE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'crm-service')
+
+
+def sample_notifications(count, seed):
+    rng = random.Random(seed)
+    actions = ['payment_completed', 'approved', 'rejected', 'cancelled', 'waitlist_promoted']
+    notifications = []
+    for i in range(count):
+        notifications.append({
+            'booking_id': i + 1,
+            'facilitator_id': rng.randint(1, 50),
+            'action': rng.choice(actions),
+            'payment_deadline': '2026-01-01T10:30:00',
+            'user': {'id': i, 'name': f'Customer <{i}> & Co', 'email': f'customer{i}@example.com'},
+            'event': {'id': i % 200, 'title': f'Workshop "{i % 200}" & Friends'},
+            'facilitator': {'id': 1, 'name': 'Facilitator O\'Neil', 'email': 'facilitator@example.com'}
+        })
+    return notifications
+
+
+def run(label, compose, notifications):
+    started = time.perf_counter()
+    emails = 0
+    size = 0
+    for notification in notifications:
+        for message in compose(notification):
+            emails += 1
+            size += len(message['html']) + len(message['text'])
+    elapsed = time.perf_counter() - started
+    return {
+        'mode': label,
+        'notifications': len(notifications),
+        'emails': emails,
+        'seconds': round(elapsed, 4),
+        'us_per_email': round(elapsed / max(emails, 1) * 1e6, 2),
+        'emails_per_second': round(emails / elapsed) if elapsed else None,
+        'bytes': size
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--messages', type=int, default=10000, help='Notifications to render')
+    parser.add_argument('--seed', type=int, default=7)
+    args = parser.parse_args()
+
+    sys.path.insert(0, CRM_SERVICE_DIR)
+    # The CRM app prints its configuration on import
+    with contextlib.redirect_stdout(io.StringIO()):
+        import app as crm
+        import email_templates
+
+    notifications = sample_notifications(args.messages, args.seed)
+
+    cached = run('compiled', crm.notification_emails, notifications)
+
+    def compose_cold(notification):
+        email_templates._templates = None
+        return crm.notification_emails(notification)
+
+    cold = run('recompiled_per_message', compose_cold, notifications)
+    email_templates._templates = None
+
+    print(json.dumps({
+        'results': [cached, cold],
+        'speedup': round(cold['seconds'] / cached['seconds'], 2) if cached['seconds'] else None
+    }, indent=2))
+
+
+if __name__ == '__main__':
+    main()
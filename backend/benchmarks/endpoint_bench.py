@@ -0,0 +1,615 @@
+"""Latency and query-count benchmark for every booking-api and CRM route.
+
+Seeds a database with generate_data.py at one or more dataset sizes, then
+calls each route of both services in-process through the Flask test client
+and records p50/p95 latency and SQL queries per request. Razorpay order
+creation and the CRM's SMTP connection are replaced by local stubs, and the
+booking API talks to the CRM app served from a thread, so nothing leaves
+the machine.
+
+Results are compared with the baseline saved for the same size in
+--baseline-dir; the run fails when a route's p50 latency regresses by more
+than --threshold (and --min-delta-ms) or it issues more queries than
+before. Routes that look slower are timed a second time and keep the
+better run, so a single noisy sample does not fail the build. The first
+run for a size, or --update-baseline, saves the baseline.
+
+    python backend/benchmarks/endpoint_bench.py
+    python backend/benchmarks/endpoint_bench.py --sizes small,medium --iterations 30
+    python backend/benchmarks/endpoint_bench.py --sizes small --update-baseline
+    python backend/benchmarks/endpoint_bench.py --only /facilitator/ --threshold 0.5
+
+Baselines are machine-specific; compare runs from the same host.
+"""
+import argparse
+import contextlib
+import gc
+import importlib.util
+import io
+import json
+import logging
+import os
+import random
+import smtplib
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import uuid
+from collections import Counter
+from datetime import datetime, timedelta
+
+from load_test import BOOKING_API_DIR, StubRazorpayClient, percentile
+import generate_data
+
+CRM_SERVICE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'crm-service')
+CRM_TOKEN = 'bench-crm-token'
+INTERNAL_TOKEN = 'bench-internal-token'
+PASSWORD = 'bench-password'
+
+SIZES = {
+    'small': {'users': 2_000, 'facilitators': 50, 'events': 300, 'bookings': 10_000, 'notifications': 2_000},
+    'medium': {'users': 20_000, 'facilitators': 200, 'events': 3_000, 'bookings': 100_000, 'notifications': 20_000},
+    'large': {'users': 200_000, 'facilitators': 2_000, 'events': 30_000, 'bookings': 1_000_000, 'notifications': 100_000}
+}
+
+# Enough of Google's discovery document for /login/google to build its redirect
+GOOGLE_METADATA = {
+    'issuer': 'https://accounts.google.com',
+    'authorization_endpoint': 'https://accounts.google.com/o/oauth2/v2/auth',
+    'token_endpoint': 'https://oauth2.googleapis.com/token',
+    'userinfo_endpoint': 'https://openidconnect.googleapis.com/v1/userinfo',
+    'jwks_uri': 'https://www.googleapis.com/oauth2/v3/certs'
+}
+
+
+class StubSMTP:
+    """Stands in for smtplib.SMTP_SSL; accepts every login and message"""
+    sent = 0
+
+    def __init__(self, host='', port=0, *args, **kwargs):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def login(self, user, password):
+        return (235, b'Accepted')
+
+    def send_message(self, message, *args, **kwargs):
+        StubSMTP.sent += 1
+        return {}
+
+    def quit(self):
+        pass
+
+
+class QueryCounter:
+    """Counts SQL statements issued from the benchmarking thread"""
+
+    def __init__(self, engine):
+        from sqlalchemy import event
+        self.count = 0
+        self.thread = threading.get_ident()
+        event.listen(engine, 'before_cursor_execute', self.record)
+
+    def record(self, *args):
+        # Background workers (CRM batching, cache refreshes) are not part of the request
+        if threading.get_ident() == self.thread:
+            self.count += 1
+
+
+def configure_environment(args, workdir):
+    database_url = args.database_url or f"sqlite:///{os.path.join(workdir, 'bench.db')}"
+    metadata_path = os.path.join(workdir, 'google-openid-configuration.json')
+    with open(metadata_path, 'w') as fh:
+        json.dump(GOOGLE_METADATA, fh)
+    os.environ.update({
+        'DATABASE_URL': database_url,
+        'RAZORPAY_KEY_ID': 'rzp_test_bench',
+        'RAZORPAY_KEY_SECRET': 'bench_secret',
+        'CRM_BEARER_TOKEN': CRM_TOKEN,
+        'INTERNAL_API_TOKEN': INTERNAL_TOKEN,
+        'GMAIL_USER': 'bench@bench.test',
+        'GMAIL_PASSWORD': 'bench-password',
+        'OAUTH_METADATA_CACHE': metadata_path,
+        'ARCHIVE_DIR': os.path.join(workdir, 'archive')
+    })
+    os.environ.setdefault('JWT_SECRET_KEY', 'endpoint-bench-secret-key-with-enough-bytes')
+    os.environ.setdefault('FLASK_SECRET_KEY', 'endpoint-bench-flask-secret')
+    return database_url
+
+
+def load_crm_app():
+    """Import crm-service/app.py under its own module name; booking-api already owns `app`"""
+    sys.path.append(os.path.abspath(CRM_SERVICE_DIR))
+    spec = importlib.util.spec_from_file_location('crm_service_app', os.path.join(CRM_SERVICE_DIR, 'app.py'))
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[spec.name] = module
+    spec.loader.exec_module(module)
+    return module
+
+
+def serve_crm(crm):
+    """Serve the CRM app on a local port for the booking API's outgoing calls"""
+    from werkzeug.serving import make_server
+    logging.getLogger('werkzeug').setLevel(logging.ERROR)
+    server = make_server('127.0.0.1', 0, crm.app, threaded=True)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    os.environ['CRM_URL'] = f'http://127.0.0.1:{server.port}/notify'
+    return server
+
+
+def load_booking_app():
+    sys.path.insert(0, os.path.abspath(BOOKING_API_DIR))
+    import razorpay
+    razorpay.Client = StubRazorpayClient
+    from app import app
+    return app
+
+
+def seed(app, size, args):
+    """Generate the dataset for size and rebuild the pre-aggregated tables from it"""
+    from extensions import db
+
+    spec = SIZES[size]
+    with app.app_context():
+        db.drop_all()
+    params = generate_data.build_parser().parse_args([
+        '--database-url', os.environ['DATABASE_URL'],
+        '--users', str(spec['users']),
+        '--facilitators', str(spec['facilitators']),
+        '--events', str(spec['events']),
+        '--bookings', str(spec['bookings']),
+        '--seed', str(args.seed)
+    ])
+    with contextlib.redirect_stderr(io.StringIO()):
+        counts = generate_data.generate(app, params)
+    runner = app.test_cli_runner()
+    for command in ('backfill', 'rebuild-customers'):
+        result = runner.invoke(args=['analytics', command])
+        if result.exit_code:
+            raise RuntimeError(f'analytics {command} failed: {result.output}')
+    return counts
+
+
+def notification(i, facilitator_id, action='confirmed'):
+    return {
+        'booking_id': i, 'facilitator_id': facilitator_id, 'action': action, 'status': 'confirmed',
+        'user': {'id': i, 'name': f'User {i}', 'email': f'user{i}@perf.test'},
+        'event': {'id': i % 1000 + 1, 'title': f'Event {i % 1000 + 1}'},
+        'facilitator': {'id': facilitator_id, 'name': f'Facilitator {facilitator_id}', 'email': f'facilitator{facilitator_id}@perf.test'}
+    }
+
+
+class BookingFixtures:
+    """Users, events and bookings the booking-api cases run against.
+
+    The benchmarked facilitator and customer are the busiest ones in the
+    generated data, so list endpoints see their worst case.
+    """
+
+    def __init__(self, app, client):
+        from extensions import db
+        from models import User, Event, Booking
+        from flask_jwt_extended import create_access_token
+        from werkzeug.security import generate_password_hash
+
+        self.app = app
+        self.client = client
+        self.db = db
+        self.run = uuid.uuid4().hex[:6]
+        self.created = 0
+        with app.app_context():
+            self.facilitator_id, = db.session.query(Event.user_id).join(
+                Booking, Booking.event_id == Event.id
+            ).group_by(Event.user_id).order_by(db.func.count(Booking.id).desc()).first()
+            self.customer_id, = db.session.query(Booking.user_id).group_by(
+                Booking.user_id
+            ).order_by(db.func.count(Booking.id).desc()).first()
+            self.popular_event_id, = db.session.query(Event.id).join(
+                Booking, Booking.event_id == Event.id
+            ).filter(Event.user_id == self.facilitator_id).group_by(Event.id).order_by(
+                db.func.count(Booking.id).desc()
+            ).first()
+            self.customer_name = self.db.session.get(User, self.customer_id).name
+
+            self.login_email = f'login-{self.run}@bench.test'
+            login_user = User(email=self.login_email, name='Login Bench', role='user',
+                              password_hash=generate_password_hash(PASSWORD))  # type: ignore
+            role_user = User(email=f'role-{self.run}@bench.test', name='Role Bench', role='user')  # type: ignore
+            db.session.add_all([login_user, role_user])
+            db.session.commit()
+            self.role_headers = self.headers(create_access_token(identity=str(role_user.id)))
+            self.facilitator = self.headers(create_access_token(identity=str(self.facilitator_id)))
+            self.customer = self.headers(create_access_token(identity=str(self.customer_id)))
+        self.open_event_id = self.new_event(capacity=10 ** 6)
+        self.full_event_id = self.new_event(capacity=1, participants=1)
+
+    @staticmethod
+    def headers(token):
+        return {'Authorization': f'Bearer {token}'}
+
+    def new_customer(self):
+        from models import User
+        from flask_jwt_extended import create_access_token
+        self.created += 1
+        with self.app.app_context():
+            user = User(email=f'bench-{self.run}-{self.created}@bench.test', name=f'Bench {self.created}', role='user')  # type: ignore
+            self.db.session.add(user)
+            self.db.session.commit()
+            return user.id, self.headers(create_access_token(identity=str(user.id)))
+
+    def new_event(self, capacity, participants=0):
+        from models import Event
+        start = datetime.utcnow() + timedelta(days=7)
+        with self.app.app_context():
+            event = Event(
+                title='Bench Event', event_type='session', start_datetime=start,
+                end_datetime=start + timedelta(hours=2), max_participants=capacity,
+                current_participants=participants, price=499.00, currency='INR',
+                user_id=self.facilitator_id
+            )  # type: ignore
+            self.db.session.add(event)
+            self.db.session.commit()
+            return event.id
+
+    def new_booking(self, status='pending', event_id=None):
+        """A booking by a fresh customer on the open event; returns (booking, customer headers)"""
+        from models import Booking, BookingReference, Event
+        user_id, headers = self.new_customer()
+        with self.app.app_context():
+            booking = Booking(
+                booking_reference=f'BK-{uuid.uuid4().hex[:8].upper()}', status=status,
+                payment_status='completed' if status == 'confirmed' else 'pending',
+                user_id=user_id, event_id=event_id or self.open_event_id
+            )  # type: ignore
+            self.db.session.add(booking)
+            self.db.session.flush()
+            self.db.session.add(BookingReference(
+                booking_reference=booking.booking_reference, booking_id=booking.id, booking_created_at=booking.created_at
+            ))  # type: ignore
+            if status == 'confirmed':
+                self.db.session.get(Event, booking.event_id).current_participants += 1
+            self.db.session.commit()
+            return {'id': booking.id, 'reference': booking.booking_reference}, headers
+
+
+def booking_cases(f):
+    """(route, prepare) pairs; prepare(i) sets up state and returns (method, path, request options)"""
+    fac, cust = f.facilitator, f.customer
+
+    def register(i):
+        return 'POST', '/register', {'json': {'email': f'register-{f.run}-{i}@bench.test', 'name': 'Bench', 'password': PASSWORD}}
+
+    def book(i):
+        _, headers = f.new_customer()
+        return 'POST', f'/user/events/{f.open_event_id}/book', {'headers': headers, 'json': {'notes': 'bench'}}
+
+    def confirm(i):
+        _, headers = f.new_customer()
+        return 'POST', f'/user/events/{f.open_event_id}/confirm-booking', {'headers': headers, 'json': {
+            'booking_reference': f'BK-{uuid.uuid4().hex[:8].upper()}', 'payment_id': f'pay_{uuid.uuid4().hex[:14]}'
+        }}
+
+    def cancel(i):
+        booking, headers = f.new_booking('confirmed')
+        return 'PUT', f"/user/bookings/{booking['id']}/cancel", {'headers': headers}
+
+    def webhook(i):
+        booking, _ = f.new_booking('pending')
+        return 'POST', '/razorpay/webhook', {'json': {'event': 'payment.captured', 'payload': {'payment': {'entity': {
+            'id': f'pay_{uuid.uuid4().hex[:14]}', 'notes': {'booking_reference': booking['reference']}
+        }}}}}
+
+    def join_waitlist(i):
+        _, headers = f.new_customer()
+        return 'POST', f'/user/events/{f.full_event_id}/waitlist', {'headers': headers, 'json': {}}
+
+    def leave_waitlist(i):
+        _, headers = f.new_customer()
+        f.client.post(f'/user/events/{f.full_event_id}/waitlist', headers=headers, json={})
+        return 'DELETE', f'/user/events/{f.full_event_id}/waitlist', {'headers': headers}
+
+    def delete_event(i):
+        event_id = f.new_event(capacity=10)
+        for _ in range(3):
+            f.new_booking('confirmed', event_id)
+        return 'DELETE', f'/facilitator/events/{event_id}', {'headers': fac}
+
+    def decide(action):
+        def prepare(i):
+            booking, _ = f.new_booking('pending')
+            return 'PUT', f"/facilitator/bookings/{booking['id']}/{action}", {'headers': fac}
+        return prepare
+
+    def bulk(i):
+        ids = [f.new_booking('pending')[0]['id'] for _ in range(20)]
+        return 'PUT', '/facilitator/bookings/bulk', {'headers': fac, 'json': {'action': 'approve', 'booking_ids': ids}}
+
+    start = datetime.utcnow() + timedelta(days=14)
+    new_event = {
+        'title': 'Bench Event', 'event_type': 'session', 'start_datetime': start.isoformat(),
+        'end_datetime': (start + timedelta(hours=1)).isoformat(), 'max_participants': 20, 'price': 499.0
+    }
+    get = lambda path, headers=None: lambda i: ('GET', path, {'headers': headers or {}})  # noqa: E731
+
+    return [
+        ('GET /', get('/')),
+        ('POST /register', register),
+        ('POST /login', lambda i: ('POST', '/login', {'json': {'email': f.login_email, 'password': PASSWORD}})),
+        ('GET /login/google', get('/login/google')),
+        ('GET /auth/google/callback', None),
+        ('PUT /choose-role', lambda i: ('PUT', '/choose-role', {'headers': f.role_headers, 'json': {'role': 'user'}})),
+        ('GET /me', get('/me', cust)),
+        ('PUT /profile', lambda i: ('PUT', '/profile', {'headers': cust, 'json': {'name': f.customer_name}})),
+        ('GET /events', get('/events', cust)),
+        ('GET /events/<id>', get(f'/events/{f.popular_event_id}', cust)),
+        ('POST /events', lambda i: ('POST', '/events', {'headers': fac, 'json': new_event})),
+        ('GET /user/bookings', get('/user/bookings', cust)),
+        ('POST /user/events/<id>/book', book),
+        ('POST /user/events/<id>/confirm-booking', confirm),
+        ('PUT /user/bookings/<id>/cancel', cancel),
+        ('POST /razorpay/webhook', webhook),
+        ('POST /user/events/<id>/waitlist', join_waitlist),
+        ('DELETE /user/events/<id>/waitlist', leave_waitlist),
+        ('GET /user/waitlist', get('/user/waitlist', cust)),
+        ('GET /facilitator/dashboard', get('/facilitator/dashboard', fac)),
+        ('GET /facilitator/analytics', get('/facilitator/analytics', fac)),
+        ('GET /facilitator/events', get('/facilitator/events', fac)),
+        ('GET /facilitator/events/<id>', get(f'/facilitator/events/{f.popular_event_id}', fac)),
+        ('PUT /facilitator/events/<id>', lambda i: ('PUT', f'/facilitator/events/{f.open_event_id}', {'headers': fac, 'json': {'title': 'Bench Event'}})),
+        ('DELETE /facilitator/events/<id>', delete_event),
+        ('GET /facilitator/bookings', get('/facilitator/bookings', fac)),
+        ('PUT /facilitator/bookings/<id>/approve', decide('approve')),
+        ('PUT /facilitator/bookings/<id>/reject', decide('reject')),
+        ('PUT /facilitator/bookings/bulk', bulk),
+        ('GET /facilitator/bookings/export', get('/facilitator/bookings/export', fac)),
+        ('GET /facilitator/transactions', get('/facilitator/transactions', fac)),
+        ('GET /facilitator/transactions/export', get('/facilitator/transactions/export', fac)),
+        ('GET /facilitator/crm/stats', get('/facilitator/crm/stats', fac)),
+        ('GET /facilitator/crm/customers', get('/facilitator/crm/customers', fac)),
+        ('GET /facilitator/crm/segments', get('/facilitator/crm/segments', fac)),
+        ('GET /facilitator/crm/notification-settings', get('/facilitator/crm/notification-settings', fac)),
+        ('PUT /facilitator/crm/notification-settings', lambda i: ('PUT', '/facilitator/crm/notification-settings', {'headers': fac, 'json': {'mode': 'immediate'}})),
+        ('GET /healthz', get('/healthz')),
+        ('GET /readyz', get('/readyz')),
+        ('GET /internal/pool', get('/internal/pool', BookingFixtures.headers(INTERNAL_TOKEN)))
+    ]
+
+
+def crm_cases(crm, facilitator_id):
+    auth = {'Authorization': f'Bearer {CRM_TOKEN}'}
+    counter = iter(range(10 ** 9, 2 * 10 ** 9))
+
+    def delete_notification(i):
+        stored = crm.store.add(notification(next(counter), facilitator_id))
+        return 'DELETE', f"/notifications/{stored['id']}", {}
+
+    def dead_letter(method, suffix=''):
+        def prepare(i):
+            entry = crm.dead_letters.add({'to': 'bench@bench.test', 'subject': 'Bench', 'html': '<p>Bench</p>', 'text': 'Bench'}, 'bench')
+            return method, f"/dead-letters/{entry['id']}{suffix}", {'headers': auth}
+        return prepare
+
+    def replay_all(i):
+        for _ in range(10):
+            crm.dead_letters.add({'to': 'bench@bench.test', 'subject': 'Bench', 'html': '<p>Bench</p>', 'text': 'Bench'}, 'bench')
+        return 'POST', '/dead-letters/replay', {'headers': auth}
+
+    def clear(i):
+        crm.store.add_many([notification(next(counter), facilitator_id) for _ in range(100)])
+        return 'DELETE', '/notifications/clear', {}
+
+    get = lambda path, headers=None: lambda i: ('GET', path, {'headers': headers or {}})  # noqa: E731
+
+    return [
+        ('GET /healthz', get('/healthz')),
+        ('POST /notify', lambda i: ('POST', '/notify', {'headers': auth, 'json': notification(next(counter), facilitator_id)})),
+        ('POST /notify/batch', lambda i: ('POST', '/notify/batch', {'headers': auth, 'json': [
+            notification(next(counter), facilitator_id) for _ in range(100)
+        ]})),
+        ('GET /notifications', get('/notifications')),
+        ('GET /notifications?facilitator_id', get(f'/notifications?facilitator_id={facilitator_id}')),
+        ('GET /notifications/stream', get(f'/notifications/stream?facilitator_id={facilitator_id}')),
+        ('GET /notifications/count', get(f'/notifications/count?facilitator_id={facilitator_id}')),
+        ('DELETE /notifications/<id>', delete_notification),
+        ('GET /facilitators/<id>/notification-settings', get(f'/facilitators/{facilitator_id}/notification-settings')),
+        ('PUT /facilitators/<id>/notification-settings', lambda i: ('PUT', f'/facilitators/{facilitator_id}/notification-settings', {'headers': auth, 'json': {'mode': 'immediate'}})),
+        ('GET /digests', get('/digests')),
+        ('POST /digests/flush', lambda i: ('POST', '/digests/flush', {'headers': auth})),
+        ('GET /dead-letters', get('/dead-letters', auth)),
+        ('GET /dead-letters/<id>', dead_letter('GET')),
+        ('POST /dead-letters/<id>/replay', dead_letter('POST', '/replay')),
+        ('POST /dead-letters/replay', replay_all),
+        ('DELETE /dead-letters/<id>', dead_letter('DELETE')),
+        ('POST /test-email', lambda i: ('POST', '/test-email', {'json': {'email': 'bench@bench.test'}})),
+        ('GET /test-gmail-auth', get('/test-gmail-auth')),
+        # Last: it empties the store the other cases read
+        ('DELETE /notifications/clear', clear)
+    ]
+
+
+def settle(crm, timeout=10):
+    """Let the CRM's mail thread send what earlier requests queued so it does not compete for CPU"""
+    deadline = time.monotonic() + timeout
+    while crm.mailer.pending() and time.monotonic() < deadline:
+        time.sleep(0.01)
+
+
+def measure(client, cases, args, crm, queries=None, names=None):
+    results = {}
+    for name, prepare in cases:
+        if args.only and args.only not in name or names is not None and name not in names:
+            continue
+        if prepare is None:
+            results[name] = {'skipped': 'needs a live token exchange with Google'}
+            continue
+        gc.collect()
+        latencies = []
+        counts = []
+        statuses = Counter()
+        for i in range(args.warmup + args.iterations):
+            method, path, options = prepare(i)
+            settle(crm)
+            before = queries.count if queries else 0
+            started = time.perf_counter()
+            response = client.open(path, method=method, **options)
+            # Bodies are read in full so streamed exports are timed to their last row; SSE
+            # streams never end, so those are timed to their headers and then closed
+            if response.mimetype != 'text/event-stream':
+                response.get_data()
+            elapsed = time.perf_counter() - started
+            response.close()
+            if i < args.warmup:
+                continue
+            latencies.append(elapsed * 1000)
+            counts.append(queries.count - before if queries else None)
+            statuses[response.status_code] += 1
+        latencies.sort()
+        results[name] = {
+            'status': statuses.most_common(1)[0][0],
+            'p50_ms': round(percentile(latencies, 50), 3),
+            'p95_ms': round(percentile(latencies, 95), 3),
+            'mean_ms': round(statistics.mean(latencies), 3),
+            'queries': int(statistics.median(counts)) if queries else None
+        }
+    return results
+
+
+def compare(results, baseline, threshold, min_delta_ms):
+    """(service, route, description) for every route that got slower or chattier than in baseline"""
+    regressions = []
+    for service, routes in results.items():
+        for name, current in routes.items():
+            previous = baseline.get(service, {}).get(name)
+            if not previous or 'skipped' in current or 'skipped' in previous:
+                continue
+            slower = current['p50_ms'] - previous['p50_ms']
+            if current['p50_ms'] > previous['p50_ms'] * (1 + threshold) and slower > min_delta_ms:
+                regressions.append((service, name, f"p50 {previous['p50_ms']}ms -> {current['p50_ms']}ms"))
+            if current['queries'] is not None and previous.get('queries') is not None and current['queries'] > previous['queries']:
+                regressions.append((service, name, f"{previous['queries']} -> {current['queries']} queries"))
+    return regressions
+
+
+def run_size(size, args):
+    workdir = tempfile.mkdtemp(prefix='endpoint-bench-')
+    database_url = configure_environment(args, workdir)
+    smtplib.SMTP_SSL = StubSMTP
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        crm = load_crm_app()
+        crm_server = serve_crm(crm)
+        app = load_booking_app()
+        counts = seed(app, size, args)
+
+        from extensions import db
+        with app.app_context():
+            queries = QueryCounter(db.engine)
+        booking_client = app.test_client()
+        fixtures = BookingFixtures(app, booking_client)
+
+        rng = random.Random(args.seed)
+        facilitators = SIZES[size]['facilitators']
+        weights = [1.0 / rank ** 1.1 for rank in range(1, facilitators + 1)]
+        crm.store.add_many([
+            notification(i, facilitator_id)
+            for i, facilitator_id in enumerate(rng.choices(range(1, facilitators + 1), weights=weights, k=SIZES[size]['notifications']))
+        ])
+
+        services = {
+            'booking-api': (booking_client, booking_cases(fixtures), queries),
+            'crm-service': (crm.app.test_client(), crm_cases(crm, 1), None)
+        }
+        results = {
+            service: measure(client, cases, args, crm, counter)
+            for service, (client, cases, counter) in services.items()
+        }
+
+        baseline_path = os.path.join(args.baseline_dir, f'endpoints-{size}.json')
+        baseline = None
+        if not args.update_baseline and os.path.exists(baseline_path):
+            with open(baseline_path) as fh:
+                baseline = json.load(fh)
+            # A slowdown has to show up twice: routes that look slower are timed again and keep their better run
+            for service, (client, cases, counter) in services.items():
+                suspects = {name for flagged, name, _ in compare(results, baseline, args.threshold, args.min_delta_ms)
+                            if flagged == service}
+                for name, retry in measure(client, cases, args, crm, counter, suspects).items():
+                    if retry['p50_ms'] < results[service][name]['p50_ms']:
+                        results[service][name] = retry
+        crm_server.shutdown()
+
+    report = {
+        'config': {
+            'size': size,
+            'database': database_url.split('@')[-1],
+            'rows': counts,
+            'iterations': args.iterations,
+            'created_at': datetime.utcnow().isoformat()
+        },
+        **results
+    }
+    print(json.dumps(report, indent=2))
+    if args.output:
+        with open(args.output, 'w') as fh:
+            json.dump(report, fh, indent=2)
+
+    if baseline is None:
+        os.makedirs(args.baseline_dir, exist_ok=True)
+        with open(baseline_path, 'w') as fh:
+            json.dump(report, fh, indent=2)
+        print(f'Saved baseline {baseline_path}', file=sys.stderr)
+        return 0
+
+    regressions = compare(results, baseline, args.threshold, args.min_delta_ms)
+    for service, name, description in regressions:
+        print(f'REGRESSION {size} {service} {name}: {description}', file=sys.stderr)
+    if not regressions:
+        print(f'No regressions against {baseline_path}', file=sys.stderr)
+    return 1 if regressions else 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sizes', default='small', help=f"comma-separated dataset sizes: {', '.join(SIZES)}")
+    parser.add_argument('--iterations', type=int, default=20, help='timed requests per route')
+    parser.add_argument('--warmup', type=int, default=3, help='untimed requests per route first')
+    parser.add_argument('--only', default=None, help='only routes whose name contains this text')
+    parser.add_argument('--threshold', type=float, default=0.25, help='allowed p50 slowdown as a fraction of the baseline')
+    parser.add_argument('--min-delta-ms', type=float, default=2.0, help='ignore slowdowns smaller than this')
+    parser.add_argument('--baseline-dir', default=os.path.join(os.path.dirname(os.path.abspath(__file__)), 'baselines'))
+    parser.add_argument('--update-baseline', action='store_true', help='save this run as the baseline')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--database-url', default=None, help='disposable database (default: temporary SQLite file)')
+    parser.add_argument('--output', default=None, help='write the report as JSON to this path')
+    args = parser.parse_args()
+    sizes = args.sizes.split(',')
+    unknown = [size for size in sizes if size not in SIZES]
+    if unknown:
+        parser.error(f"unknown size {', '.join(unknown)}")
+
+    if len(sizes) == 1:
+        sys.exit(run_size(sizes[0], args))
+
+    # The apps bind their database at import, so every size runs in its own process
+    argv = sys.argv[1:]
+    for option in ('--sizes', '--output'):
+        if option in argv:
+            index = argv.index(option)
+            del argv[index:index + 2]
+    failed = False
+    for size in sizes:
+        output = [] if not args.output else ['--output', f'{os.path.splitext(args.output)[0]}-{size}.json']
+        failed |= subprocess.call([sys.executable, os.path.abspath(__file__), *argv, '--sizes', size, *output]) != 0
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,229 @@
+"""Compare the Werkzeug dev server with the gunicorn production config.
+
+Starts each service both ways as a real HTTP server on localhost and drives
+the same read/write mix at it from many client threads:
+
+    booking-api: GET /events, GET /events/<id>      (JWT, SQLite by default)
+    crm-service: GET /notifications, POST /notify   (emails are only logged)
+
+    python backend/benchmarks/serving_bench.py --requests 2000 --concurrency 32
+    python backend/benchmarks/serving_bench.py --only crm --output serving.json
+
+gunicorn must be installed (it is in both requirements files).
+"""
+import argparse
+import contextlib
+import io
+import json
+import os
+import random
+import signal
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+
+import requests
+
+BACKEND_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+BOOKING_API_DIR = os.path.abspath(os.path.join(BACKEND_DIR, 'booking-api'))
+CRM_SERVICE_DIR = os.path.abspath(os.path.join(BACKEND_DIR, 'crm-service'))
+CRM_TOKEN = 'serving-bench-token'
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def seed_booking_api(database_url, events):
+    """Create a facilitator, a user and some events; return a user token and the event ids"""
+    sys.path.insert(0, BOOKING_API_DIR)
+    with contextlib.redirect_stdout(io.StringIO()):
+        from app import app
+        from extensions import db
+        from models import User, Event
+        from flask_jwt_extended import create_access_token
+
+    with app.app_context():
+        db.drop_all()
+        db.create_all()
+        facilitator = User(email='fac@bench.test', name='Facilitator', role='facilitator')  # type: ignore
+        user = User(email='user@bench.test', name='User', role='user')  # type: ignore
+        db.session.add_all([facilitator, user])
+        db.session.flush()
+        start = datetime.utcnow() + timedelta(days=7)
+        rows = [
+            Event(
+                title=f'Bench Event {i}', event_type='session', start_datetime=start,
+                end_datetime=start + timedelta(hours=1), max_participants=50, price=100,
+                user_id=facilitator.id
+            )  # type: ignore
+            for i in range(events)
+        ]
+        db.session.add_all(rows)
+        db.session.commit()
+        token = create_access_token(identity=str(user.id))
+        event_ids = [event.id for event in rows]
+        db.engine.dispose()
+    return token, event_ids
+
+
+@contextlib.contextmanager
+def server(command, cwd, env, probe_url):
+    process = subprocess.Popen(
+        command, cwd=cwd, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+        start_new_session=True
+    )
+    try:
+        deadline = time.monotonic() + 30
+        while True:
+            try:
+                requests.get(probe_url, timeout=1)
+                break
+            except requests.ConnectionError:
+                if process.poll() is not None or time.monotonic() > deadline:
+                    raise RuntimeError(f'{" ".join(command)} did not start')
+                time.sleep(0.2)
+        yield
+    finally:
+        if process.poll() is None:
+            os.killpg(process.pid, signal.SIGTERM)
+            process.wait(timeout=30)
+
+
+def drive(plan, concurrency):
+    """Run (method, url, kwargs) requests from a thread pool; return latencies, errors and wall time"""
+    local = threading.local()
+    latencies = []
+    errors = 0
+    lock = threading.Lock()
+
+    def call(item):
+        nonlocal errors
+        method, url, kwargs = item
+        if not hasattr(local, 'session'):
+            local.session = requests.Session()
+        started = time.perf_counter()
+        try:
+            ok = local.session.request(method, url, timeout=30, **kwargs).status_code < 500
+        except requests.RequestException:
+            ok = False
+        elapsed = time.perf_counter() - started
+        with lock:
+            latencies.append(elapsed)
+            errors += 0 if ok else 1
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        list(pool.map(call, plan))
+    return sorted(latencies), errors, time.perf_counter() - started
+
+
+def percentile(sorted_values, pct):
+    index = max(0, min(len(sorted_values) - 1, int(round(pct / 100.0 * len(sorted_values))) - 1))
+    return sorted_values[index]
+
+
+def report(latencies, errors, wall):
+    return {
+        'requests': len(latencies),
+        'throughput_rps': round(len(latencies) / wall, 1),
+        'p50_ms': round(percentile(latencies, 50) * 1000, 2),
+        'p95_ms': round(percentile(latencies, 95) * 1000, 2),
+        'p99_ms': round(percentile(latencies, 99) * 1000, 2),
+        'errors': errors
+    }
+
+
+def booking_plan(base, token, event_ids, count, rng):
+    headers = {'Authorization': f'Bearer {token}'}
+    plan = []
+    for _ in range(count):
+        if rng.random() < 0.5:
+            plan.append(('GET', f'{base}/events', {'headers': headers}))
+        else:
+            plan.append(('GET', f'{base}/events/{rng.choice(event_ids)}', {'headers': headers}))
+    return plan
+
+
+def crm_plan(base, count, rng):
+    headers = {'Authorization': f'Bearer {CRM_TOKEN}'}
+    plan = []
+    for i in range(count):
+        if rng.random() < 0.7:
+            plan.append(('GET', f'{base}/notifications?limit=50', {}))
+        else:
+            plan.append(('POST', f'{base}/notify', {'headers': headers, 'json': {
+                'booking_id': i, 'facilitator_id': rng.randint(1, 20), 'action': 'approved',
+                'user': {'id': i, 'name': f'User {i}', 'email': f'user{i}@bench.test'},
+                'event': {'id': 1, 'title': 'Bench Event'},
+                'facilitator': {'id': 1, 'name': 'Facilitator', 'email': 'fac@bench.test'}
+            }}))
+    return plan
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--requests', type=int, default=2000, help='requests per server')
+    parser.add_argument('--concurrency', type=int, default=32, help='concurrent client threads')
+    parser.add_argument('--events', type=int, default=50, help='events seeded for the booking API')
+    parser.add_argument('--only', choices=['booking', 'crm'], default=None)
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--output', default=None, help='write the report as JSON to this path')
+    args = parser.parse_args()
+
+    database_url = f"sqlite:///{os.path.join(tempfile.mkdtemp(prefix='serving-bench-'), 'bench.db')}"
+    env = dict(
+        os.environ,
+        DATABASE_URL=database_url,
+        JWT_SECRET_KEY='serving-bench-secret-key-with-enough-bytes',
+        CRM_BEARER_TOKEN=CRM_TOKEN,
+        CRM_URL='http://127.0.0.1:9/notify',
+        GMAIL_USER='',
+        GUNICORN_ACCESS_LOG='',
+        PYTHONUNBUFFERED='1'
+    )
+    os.environ.update(DATABASE_URL=database_url, JWT_SECRET_KEY=env['JWT_SECRET_KEY'])
+
+    gunicorn = [sys.executable, '-m', 'gunicorn', '-c', 'gunicorn.conf.py', 'app:app']
+    results = {}
+
+    if args.only in (None, 'booking'):
+        token, event_ids = seed_booking_api(database_url, args.events)
+        for mode, command, port in (
+            ('dev_server', [sys.executable, 'app.py'], 5000),
+            ('gunicorn', gunicorn, free_port()),
+        ):
+            base = f'http://127.0.0.1:{port}'
+            with server(command, BOOKING_API_DIR, dict(env, GUNICORN_BIND=f'127.0.0.1:{port}'), f'{base}/'):
+                plan = booking_plan(base, token, event_ids, args.requests, random.Random(args.seed))
+                results[f'booking-api/{mode}'] = report(*drive(plan, args.concurrency))
+
+    if args.only in (None, 'crm'):
+        for mode, command, port in (
+            ('dev_server', [sys.executable, 'app.py'], 5001),
+            ('gunicorn', gunicorn, free_port()),
+        ):
+            base = f'http://127.0.0.1:{port}'
+            with server(command, CRM_SERVICE_DIR, dict(env, GUNICORN_BIND=f'127.0.0.1:{port}'), f'{base}/notifications/count'):
+                plan = crm_plan(base, args.requests, random.Random(args.seed))
+                results[f'crm-service/{mode}'] = report(*drive(plan, args.concurrency))
+
+    output = {
+        'config': {'requests': args.requests, 'concurrency': args.concurrency, 'cpus': os.cpu_count()},
+        'results': results
+    }
+    print(json.dumps(output, indent=2))
+    if args.output:
+        with open(args.output, 'w') as fh:
+            json.dump(output, fh, indent=2)
+
+
+if __name__ == '__main__':
+    main()
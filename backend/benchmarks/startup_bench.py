@@ -0,0 +1,115 @@
+"""Measure cold start time for both services.
+
+For every run each service is started in a fresh process, and the script
+records how long the app module takes to import and how long it takes until
+the readiness endpoint answers 200:
+
+    booking-api: python wait_for_db.py && gunicorn, until GET /readyz
+    crm-service: gunicorn, until GET /healthz
+
+    python backend/benchmarks/startup_bench.py --runs 5
+    python backend/benchmarks/startup_bench.py --only booking --output startup.json
+
+Uses a temporary SQLite database unless --database-url is given.
+"""
+import argparse
+import json
+import os
+import signal
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+import requests
+
+from serving_bench import BOOKING_API_DIR, CRM_SERVICE_DIR, free_port
+
+IMPORT_PROBE = 'import time; started = time.perf_counter(); import app; print(time.perf_counter() - started)'
+
+
+def import_time(cwd, env):
+    output = subprocess.run(
+        [sys.executable, '-c', IMPORT_PROBE], cwd=cwd, env=env, capture_output=True, text=True, check=True
+    ).stdout
+    return float(output.strip().splitlines()[-1])
+
+
+def time_to_ready(command, cwd, env, probe_url, timeout=60):
+    """Start command and return the seconds until probe_url answers 200"""
+    started = time.perf_counter()
+    process = subprocess.Popen(
+        command, cwd=cwd, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+        start_new_session=True
+    )
+    try:
+        while True:
+            try:
+                if requests.get(probe_url, timeout=1).status_code == 200:
+                    return time.perf_counter() - started
+            except requests.ConnectionError:
+                pass
+            if process.poll() is not None or time.perf_counter() - started > timeout:
+                raise RuntimeError(f'{" ".join(command)} did not become ready')
+            time.sleep(0.01)
+    finally:
+        if process.poll() is None:
+            os.killpg(process.pid, signal.SIGTERM)
+            process.wait(timeout=30)
+
+
+def summarize(samples):
+    return {
+        'median_s': round(statistics.median(samples), 3),
+        'min_s': round(min(samples), 3),
+        'max_s': round(max(samples), 3)
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--runs', type=int, default=5, help='cold starts per service')
+    parser.add_argument('--only', choices=['booking', 'crm'], default=None)
+    parser.add_argument('--database-url', default=None, help='database for the booking API (default: temporary SQLite)')
+    parser.add_argument('--output', default=None, help='write the report as JSON to this path')
+    args = parser.parse_args()
+
+    database_url = args.database_url or \
+        f"sqlite:///{os.path.join(tempfile.mkdtemp(prefix='startup-bench-'), 'bench.db')}"
+    env = dict(
+        os.environ,
+        DATABASE_URL=database_url,
+        CRM_URL='http://127.0.0.1:9/notify',
+        GMAIL_USER='',
+        GUNICORN_ACCESS_LOG='',
+        GUNICORN_WORKERS='1'
+    )
+    gunicorn = f'{sys.executable} -m gunicorn -c gunicorn.conf.py app:app'
+    services = []
+    if args.only in (None, 'booking'):
+        services.append(('booking-api', BOOKING_API_DIR, f'{sys.executable} wait_for_db.py && {gunicorn}', '/readyz'))
+    if args.only in (None, 'crm'):
+        services.append(('crm-service', CRM_SERVICE_DIR, gunicorn, '/healthz'))
+
+    results = {}
+    for name, cwd, command, probe in services:
+        imports = []
+        ready = []
+        for _ in range(args.runs):
+            imports.append(import_time(cwd, env))
+            port = free_port()
+            ready.append(time_to_ready(
+                ['sh', '-c', command], cwd, dict(env, GUNICORN_BIND=f'127.0.0.1:{port}'), f'http://127.0.0.1:{port}{probe}'
+            ))
+        results[name] = {'import_app': summarize(imports), 'start_to_ready': summarize(ready)}
+
+    output = {'config': {'runs': args.runs, 'cpus': os.cpu_count()}, 'results': results}
+    print(json.dumps(output, indent=2))
+    if args.output:
+        with open(args.output, 'w') as fh:
+            json.dump(output, fh, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,242 @@
+from flask import Blueprint, jsonify, request
+from flask_jwt_extended import jwt_required, get_jwt_identity
+from models import Event, Booking, User, Transaction, BookingStatsBucket, CustomerSummary
+from extensions import db
+from dbrouting import read_only
+from dbutils import upsert_increment
+from datetime import date, datetime, timedelta
+from decimal import Decimal
+import click
+import os
+
+bp = Blueprint('analytics', __name__)
+
+GRANULARITIES = ('day', 'week', 'month')
+DEFAULT_SPANS = {'day': timedelta(days=30), 'week': timedelta(weeks=12), 'month': timedelta(days=365)}
+METRICS = ('bookings', 'cancellations', 'revenue')
+
+def record_activity(facilitator_id, when=None, bookings=0, cancellations=0, revenue=0):
+    """Add to the facilitator's daily bucket as part of the caller's transaction"""
+    if not facilitator_id:
+        return
+    increments = {'bookings': bookings, 'cancellations': cancellations, 'revenue': Decimal(str(revenue))}
+    upsert_increment(BookingStatsBucket, {
+        'facilitator_id': facilitator_id,
+        'granularity': 'day',
+        'bucket_start': (when or datetime.utcnow()).date()
+    }, increments)
+
+def record_customer_activity(facilitator_id, customer, when=None, bookings=0, spent=0):
+    """Keep the facilitator's customer summary row current as part of the caller's transaction"""
+    if not facilitator_id or not customer:
+        return
+    replace = {
+        'name': customer.name,
+        'email': customer.email,
+        'search_name': (customer.name or '').lower(),
+        'search_email': (customer.email or '').lower()
+    }
+    if bookings:
+        replace['last_booking_at'] = when or datetime.utcnow()
+    upsert_increment(CustomerSummary, {
+        'facilitator_id': facilitator_id,
+        'user_id': customer.id
+    }, {'total_bookings': bookings, 'total_spent': Decimal(str(spent))}, replace)
+
+def bucket_start(day, granularity):
+    if granularity == 'week':
+        return day - timedelta(days=day.weekday())
+    if granularity == 'month':
+        return day.replace(day=1)
+    return day
+
+def next_bucket(start, granularity):
+    if granularity == 'week':
+        return start + timedelta(weeks=1)
+    if granularity == 'month':
+        return (start.replace(day=28) + timedelta(days=4)).replace(day=1)
+    return start + timedelta(days=1)
+
+@bp.route('/facilitator/analytics', methods=['GET'])
+@jwt_required()
+@read_only
+def facilitator_analytics():
+    user_id = get_jwt_identity()
+    user = User.query.get(user_id)
+    if not user or user.role != 'facilitator':
+        return jsonify({'error': 'Not authorized'}), 403
+
+    granularity = request.args.get('granularity', 'day')
+    if granularity not in GRANULARITIES:
+        return jsonify({'error': 'Granularity must be one of: day, week, month'}), 400
+
+    try:
+        end = date.fromisoformat(request.args['to']) if request.args.get('to') else datetime.utcnow().date()
+        start = date.fromisoformat(request.args['from']) if request.args.get('from') else end - DEFAULT_SPANS[granularity]
+    except ValueError:
+        return jsonify({'error': 'from and to must be ISO dates (YYYY-MM-DD)'}), 400
+    if start > end:
+        return jsonify({'error': 'from must not be after to'}), 400
+
+    start = bucket_start(start, granularity)
+
+    # Monthly charts also read the month rows that old daily buckets were compacted into
+    stored = ['day', 'month'] if granularity == 'month' else ['day']
+    rows = db.session.query(
+        BookingStatsBucket.bucket_start,
+        BookingStatsBucket.bookings,
+        BookingStatsBucket.cancellations,
+        BookingStatsBucket.revenue
+    ).filter(
+        BookingStatsBucket.facilitator_id == user_id,
+        BookingStatsBucket.granularity.in_(stored),
+        BookingStatsBucket.bucket_start >= start,
+        BookingStatsBucket.bucket_start <= end
+    ).all()
+
+    totals = {}
+    for row in rows:
+        bucket = totals.setdefault(bucket_start(row.bucket_start, granularity), dict.fromkeys(METRICS, 0))
+        bucket['bookings'] += row.bookings
+        bucket['cancellations'] += row.cancellations
+        bucket['revenue'] += float(row.revenue)
+
+    buckets = []
+    current = start
+    while current <= end:
+        values = totals.get(current, dict.fromkeys(METRICS, 0))
+        buckets.append({
+            'bucket_start': current.isoformat(),
+            'bookings': values['bookings'],
+            'cancellations': values['cancellations'],
+            'revenue': round(float(values['revenue']), 2)
+        })
+        current = next_bucket(current, granularity)
+
+    return jsonify({
+        'granularity': granularity,
+        'from': start.isoformat(),
+        'to': end.isoformat(),
+        'buckets': buckets
+    })
+
+def compact_buckets(retention_days):
+    """Fold daily buckets older than the retention window into monthly buckets"""
+    cutoff = datetime.utcnow().date() - timedelta(days=retention_days)
+    # Only whole months are compacted so a month is never split between granularities
+    cutoff = cutoff.replace(day=1)
+    old = BookingStatsBucket.query.filter(
+        BookingStatsBucket.granularity == 'day',
+        BookingStatsBucket.bucket_start < cutoff
+    ).all()
+
+    months = {}
+    for bucket in old:
+        key = (bucket.facilitator_id, bucket_start(bucket.bucket_start, 'month'))
+        month = months.setdefault(key, {'bookings': 0, 'cancellations': 0, 'revenue': Decimal('0')})
+        month['bookings'] += bucket.bookings
+        month['cancellations'] += bucket.cancellations
+        month['revenue'] += bucket.revenue
+
+    for (facilitator_id, month_start), increments in months.items():
+        upsert_increment(BookingStatsBucket, {
+            'facilitator_id': facilitator_id,
+            'granularity': 'month',
+            'bucket_start': month_start
+        }, increments)
+    BookingStatsBucket.query.filter(
+        BookingStatsBucket.granularity == 'day',
+        BookingStatsBucket.bucket_start < cutoff
+    ).delete(synchronize_session=False)
+    db.session.commit()
+    return len(old), len(months)
+
+@bp.cli.command('compact')
+@click.option('--retention-days', type=int, default=lambda: int(os.getenv('ANALYTICS_DAILY_RETENTION_DAYS', '400')),
+              help='Keep daily buckets for this many days.')
+def compact_command(retention_days):
+    """Fold old daily analytics buckets into monthly ones."""
+    days, months = compact_buckets(retention_days)
+    print(f'Compacted {days} daily buckets into {months} monthly buckets')
+
+@bp.cli.command('backfill')
+def backfill_command():
+    """Rebuild the daily analytics buckets from bookings and transactions."""
+    BookingStatsBucket.query.delete(synchronize_session=False)
+
+    day = db.func.date(Booking.created_at)
+    booked = db.session.query(Event.user_id, day, db.func.count(Booking.id)).join(
+        Event, Booking.event_id == Event.id
+    ).group_by(Event.user_id, day).all()
+
+    cancelled_on = db.func.date(db.func.coalesce(Booking.cancelled_at, Booking.updated_at))
+    cancelled = db.session.query(Event.user_id, cancelled_on, db.func.count(Booking.id)).join(
+        Event, Booking.event_id == Event.id
+    ).filter(
+        Booking.status.in_(['cancelled', 'rejected'])
+    ).group_by(Event.user_id, cancelled_on).all()
+
+    paid_on = db.func.date(Transaction.created_at)
+    revenue = db.session.query(Event.user_id, paid_on, db.func.sum(Transaction.amount)).join(
+        Booking, Transaction.booking_id == Booking.id
+    ).join(
+        Event, Booking.event_id == Event.id
+    ).filter(
+        Transaction.status == 'completed'
+    ).group_by(Event.user_id, paid_on).all()
+
+    def as_date(value):
+        # SQLite returns date() as text
+        return date.fromisoformat(value) if isinstance(value, str) else value
+
+    for metric, rows in (('bookings', booked), ('cancellations', cancelled), ('revenue', revenue)):
+        for facilitator_id, day_value, amount in rows:
+            upsert_increment(BookingStatsBucket, {
+                'facilitator_id': facilitator_id,
+                'granularity': 'day',
+                'bucket_start': as_date(day_value)
+            }, {metric: amount or 0})
+    db.session.commit()
+    print(f'Rebuilt analytics from {len(booked)} booking days, {len(cancelled)} cancellation days '
+          f'and {len(revenue)} revenue days')
+
+@bp.cli.command('rebuild-customers')
+def rebuild_customers_command():
+    """Rebuild the per-facilitator customer summaries from bookings and transactions."""
+    CustomerSummary.query.delete(synchronize_session=False)
+
+    spent = db.session.query(
+        Transaction.booking_id.label('booking_id'),
+        db.func.sum(Transaction.amount).label('amount')
+    ).filter(Transaction.status == 'completed').group_by(Transaction.booking_id).subquery()
+
+    rows = db.session.query(
+        Event.user_id,
+        User.id,
+        User.name,
+        User.email,
+        db.func.count(Booking.id),
+        db.func.coalesce(db.func.sum(spent.c.amount), 0),
+        db.func.max(Booking.created_at)
+    ).select_from(Booking).join(
+        Event, Booking.event_id == Event.id
+    ).join(
+        User, Booking.user_id == User.id
+    ).outerjoin(
+        spent, spent.c.booking_id == Booking.id
+    ).group_by(Event.user_id, User.id, User.name, User.email).all()
+
+    if rows:
+        db.session.execute(db.insert(CustomerSummary), [{
+            'facilitator_id': facilitator_id,
+            'user_id': customer_id,
+            'name': name,
+            'email': email,
+            'search_name': (name or '').lower(),
+            'search_email': (email or '').lower(),
+            'total_bookings': total_bookings,
+            'total_spent': total_spent,
+            'last_booking_at': last_booking_at
+        } for facilitator_id, customer_id, name, email, total_bookings, total_spent, last_booking_at in rows])
+    db.session.commit()
+    print(f'Rebuilt {len(rows)} customer summaries')
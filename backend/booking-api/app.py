@@ -4,10 +4,21 @@ from flask import Flask, jsonify
 from flask_cors import CORS
 from extensions import db, jwt, oauth
 from models import User, Event, Booking, CRMNotification
-from auth import bp as auth_bp
+from auth import bp as auth_bp, current_user_is_admin
 from events import bp as events_bp
 from bookings import bp as bookings_bp
 from facilitators import bp as facilitators_bp
+from waitlist import bp as waitlist_bp
+from analytics import bp as analytics_bp
+from segments import bp as segments_bp
+from reminders import bp as reminders_bp
+from internal import bp as internal_bp
+from health import bp as health_bp
+from archive import bp as archive_bp
+from partitions import bp as partitions_bp, ensure_partitions
+from dbpool import engine_options, instrument
+from dbrouting import LAST_WRITE_HEADER, replica_binds, track_writes
+from crm_common.profiling import profiling_enabled, install as install_profiling
 import os
 from datetime import datetime, timedelta
 from dotenv import load_dotenv
@@ -16,10 +27,13 @@ from dotenv import load_dotenv
 load_dotenv()
 
 app = Flask(__name__)
-CORS(app)
+CORS(app, expose_headers=[LAST_WRITE_HEADER])
 
 app.config['SQLALCHEMY_DATABASE_URI'] = os.getenv('DATABASE_URL', 'postgresql://postgres:postgres@db:5432/booking')
 app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+app.config['SQLALCHEMY_ENGINE_OPTIONS'] = engine_options(app.config['SQLALCHEMY_DATABASE_URI'])
+# Read-only views are served from DATABASE_REPLICA_URL when it is set
+app.config['SQLALCHEMY_BINDS'] = replica_binds()
 app.config['JWT_SECRET_KEY'] = os.getenv('JWT_SECRET_KEY', 'super-secret-key')
 app.config['JWT_ACCESS_TOKEN_EXPIRES'] = timedelta(days=1)
 app.secret_key = os.getenv('FLASK_SECRET_KEY')
@@ -31,18 +45,44 @@ app.register_blueprint(auth_bp)
 app.register_blueprint(events_bp)
 app.register_blueprint(bookings_bp)
 app.register_blueprint(facilitators_bp)
+app.register_blueprint(waitlist_bp)
+app.register_blueprint(analytics_bp)
+app.register_blueprint(segments_bp)
+app.register_blueprint(reminders_bp)
+app.register_blueprint(internal_bp)
+app.register_blueprint(health_bp)
+app.register_blueprint(archive_bp)
+app.register_blueprint(partitions_bp)
 
 db.init_app(app)
 jwt.init_app(app)
 oauth.init_app(app)
+# Registered first so its after_request hook runs last and the profile covers the whole request
+if profiling_enabled():
+    # Admins may also hand out profile tokens so requests made with other users' credentials can be profiled
+    install_profiling(app, current_user_is_admin, token_secret=app.config['JWT_SECRET_KEY'])
+app.after_request(track_writes)
+
+with app.app_context():
+    # The primary and the replica each get their own pool metrics
+    for bind, engine in db.engines.items():
+        instrument(engine, bind or 'primary')
 
 @app.route('/')
 def hello():
     return {'message': 'Booking System API is running!'}
 
-if __name__ == '__main__':
+def init_db():
+    """Create missing tables and upcoming partitions; run once per deployment, not per worker"""
     with app.app_context():
         db.create_all()
+        # Postgres only accepts rows into bookings/transactions for months that have a partition
+        ensure_partitions()
+        # Leave no pooled connections behind for forked workers to inherit
+        db.engine.dispose()
+
+if __name__ == '__main__':
+    init_db()
     app.run(debug=True, host='0.0.0.0', port=5000)
 
 
@@ -0,0 +1,222 @@
+from flask import Blueprint, request
+from models import Event, Booking, BookingReference, User, Transaction, CRMNotification, WaitlistEntry, EventReminder
+from extensions import db
+from datetime import datetime, timedelta
+from decimal import Decimal
+import click
+import gzip
+import json
+import mmap
+import os
+import threading
+import zlib
+
+bp = Blueprint('archive', __name__)
+
+
+def archive_dir():
+    return os.getenv('ARCHIVE_DIR', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'archive'))
+
+
+def include_archived():
+    """Whether the request asked for archived rows with ?include_archived=true"""
+    return request.args.get('include_archived', 'false').lower() in ('1', 'true', 'yes')
+
+
+def column_values(row):
+    values = {}
+    for column in row.__table__.columns:
+        value = getattr(row, column.key)
+        if isinstance(value, datetime):
+            value = value.isoformat()
+        elif isinstance(value, Decimal):
+            value = str(value)
+        values[column.key] = value
+    return values
+
+
+def person(user):
+    return {'id': user.id, 'name': user.name, 'email': user.email} if user else None
+
+
+def build_documents(events):
+    """One self-contained document per event: the event, its facilitator and its bookings
+    with their user, transactions and CRM notifications"""
+    event_ids = [event.id for event in events]
+    bookings = Booking.query.filter(Booking.event_id.in_(event_ids)).order_by(Booking.id).all()
+    booking_ids = [booking.id for booking in bookings]
+    user_ids = {booking.user_id for booking in bookings} | {event.user_id for event in events}
+    users = {user.id: user for user in User.query.filter(User.id.in_(user_ids)).all()}
+
+    transactions = {}
+    notifications = {}
+    if booking_ids:
+        for row in Transaction.query.filter(Transaction.booking_id.in_(booking_ids)).order_by(Transaction.id):
+            transactions.setdefault(row.booking_id, []).append(column_values(row))
+        for row in CRMNotification.query.filter(CRMNotification.booking_id.in_(booking_ids)).order_by(CRMNotification.id):
+            notifications.setdefault(row.booking_id, []).append(column_values(row))
+
+    by_event = {}
+    for booking in bookings:
+        by_event.setdefault(booking.event_id, []).append({
+            **column_values(booking),
+            'user': person(users.get(booking.user_id)),
+            'transactions': transactions.get(booking.id, []),
+            'crm_notifications': notifications.get(booking.id, [])
+        })
+
+    return [{
+        'event': column_values(event),
+        'facilitator': person(users.get(event.user_id)),
+        'bookings': by_event.get(event.id, []),
+        'archived_at': datetime.utcnow().isoformat()
+    } for event in events]
+
+
+def write_archive(directory, name, documents):
+    """Write documents as a gzip file of concatenated members plus a JSON index.
+
+    Each member holds one facilitator's events as JSONL, so the file as a
+    whole is still plain gzipped JSONL (zcat works), while readers can
+    decompress only the members a facilitator or user appears in.
+    """
+    os.makedirs(directory, exist_ok=True)
+    by_facilitator = {}
+    for document in documents:
+        by_facilitator.setdefault(document['event']['user_id'], []).append(document)
+
+    index = {'events': [document['event']['id'] for document in documents], 'facilitators': {}, 'users': {}}
+    data_path = os.path.join(directory, f'{name}.jsonl.gz')
+    offset = 0
+    with open(data_path + '.tmp', 'wb') as fh:
+        for facilitator_id, group in by_facilitator.items():
+            lines = ''.join(json.dumps(document, separators=(',', ':')) + '\n' for document in group)
+            member = gzip.compress(lines.encode(), compresslevel=6, mtime=0)
+            fh.write(member)
+            ref = [offset, len(member)]
+            offset += len(member)
+            index['facilitators'][str(facilitator_id)] = [ref]
+            for user_id in {booking['user_id'] for document in group for booking in document['bookings']}:
+                if user_id is not None:
+                    index['users'].setdefault(str(user_id), []).append(ref)
+        fh.flush()
+        os.fsync(fh.fileno())
+    os.replace(data_path + '.tmp', data_path)
+
+    # The index goes last; readers ignore data files without one
+    index_path = os.path.join(directory, f'{name}.index.json')
+    with open(index_path + '.tmp', 'w') as fh:
+        json.dump(index, fh)
+        fh.flush()
+        os.fsync(fh.fileno())
+    os.replace(index_path + '.tmp', index_path)
+    return data_path
+
+
+class ArchiveReader:
+    """Reads archived event documents back through memory-mapped archive files.
+
+    Indexes are loaded once per file and files are mapped on first use, so a
+    lookup only decompresses the members listed for that facilitator or user.
+    """
+
+    def __init__(self, directory):
+        self.directory = directory
+        self._lock = threading.Lock()
+        self._indexes = {}
+        self._maps = {}
+
+    def _refresh(self):
+        try:
+            names = sorted(name for name in os.listdir(self.directory) if name.endswith('.index.json'))
+        except FileNotFoundError:
+            return []
+        with self._lock:
+            for name in names:
+                if name not in self._indexes:
+                    with open(os.path.join(self.directory, name)) as fh:
+                        self._indexes[name] = json.load(fh)
+            return [(name, self._indexes[name]) for name in names]
+
+    def _map(self, name):
+        with self._lock:
+            mapped = self._maps.get(name)
+            if mapped is None:
+                path = os.path.join(self.directory, name[:-len('.index.json')] + '.jsonl.gz')
+                with open(path, 'rb') as fh:
+                    mapped = mmap.mmap(fh.fileno(), 0, access=mmap.ACCESS_READ)
+                self._maps[name] = mapped
+            return mapped
+
+    def documents(self, facilitator_id=None, user_id=None, exclude_event_ids=()):
+        """Archived event documents for one facilitator or one user's bookings, each event once"""
+        key, ident = ('facilitators', facilitator_id) if facilitator_id is not None else ('users', user_id)
+        seen = set(exclude_event_ids)
+        for name, index in self._refresh():
+            refs = index[key].get(str(ident))
+            if not refs:
+                continue
+            mapped = self._map(name)
+            for offset, length in {tuple(ref) for ref in refs}:
+                data = zlib.decompress(mapped[offset:offset + length], wbits=31)
+                for line in data.splitlines():
+                    document = json.loads(line)
+                    event_id = document['event']['id']
+                    # An event archived twice (e.g. a batch whose delete failed) is returned once
+                    if event_id in seen:
+                        continue
+                    if facilitator_id is None and not any(
+                            str(b['user_id']) == str(user_id) for b in document['bookings']):
+                        continue
+                    seen.add(event_id)
+                    yield document
+
+
+reader = ArchiveReader(archive_dir())
+
+
+def archive_batch(cutoff, batch_size, directory):
+    """Archive up to batch_size events that ended before cutoff; returns (events, bookings) archived"""
+    events = Event.query.filter(Event.end_datetime < cutoff).order_by(Event.id).limit(batch_size).all()
+    if not events:
+        return 0, 0
+    documents = build_documents(events)
+    event_ids = [event.id for event in events]
+    booking_ids = [booking['id'] for document in documents for booking in document['bookings']]
+    name = f"events-{datetime.utcnow().strftime('%Y%m%dT%H%M%S')}-{event_ids[0]}-{event_ids[-1]}"
+    write_archive(directory, name, documents)
+
+    try:
+        if booking_ids:
+            for model in (CRMNotification, Transaction, EventReminder, BookingReference):
+                model.query.filter(model.booking_id.in_(booking_ids)).delete(synchronize_session=False)
+            Booking.query.filter(Booking.id.in_(booking_ids)).delete(synchronize_session=False)
+        WaitlistEntry.query.filter(WaitlistEntry.event_id.in_(event_ids)).delete(synchronize_session=False)
+        Event.query.filter(Event.id.in_(event_ids)).delete(synchronize_session=False)
+        db.session.commit()
+    except Exception:
+        # The rows stay live; readers skip archived copies of events that still exist
+        db.session.rollback()
+        raise
+    db.session.expunge_all()
+    return len(event_ids), len(booking_ids)
+
+
+@bp.cli.command('run')
+@click.option('--retention-days', type=int, default=None, help='Archive events that ended more than this many days ago')
+@click.option('--batch-size', type=int, default=None, help='Events per archive file')
+def run_command(retention_days, batch_size):
+    """Move finished events and their bookings out of the database into the archive."""
+    retention_days = retention_days if retention_days is not None else int(os.getenv('ARCHIVE_RETENTION_DAYS', '365'))
+    batch_size = batch_size or int(os.getenv('ARCHIVE_BATCH_SIZE', '500'))
+    cutoff = datetime.utcnow() - timedelta(days=retention_days)
+    directory = archive_dir()
+    total_events = total_bookings = 0
+    while True:
+        events, bookings = archive_batch(cutoff, batch_size, directory)
+        if not events:
+            break
+        total_events += events
+        total_bookings += bookings
+        print(f'Archived {events} events and {bookings} bookings')
+    print(f'Archived {total_events} events and {total_bookings} bookings ended before {cutoff.isoformat()} to {directory}')
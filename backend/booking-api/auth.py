@@ -1,11 +1,15 @@
 from flask import Blueprint, request, jsonify, url_for, redirect
 from werkzeug.security import generate_password_hash, check_password_hash
-from flask_jwt_extended import create_access_token, jwt_required, get_jwt_identity
+from flask_jwt_extended import create_access_token, jwt_required, get_jwt_identity, verify_jwt_in_request
 from extensions import db, jwt, oauth
-from models import User
+from dbrouting import read_only
+from models import User, CustomerSummary
 from datetime import datetime
 import os
 import json
+import tempfile
+import threading
+import time
 from urllib.parse import urlencode
 
 bp = Blueprint('auth', __name__)
@@ -20,6 +24,50 @@ google = oauth.register(
 
 FRONTEND_URL = os.getenv('FRONTEND_URL', 'http://localhost:3000')
 
+_metadata_lock = threading.Lock()
+
+def load_google_metadata():
+    """Load Google's OpenID discovery document on first use, from a disk cache when it is fresh.
+
+    The cache is shared by every worker and survives restarts, so the document
+    is fetched at most once per OAUTH_METADATA_TTL seconds instead of per process.
+    """
+    if '_loaded_at' in google.server_metadata:
+        return google.server_metadata
+    path = os.getenv('OAUTH_METADATA_CACHE', os.path.join(tempfile.gettempdir(), 'google-openid-configuration.json'))
+    ttl = float(os.getenv('OAUTH_METADATA_TTL', '86400'))
+    with _metadata_lock:
+        try:
+            if time.time() - os.path.getmtime(path) < ttl:
+                with open(path) as fh:
+                    metadata = json.load(fh)
+                metadata['_loaded_at'] = time.time()
+                google.server_metadata.update(metadata)
+                return google.server_metadata
+        except (OSError, ValueError):
+            pass
+
+        metadata = google.load_server_metadata()
+        try:
+            # Write then rename so other workers never read a half-written file
+            fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path) or '.')
+            with os.fdopen(fd, 'w') as fh:
+                json.dump({k: v for k, v in metadata.items() if k != '_loaded_at'}, fh)
+            os.replace(tmp_path, path)
+        except OSError as e:
+            print(f'Could not cache Google OAuth metadata: {e}')
+        return metadata
+
+def current_user_is_admin():
+    """Whether the request carries a valid access token for an admin user"""
+    try:
+        verify_jwt_in_request(optional=True)
+    except Exception:
+        return False
+    user_id = get_jwt_identity()
+    user = User.query.get(user_id) if user_id else None
+    return bool(user and user.role == 'admin')
+
 @bp.route('/register', methods=['POST'])
 def register():
     data = request.get_json()
@@ -53,11 +101,16 @@ def login():
 @bp.route('/login/google')
 def login_google():
     redirect_uri = url_for('auth.auth_google_callback', _external=True)
+    try:
+        load_google_metadata()
+    except Exception as e:
+        return jsonify({'error': 'Google login failed', 'details': str(e)}), 400
     return google.authorize_redirect(redirect_uri)
 
 @bp.route('/auth/google/callback')
 def auth_google_callback():
     try:
+        load_google_metadata()
         token = google.authorize_access_token()
         userinfo = google.userinfo()
     except Exception as e:
@@ -109,6 +162,7 @@ def choose_role():
 
 @bp.route('/me', methods=['GET'])
 @jwt_required()
+@read_only
 def get_me():
     user_id = get_jwt_identity()
     user = User.query.get(user_id)
@@ -140,6 +194,12 @@ def update_profile():
     if 'phone' in data:
         user.phone = data['phone']
     
+    # Keep the denormalized name in facilitators' customer lists in step
+    CustomerSummary.query.filter_by(user_id=user.id).update({
+        'name': user.name,
+        'search_name': user.name.lower()
+    }, synchronize_session=False)
+    
     db.session.commit()
     return jsonify({
         'id': user.id, 
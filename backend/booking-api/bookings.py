@@ -1,17 +1,22 @@
 from flask import Blueprint, jsonify, request
 from flask_jwt_extended import jwt_required, get_jwt_identity
-from models import Event, Booking, User, Transaction
+from models import Event, Booking, BookingReference, User, Transaction
 from extensions import db
+from dbrouting import read_only
+from archive import include_archived, reader as archive_reader
+from waitlist import active_hold, live_booking, lock_event, expire_holds, release_seat, notify_promoted
+from analytics import record_activity, record_customer_activity
+from segments import invalidate_segments
 from datetime import datetime
 import uuid
 import os
 import requests
-import razorpay
 
 bp = Blueprint('bookings', __name__)
 
 @bp.route('/user/bookings', methods=['GET'])
 @jwt_required()
+@read_only
 def user_bookings():
     user_id = get_jwt_identity()
     user = User.query.get(user_id)
@@ -47,6 +52,27 @@ def user_bookings():
                 'email': facilitator.email if facilitator else None
             } if facilitator else None
         })
+    if include_archived():
+        live_events = {booking.event_id for booking in bookings}
+        for document in archive_reader.documents(user_id=int(user_id), exclude_event_ids=live_events):
+            event = document['event']
+            for booking in document['bookings']:
+                if booking['user_id'] != int(user_id):
+                    continue
+                result.append({
+                    **{key: booking[key] for key in (
+                        'id', 'booking_reference', 'status', 'payment_status', 'notes', 'created_at', 'cancelled_at'
+                    )},
+                    'event': {
+                        **{key: event[key] for key in (
+                            'id', 'title', 'start_datetime', 'end_datetime', 'currency', 'location', 'virtual_link'
+                        )},
+                        'price': float(event['price'])
+                    },
+                    'facilitator': document['facilitator'],
+                    'archived': True
+                })
+        result.sort(key=lambda b: b['created_at'] or '', reverse=True)
     return jsonify(result)
 
 @bp.route('/user/events/<int:event_id>/book', methods=['POST'])
@@ -64,11 +90,18 @@ def book_event(event_id):
     if not event.is_active:
         return jsonify({'error': 'Event is not active'}), 400
     
-    if event.current_participants >= event.max_participants:
-        return jsonify({'error': 'Event is full'}), 400
+    # Seats held for a promoted waitlist user are counted as taken for everyone else
+    if event.current_participants >= event.max_participants and not active_hold(user_id, event_id):
+        # Lapsed payment windows may have left seats behind
+        event = lock_event(event_id)
+        promoted = expire_holds(event)
+        db.session.commit()
+        notify_promoted(promoted)
+        if event.current_participants >= event.max_participants:
+            return jsonify({'error': 'Event is full', 'waitlist_available': True}), 400
     
     # Check if user already has a booking for this event
-    existing_booking = Booking.query.filter_by(user_id=user_id, event_id=event_id).first()
+    existing_booking = live_booking(user_id, event_id)
     if existing_booking:
         return jsonify({'error': 'You already have a booking for this event'}), 400
     
@@ -112,22 +145,36 @@ def cancel_booking(booking_id):
         return jsonify({'error': 'Not authorized'}), 403
     
     booking = Booking.query.get(booking_id)
-    if not booking or booking.user_id != user_id:
+    # Convert both IDs to int for comparison
+    if not booking or int(booking.user_id) != int(user_id):
         return jsonify({'error': 'Booking not found'}), 404
     
     if booking.status in ['cancelled', 'rejected']:
         return jsonify({'error': 'Booking is already cancelled or rejected'}), 400
     
     try:
+        # Lock the event, then the booking, and re-check the status under the locks so
+        # concurrent cancellations of the same booking free its seat only once
+        promoted = None
+        event = lock_event(booking.event_id)
+        booking = Booking.query.filter_by(id=booking_id).with_for_update().populate_existing().first()
+        if booking.status in ['cancelled', 'rejected']:
+            db.session.rollback()
+            return jsonify({'error': 'Booking is already cancelled or rejected'}), 400
+        
         booking.status = 'cancelled'
         booking.cancelled_at = datetime.utcnow()
         
-        # Update event participant count
-        event = Event.query.get(booking.event_id)
         if event:
-            event.current_participants = max(0, event.current_participants - 1)
+            promoted = release_seat(event)
+            record_activity(event.user_id, cancellations=1)
+            invalidate_segments(event.user_id)
         
         db.session.commit()
+        
+        if promoted:
+            notify_promoted([promoted])
+        
         return jsonify({'message': 'Booking cancelled successfully'}), 200
         
     except Exception as e:
@@ -155,10 +202,14 @@ def confirm_booking(event_id):
         return jsonify({'error': 'Missing booking reference or payment ID'}), 400
     
     # Check if user already has a booking for this event
-    existing_booking = Booking.query.filter_by(user_id=user_id, event_id=event_id).first()
+    existing_booking = live_booking(user_id, event_id)
     if existing_booking:
         return jsonify({'error': 'You already have a booking for this event'}), 400
     
+    # The primary key of booking_references also rejects a reference confirmed concurrently
+    if db.session.get(BookingReference, booking_reference):
+        return jsonify({'error': 'Booking reference already used'}), 400
+    
     try:
         # Create the actual booking
         booking = Booking()
@@ -171,9 +222,18 @@ def confirm_booking(event_id):
         booking.notes = notes
         
         db.session.add(booking)
-        
-        # Update event participant count
-        event.current_participants += 1
+        db.session.flush()
+        db.session.add(BookingReference(
+            booking_reference=booking_reference, booking_id=booking.id, booking_created_at=booking.created_at
+        ))
+        
+        # A promoted waitlist user already holds their seat
+        hold = active_hold(user_id, event_id)
+        if hold:
+            hold.status = 'booked'
+        else:
+            # Update event participant count
+            event.current_participants += 1
         
         # Commit the booking first to get the booking.id
         db.session.commit()
@@ -187,6 +247,10 @@ def confirm_booking(event_id):
         transaction.status = 'completed'
         transaction.payment_method = 'razorpay'
         db.session.add(transaction)
+        record_activity(event.user_id, bookings=1, revenue=event.price)
+        record_customer_activity(event.user_id, user, bookings=1, spent=event.price)
+        
+        invalidate_segments(event.user_id)
         
         # Commit the transaction
         db.session.commit()
@@ -222,7 +286,11 @@ def razorpay_webhook():
             
             if payment_id and booking_reference:
                 # Find booking by reference
-                booking = Booking.query.filter_by(booking_reference=booking_reference).first()
+                reference = db.session.get(BookingReference, booking_reference)
+                booking = Booking.query.filter(
+                    Booking.id == reference.booking_id,
+                    Booking.created_at == reference.booking_created_at
+                ).first() if reference else None
                 if booking:
                     # Update booking status if not already confirmed
                     if booking.status != 'confirmed':
@@ -240,7 +308,10 @@ def razorpay_webhook():
                             transaction.status = 'completed'
                             transaction.payment_method = 'razorpay'
                             db.session.add(transaction)
+                            record_activity(booking.event.user_id, revenue=booking.event.price)
+                            record_customer_activity(booking.event.user_id, booking.user, spent=booking.event.price)
                         
+                        invalidate_segments(booking.event.user_id)
                         db.session.commit()
                         
                         # Notify CRM
@@ -269,7 +340,8 @@ def create_razorpay_payment_for_event(event, booking_reference, user_id, notes):
             print("Razorpay credentials not properly configured")
             return None
         
-        # Initialize Razorpay client
+        # Initialize Razorpay client; the SDK is imported on first use to keep startup fast
+        import razorpay
         client = razorpay.Client(auth=(RAZORPAY_KEY_ID, RAZORPAY_KEY_SECRET))
         
         # Create payment order
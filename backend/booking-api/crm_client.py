@@ -0,0 +1,134 @@
+import os
+import queue
+import requests
+from crm_common.workers import BackgroundWorker
+
+
+def crm_url():
+    return os.getenv('CRM_URL', 'http://crm-service:5001/notify')
+
+
+def crm_base_url():
+    url = crm_url().rstrip('/')
+    return url[:-len('/notify')] if url.endswith('/notify') else url
+
+
+def fetch_notification_count(facilitator_id=None):
+    """Ask the CRM how many notifications it holds, optionally for one facilitator"""
+    params = {'facilitator_id': facilitator_id} if facilitator_id is not None else {}
+    response = requests.get(f'{crm_base_url()}/notifications/count', params=params, timeout=3)
+    response.raise_for_status()
+    return response.json().get('count', 0)
+
+
+def check_crm(timeout=1):
+    """Raise unless the CRM answers its liveness probe"""
+    response = requests.get(f'{crm_base_url()}/healthz', timeout=timeout)
+    response.raise_for_status()
+
+
+def fetch_notification_settings(facilitator_id):
+    """Read a facilitator's immediate/digest notification settings from the CRM"""
+    response = requests.get(f'{crm_base_url()}/facilitators/{facilitator_id}/notification-settings', timeout=3)
+    response.raise_for_status()
+    return response.json()
+
+
+def update_notification_settings(facilitator_id, settings):
+    """Forward a settings change to the CRM, returning its (status code, body)"""
+    response = requests.put(
+        f'{crm_base_url()}/facilitators/{facilitator_id}/notification-settings',
+        json=settings, headers=crm_headers(), timeout=3
+    )
+    return response.status_code, response.json()
+
+
+def crm_headers():
+    return {'Authorization': f"Bearer {os.getenv('CRM_BEARER_TOKEN', 'super-crm-token')}"}
+
+
+def build_notification(action, user, event, facilitator, booking=None, **extra):
+    """Build a CRM /notify payload from already-loaded rows"""
+    payload = {
+        'booking_id': booking.id if booking else None,
+        'facilitator_id': facilitator.id if facilitator else None,
+        'action': action,
+        'user': {
+            'id': user.id,
+            'name': user.name,
+            'email': user.email
+        } if user else None,
+        'event': {
+            'id': event.id,
+            'title': event.title
+        } if event else None,
+        'facilitator': {
+            'id': facilitator.id,
+            'name': facilitator.name,
+            'email': facilitator.email
+        } if facilitator else None,
+        'status': booking.status if booking else None,
+        'payment_status': booking.payment_status if booking else None
+    }
+    payload.update(extra)
+    return payload
+
+
+def send_notification(payload):
+    """POST a single notification to the CRM, returning True on success"""
+    try:
+        response = requests.post(crm_url(), json=payload, headers=crm_headers(), timeout=3)
+        return response.ok
+    except Exception as e:
+        print(f'Failed to notify CRM: {e}')
+        return False
+
+
+def post_notification_batch(payloads, session=None):
+    """POST notifications to the CRM batch endpoint, returning its per-item results"""
+    response = (session or requests).post(
+        f'{crm_base_url()}/notify/batch', json=payloads, headers=crm_headers(), timeout=10
+    )
+    response.raise_for_status()
+    return response.json().get('results', [])
+
+
+_queue = queue.Queue()
+
+
+def batch_size():
+    return int(os.getenv('CRM_NOTIFY_BATCH_SIZE', '100'))
+
+
+def enqueue_notifications(payloads):
+    """Hand notifications to the background sender so the caller never waits on the CRM"""
+    _worker.ensure_started()
+    for payload in payloads:
+        _queue.put(payload)
+
+
+def _next_batch():
+    batch = [_queue.get()]
+    while len(batch) < batch_size():
+        try:
+            batch.append(_queue.get_nowait())
+        except queue.Empty:
+            break
+    return batch
+
+
+def _drain():
+    session = requests.Session()
+    while True:
+        batch = _next_batch()
+        try:
+            # One request per batch; the CRM reports a status per notification
+            results = post_notification_batch(batch, session)
+            rejected = [r for r in results if r.get('status') != 'accepted']
+            if rejected:
+                print(f'CRM rejected {len(rejected)} of {len(batch)} notifications: {rejected}')
+        except Exception as e:
+            print(f'Failed to notify CRM of {len(batch)} notifications: {e}')
+
+
+_worker = BackgroundWorker(_drain, 'crm-notifier')
@@ -0,0 +1,151 @@
+from sqlalchemy import event
+from sqlalchemy.pool import NullPool, QueuePool
+import os
+import threading
+import time
+
+
+class PoolMetrics:
+    """Checkout counts and checkout wait times for one engine's connection pool"""
+
+    SLOW_CHECKOUT_SECONDS = 0.01
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.checkouts = 0
+            self.checkins = 0
+            self.connects = 0
+            self.invalidations = 0
+            self.checkout_errors = 0
+            self.wait_total = 0.0
+            self.wait_max = 0.0
+            self.slow_checkouts = 0
+
+    def record_wait(self, seconds, failed=False):
+        with self._lock:
+            if failed:
+                self.checkout_errors += 1
+                return
+            self.checkouts += 1
+            self.wait_total += seconds
+            self.wait_max = max(self.wait_max, seconds)
+            if seconds >= self.SLOW_CHECKOUT_SECONDS:
+                self.slow_checkouts += 1
+
+    def count(self, name):
+        with self._lock:
+            setattr(self, name, getattr(self, name) + 1)
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                'checkouts': self.checkouts,
+                'checkins': self.checkins,
+                'connects': self.connects,
+                'invalidations': self.invalidations,
+                'checkout_errors': self.checkout_errors,
+                'slow_checkouts': self.slow_checkouts,
+                'wait_avg_ms': round(self.wait_total / self.checkouts * 1000, 3) if self.checkouts else 0.0,
+                'wait_max_ms': round(self.wait_max * 1000, 3),
+                'wait_total_ms': round(self.wait_total * 1000, 3)
+            }
+
+
+# Metrics of each engine's pool by bind name ('primary' for the default engine); every engine
+# uses the same metered pool class, so instrument() hands each pool its own
+pool_metrics = {}
+
+
+def metered(pool_class):
+    """Subclass a pool so every checkout is timed, including waits for a free connection and pre-ping"""
+
+    class MeteredPool(pool_class):
+        metrics = None
+
+        def recreate(self):
+            # engine.dispose() swaps in a new pool, which keeps reporting to the same metrics
+            pool = super().recreate()
+            pool.metrics = self.metrics
+            return pool
+
+        def connect(self):
+            if self.metrics is None:
+                return super().connect()
+            started = time.perf_counter()
+            try:
+                connection = super().connect()
+            except Exception:
+                self.metrics.record_wait(0, failed=True)
+                raise
+            self.metrics.record_wait(time.perf_counter() - started)
+            return connection
+
+    MeteredPool.__name__ = MeteredPool.__qualname__ = f'Metered{pool_class.__name__}'
+    return MeteredPool
+
+
+def env_flag(name, default='false'):
+    return os.getenv(name, default).lower() in ('1', 'true', 'yes')
+
+
+def engine_options(database_url):
+    """SQLAlchemy engine options from the DB_POOL_* environment variables.
+
+    DB_PGBOUNCER=true makes connections safe for PgBouncer transaction pooling:
+    no server-side prepared statements, and with DB_POOL_CLASS=null no pool
+    of our own so PgBouncer does all the pooling.
+    """
+    pgbouncer = env_flag('DB_PGBOUNCER')
+    pool_class = os.getenv('DB_POOL_CLASS', 'null' if pgbouncer else 'queue').lower()
+    options = {
+        'pool_pre_ping': env_flag('DB_POOL_PRE_PING', 'true'),
+        'connect_args': {}
+    }
+
+    if pool_class == 'null':
+        options['poolclass'] = metered(NullPool)
+    elif database_url not in ('sqlite://', 'sqlite:///:memory:'):
+        options.update({
+            'poolclass': metered(QueuePool),
+            'pool_size': int(os.getenv('DB_POOL_SIZE', '5')),
+            'max_overflow': int(os.getenv('DB_MAX_OVERFLOW', '10')),
+            'pool_timeout': float(os.getenv('DB_POOL_TIMEOUT', '30')),
+            # Connections older than this are replaced at checkout; -1 keeps them forever
+            'pool_recycle': int(os.getenv('DB_POOL_RECYCLE', '1800')),
+            'pool_use_lifo': env_flag('DB_POOL_LIFO')
+        })
+
+    if pgbouncer and database_url.startswith('postgresql+psycopg:'):
+        # psycopg 3 prepares repeated statements server-side, and PgBouncer may run the next
+        # transaction on a different backend; psycopg2 never prepares, so it needs nothing here
+        options['connect_args']['prepare_threshold'] = None
+    return options
+
+
+def instrument(engine, name):
+    """Give the engine's pool its own metrics under name and count its lifecycle events"""
+    metrics = pool_metrics.setdefault(name, PoolMetrics())
+    engine.pool.metrics = metrics
+    event.listen(engine, 'connect', lambda *args: metrics.count('connects'))
+    event.listen(engine.pool, 'checkin', lambda *args: metrics.count('checkins'))
+    event.listen(engine.pool, 'invalidate', lambda *args: metrics.count('invalidations'))
+
+
+def pool_status(engine):
+    pool = engine.pool
+    status = {'pool_class': type(pool).__name__}
+    if getattr(pool, 'metrics', None) is not None:
+        status.update(pool.metrics.snapshot())
+    if isinstance(pool, QueuePool):
+        status.update({
+            'size': pool.size(),
+            'checked_out': pool.checkedout(),
+            'checked_in': pool.checkedin(),
+            'overflow': pool.overflow(),
+            'timeout': pool.timeout()
+        })
+    return status
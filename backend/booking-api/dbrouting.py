@@ -0,0 +1,111 @@
+from flask import g, has_app_context, request
+from flask_jwt_extended import get_jwt_identity
+from flask_sqlalchemy.session import Session
+from sqlalchemy.sql.dml import UpdateBase
+from functools import wraps
+from dbpool import engine_options
+import os
+import threading
+import time
+
+REPLICA_BIND = 'replica'
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS')
+# Successful writes return their time in this header; clients echo it so any worker can honor it
+LAST_WRITE_HEADER = 'X-Last-Write'
+
+
+class RoutingSession(Session):
+    """Session that sends reads from read-only requests to the replica bind.
+
+    Flushes and INSERT/UPDATE/DELETE statements always go to the primary,
+    as does everything when no replica is configured.
+    """
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if (bind is None and not self._flushing and not isinstance(clause, UpdateBase)
+                and has_app_context() and g.get('read_only')):
+            replica = self._db.engines.get(REPLICA_BIND)
+            if replica is not None:
+                return replica
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+
+class RecentWriters:
+    """Users who wrote within the last `window` seconds, whose reads stay on the primary.
+
+    Tracked per worker process, so the window should comfortably exceed replica lag.
+    Other workers only know of the write through the X-Last-Write header the client echoes.
+    """
+
+    def __init__(self, window):
+        self.window = window
+        self._lock = threading.Lock()
+        self._until = {}
+
+    def record(self, user_id):
+        now = time.monotonic()
+        with self._lock:
+            self._until[user_id] = now + self.window
+            # Drop expired entries now and then instead of on every lookup
+            if len(self._until) > 10000:
+                self._until = {key: until for key, until in self._until.items() if until > now}
+
+    def is_sticky(self, user_id):
+        with self._lock:
+            until = self._until.get(user_id)
+        return until is not None and until > time.monotonic()
+
+
+recent_writers = RecentWriters(float(os.getenv('DB_REPLICA_STICKY_SECONDS', '5')))
+
+
+def replica_binds():
+    """SQLALCHEMY_BINDS for the replica in DATABASE_REPLICA_URL, if one is configured.
+
+    Flask-SQLAlchemy applies SQLALCHEMY_ENGINE_OPTIONS to the primary only, so the
+    replica is given the same DB_POOL_* options, and a metered pool, here.
+    """
+    url = os.getenv('DATABASE_REPLICA_URL')
+    return {REPLICA_BIND: {'url': url, **engine_options(url)}} if url else {}
+
+
+def current_user_id():
+    try:
+        return get_jwt_identity()
+    except RuntimeError:
+        # No JWT was verified for this request
+        return None
+
+
+def echoed_recent_write():
+    """Whether the request echoes an X-Last-Write within the sticky window"""
+    try:
+        written = float(request.headers.get(LAST_WRITE_HEADER, ''))
+    except ValueError:
+        return False
+    # A client can only send its own reads to the primary with this, so it is not verified
+    return time.time() - written < recent_writers.window
+
+
+def read_only(fn):
+    """Serve the view's queries from the replica unless the user wrote very recently.
+
+    Goes below @jwt_required() so the identity is known.
+    """
+    @wraps(fn)
+    def wrapper(*args, **kwargs):
+        user_id = current_user_id()
+        sticky = echoed_recent_write() or (user_id is not None and recent_writers.is_sticky(user_id))
+        g.read_only = not sticky
+        return fn(*args, **kwargs)
+    return wrapper
+
+
+def track_writes(response):
+    """after_request hook: start the read-your-writes window after a successful write"""
+    if request.method not in SAFE_METHODS and response.status_code < 400:
+        response.headers[LAST_WRITE_HEADER] = f'{time.time():.3f}'
+        user_id = current_user_id()
+        if user_id is not None:
+            recent_writers.record(user_id)
+    return response
@@ -0,0 +1,54 @@
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.ext.compiler import compiles
+from sqlalchemy.schema import CreateColumn, PrimaryKeyConstraint
+from extensions import db
+
+
+def range_partitioned(partition_key):
+    """Table kwargs for a table range-partitioned on partition_key in Postgres.
+
+    Postgres requires the partition key in the primary key; elsewhere the key
+    is dropped from it again (see below) so the id keeps autoincrementing.
+    """
+    return {'postgresql_partition_by': f'RANGE ({partition_key})', 'info': {'partition_key': partition_key}}
+
+
+@compiles(PrimaryKeyConstraint, 'sqlite')
+def _sqlite_primary_key(constraint, compiler, **kw):
+    # SQLite only autoincrements a single INTEGER PRIMARY KEY column
+    partition_key = constraint.table.info.get('partition_key') if constraint.table is not None else None
+    if partition_key and partition_key in constraint.columns:
+        columns = [column for column in constraint.columns if column.name != partition_key]
+        return 'PRIMARY KEY (%s)' % ', '.join(compiler.preparer.quote(column.name) for column in columns)
+    return compiler.visit_primary_key_constraint(constraint, **kw)
+
+
+@compiles(CreateColumn, 'sqlite')
+def _sqlite_create_column(create, compiler, **kw):
+    # The id of a partitioned table is marked autoincrement for Postgres, which SQLite refuses
+    # for composite keys; with the key narrowed to (id) it autoincrements as the rowid anyway
+    column = create.element
+    if column.table is not None and column.table.info.get('partition_key') and column.autoincrement is True:
+        return f'{compiler.preparer.format_column(column)} {compiler.type_compiler.process(column.type)} NOT NULL'
+    return compiler.visit_create_column(create, **kw)
+
+
+def dialect_insert(model):
+    """INSERT construct that supports ON CONFLICT for the active database"""
+    if db.session.get_bind().dialect.name == 'postgresql':
+        return postgresql.insert(model)
+    return sqlite.insert(model)
+
+
+def upsert_increment(model, keys, increments, replace=None):
+    """Insert a row for keys, or add increments to the existing one, in a single statement.
+
+    Columns in replace are overwritten with the new values on conflict.
+    """
+    replace = replace or {}
+    stmt = dialect_insert(model).values(**keys, **increments, **replace)
+    columns = model.__table__.c
+    set_ = {name: columns[name] + stmt.excluded[name] for name in increments}
+    set_.update({name: stmt.excluded[name] for name in replace})
+    stmt = stmt.on_conflict_do_update(index_elements=list(keys), set_=set_)
+    db.session.execute(stmt)
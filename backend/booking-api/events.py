@@ -2,12 +2,14 @@ from flask import Blueprint, jsonify, request
 from flask_jwt_extended import jwt_required, get_jwt_identity
 from models import Event, User
 from extensions import db
+from dbrouting import read_only
 from datetime import datetime
 
 bp = Blueprint('events', __name__)
 
 @bp.route('/events', methods=['GET'])
 @jwt_required()
+@read_only
 def list_events():
     events = Event.query.filter_by(is_active=True).all()
     result = []
@@ -36,9 +38,10 @@ def list_events():
 
 @bp.route('/events/<int:event_id>', methods=['GET'])
 @jwt_required()
+@read_only
 def get_event(event_id):
     event = Event.query.get(event_id)
-    if not event:
+    if not event or event.deleted_at:
         return jsonify({'error': 'Event not found'}), 404
     
     user = User.query.get(event.user_id)
@@ -1,7 +1,8 @@
 from flask_sqlalchemy import SQLAlchemy
 from flask_jwt_extended import JWTManager
 from authlib.integrations.flask_client import OAuth #type: ignore
+from dbrouting import RoutingSession
 
-db = SQLAlchemy()
+db = SQLAlchemy(session_options={'class_': RoutingSession})
 jwt = JWTManager()
 oauth = OAuth() 
\ No newline at end of file
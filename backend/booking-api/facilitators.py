@@ -1,9 +1,23 @@
-from flask import Blueprint, jsonify, request
+from flask import Blueprint, Response, jsonify, request, stream_with_context
 from flask_jwt_extended import jwt_required, get_jwt_identity
-from models import Event, Booking, User, CRMNotification
+from models import Event, Booking, User, Transaction, CRMNotification, WaitlistEntry, CustomerSummary
 from extensions import db
+from dbrouting import read_only
+from archive import include_archived, reader as archive_reader
+from partitions import created_since
+from crm_client import (build_notification, enqueue_notifications, fetch_notification_count,
+                        fetch_notification_settings, update_notification_settings)
+from analytics import record_activity
+from segments import invalidate_segments
+from waitlist import ENDED_BOOKING_STATUSES
+from tasks import submit
 from datetime import datetime
+from decimal import Decimal
 import requests
+import base64
+import csv
+import io
+import json
 import os
 
 bp = Blueprint('facilitators', __name__)
@@ -13,6 +27,7 @@ def is_facilitator(user):
 
 @bp.route('/facilitator/dashboard', methods=['GET'])
 @jwt_required()
+@read_only
 def facilitator_dashboard():
     user_id = get_jwt_identity()
     user = User.query.get(user_id)
@@ -30,7 +45,9 @@ def facilitator_dashboard():
     # Get total revenue
     total_revenue = 0
     for event in events:
-        bookings = Booking.query.filter_by(event_id=event.id, payment_status='completed').all()
+        bookings = Booking.query.filter_by(event_id=event.id, payment_status='completed').filter(
+            created_since(Booking, event.created_at)
+        ).all()
         total_revenue += sum(float(event.price) for _ in bookings)
     
     # Get recent bookings
@@ -72,16 +89,17 @@ def facilitator_dashboard():
 
 @bp.route('/facilitator/events', methods=['GET'])
 @jwt_required()
+@read_only
 def facilitator_events():
     user_id = get_jwt_identity()
     user = User.query.get(user_id)
     if not user or user.role != 'facilitator':
         return jsonify({'error': 'Not authorized'}), 403
-    events = Event.query.filter_by(user_id=user_id).order_by(Event.created_at.desc()).all()
+    events = Event.query.filter_by(user_id=user_id, deleted_at=None).order_by(Event.created_at.desc()).all()
     result = []
     for event in events:
         # Get booking count for this event
-        booking_count = Booking.query.filter_by(event_id=event.id).count()
+        booking_count = Booking.query.filter_by(event_id=event.id).filter(created_since(Booking, event.created_at)).count()
         result.append({
             'id': event.id,
             'title': event.title,
@@ -99,10 +117,26 @@ def facilitator_events():
             'booking_count': booking_count,
             'created_at': event.created_at.isoformat() if event.created_at else None
         })
+    if include_archived():
+        for document in archive_reader.documents(facilitator_id=int(user_id), exclude_event_ids={e.id for e in events}):
+            event = document['event']
+            if event['deleted_at']:
+                continue
+            result.append({
+                **{key: event[key] for key in (
+                    'id', 'title', 'description', 'event_type', 'start_datetime', 'end_datetime', 'location',
+                    'virtual_link', 'max_participants', 'current_participants', 'currency', 'is_active', 'created_at'
+                )},
+                'price': float(event['price']),
+                'booking_count': len(document['bookings']),
+                'archived': True
+            })
+        result.sort(key=lambda e: e['created_at'] or '', reverse=True)
     return jsonify(result)
 
 @bp.route('/facilitator/events/<int:event_id>', methods=['GET'])
 @jwt_required()
+@read_only
 def get_event(event_id):
     user_id = get_jwt_identity()
     user = User.query.get(user_id)
@@ -124,7 +158,7 @@ def get_event(event_id):
     if user.role != 'facilitator':
         return jsonify({'error': 'Only facilitators can access this endpoint'}), 403
     
-    if not event:
+    if not event or event.deleted_at:
         return jsonify({'error': 'Event not found'}), 404
     
     # Convert both IDs to int for comparison
@@ -162,7 +196,7 @@ def update_event(event_id):
     if user.role != 'facilitator':
         return jsonify({'error': 'Only facilitators can access this endpoint'}), 403
     
-    if not event:
+    if not event or event.deleted_at:
         return jsonify({'error': 'Event not found'}), 404
     
     # Convert both IDs to int for comparison
@@ -197,7 +231,7 @@ def delete_event(event_id):
     if user.role != 'facilitator':
         return jsonify({'error': 'Only facilitators can access this endpoint'}), 403
     
-    if not event:
+    if not event or event.deleted_at:
         return jsonify({'error': 'Event not found'}), 404
     
     # Convert both IDs to int for comparison
@@ -205,22 +239,82 @@ def delete_event(event_id):
         return jsonify({'error': 'Not authorized to access this event'}), 403
     
     try:
-        # Cancel all bookings for this event
-        bookings = Booking.query.filter_by(event_id=event_id).all()
-        for booking in bookings:
-            booking.status = 'cancelled'
-            booking.cancelled_at = datetime.utcnow()
-        
-        # Delete the event
-        db.session.delete(event)
+        # Soft-delete right away; bookings are cancelled in the background
+        event.is_active = False
+        event.deleted_at = datetime.utcnow()
         db.session.commit()
-        return jsonify({'message': 'Event deleted successfully'}), 200
+        
+        submit(cancel_event_bookings, event_id)
+        return jsonify({'message': 'Event deleted successfully, bookings are being cancelled'}), 202
     except Exception as e:
         db.session.rollback()
         return jsonify({'error': 'Failed to delete event', 'details': str(e)}), 400
 
+def cancel_event_bookings(event_id, chunk_size=None):
+    """Cancel every live booking of a deleted event in bounded chunks.
+
+    Each chunk is one UPDATE ... RETURNING committed on its own, so row locks
+    are held briefly, and the affected users are queued for a 'cancelled'
+    CRM notification. Safe to re-run after an interruption.
+    """
+    chunk_size = chunk_size or int(os.getenv('EVENT_DELETE_CHUNK_SIZE', '500'))
+    event = Event.query.get(event_id)
+    if not event:
+        return 0
+    facilitator = User.query.get(event.user_id)
+    live = db.and_(Booking.status.notin_(['cancelled', 'rejected']), created_since(Booking, event.created_at))
+    
+    # Nobody can be promoted into a deleted event
+    WaitlistEntry.query.filter(
+        WaitlistEntry.event_id == event_id,
+        WaitlistEntry.status.in_(['waiting', 'promoted'])
+    ).update({'status': 'cancelled'}, synchronize_session=False)
+    db.session.commit()
+    
+    cancelled = 0
+    while True:
+        chunk = db.select(Booking.id).where(Booking.event_id == event_id, live).order_by(Booking.id).limit(chunk_size)
+        rows = db.session.execute(
+            db.update(Booking).where(Booking.id.in_(chunk), live).values(
+                status='cancelled',
+                cancelled_at=datetime.utcnow()
+            ).returning(Booking.id, Booking.user_id, Booking.status, Booking.payment_status)
+        ).all()
+        if rows:
+            record_activity(event.user_id, cancellations=len(rows))
+        db.session.commit()
+        if not rows:
+            break
+        
+        users = {u.id: u for u in User.query.filter(User.id.in_({row.user_id for row in rows})).all()}
+        enqueue_notifications([
+            build_notification('cancelled', users.get(row.user_id), event, facilitator, row)
+            for row in rows
+        ])
+        cancelled += len(rows)
+    
+    Event.query.filter_by(id=event_id).update({'current_participants': 0}, synchronize_session=False)
+    invalidate_segments(event.user_id)
+    db.session.commit()
+    print(f'Cancelled {cancelled} bookings for deleted event {event_id}')
+    return cancelled
+
+@bp.cli.command('finish-deletions')
+def finish_deletions_command():
+    """Cancel bookings left behind by event deletions that were interrupted."""
+    event_ids = [row[0] for row in db.session.query(Booking.event_id).join(
+        Event, Booking.event_id == Event.id
+    ).filter(
+        Event.deleted_at.isnot(None),
+        Booking.status.notin_(['cancelled', 'rejected'])
+    ).distinct().all()]
+    for event_id in event_ids:
+        cancel_event_bookings(event_id)
+    print(f'Finished deletion of {len(event_ids)} events')
+
 @bp.route('/facilitator/bookings', methods=['GET'])
 @jwt_required()
+@read_only
 def facilitator_bookings():
     user_id = get_jwt_identity()
     user = User.query.get(user_id)
@@ -256,6 +350,26 @@ def facilitator_bookings():
                 'email': booking_user.email if booking_user else None
             } if booking_user else None
         })
+    if include_archived():
+        live_events = {booking.event_id for booking in bookings}
+        for document in archive_reader.documents(facilitator_id=int(user_id), exclude_event_ids=live_events):
+            event = document['event']
+            for booking in document['bookings']:
+                result.append({
+                    **{key: booking[key] for key in (
+                        'id', 'booking_reference', 'status', 'payment_status', 'notes', 'created_at', 'cancelled_at'
+                    )},
+                    'event': {
+                        'id': event['id'],
+                        'title': event['title'],
+                        'start_datetime': event['start_datetime'],
+                        'end_datetime': event['end_datetime'],
+                        'price': float(event['price'])
+                    },
+                    'user': booking['user'],
+                    'archived': True
+                })
+        result.sort(key=lambda b: b['created_at'] or '', reverse=True)
     return jsonify(result)
 
 @bp.route('/facilitator/bookings/<int:booking_id>/approve', methods=['PUT'])
@@ -287,6 +401,7 @@ def approve_booking(booking_id):
     try:
         booking.status = 'confirmed'
         booking.payment_status = 'completed'
+        invalidate_segments(event.user_id)
         db.session.commit()
         
         # Notify CRM
@@ -324,8 +439,11 @@ def reject_booking(booking_id):
         return jsonify({'error': 'Not authorized to access this event'}), 403
     
     try:
+        if booking.status not in ['cancelled', 'rejected']:
+            record_activity(event.user_id, cancellations=1)
         booking.status = 'rejected'
         booking.payment_status = 'refunded'
+        invalidate_segments(event.user_id)
         db.session.commit()
         
         # Notify CRM
@@ -336,8 +454,108 @@ def reject_booking(booking_id):
         db.session.rollback()
         return jsonify({'error': 'Failed to reject booking', 'details': str(e)}), 400
 
+# action -> (booking status, payment status, CRM action)
+BULK_ACTIONS = {
+    'approve': ('confirmed', 'completed', 'approved'),
+    'reject': ('rejected', 'refunded', 'rejected')
+}
+
+@bp.route('/facilitator/bookings/bulk', methods=['PUT'])
+@jwt_required()
+def bulk_update_bookings():
+    user_id = get_jwt_identity()
+    user = User.query.get(user_id)
+    if not user or user.role != 'facilitator':
+        return jsonify({'error': 'Not authorized'}), 403
+    
+    data = request.get_json() or {}
+    action = data.get('action')
+    if action not in BULK_ACTIONS:
+        return jsonify({'error': 'Action must be one of: approve, reject'}), 400
+    
+    booking_ids = data.get('booking_ids')
+    if not isinstance(booking_ids, list) or not booking_ids:
+        return jsonify({'error': 'booking_ids must be a non-empty list'}), 400
+    try:
+        booking_ids = sorted({int(booking_id) for booking_id in booking_ids})
+    except (TypeError, ValueError):
+        return jsonify({'error': 'booking_ids must be integers'}), 400
+    
+    max_bulk = int(os.getenv('MAX_BULK_BOOKINGS', '1000'))
+    if len(booking_ids) > max_bulk:
+        return jsonify({'error': f'At most {max_bulk} bookings can be updated at once'}), 400
+    
+    # Authorize the whole set in one query; this also loads what the notifications need and
+    # locks the bookings so their status can't change before the update
+    rows = db.session.query(Booking, Event, User).join(
+        Event, Booking.event_id == Event.id
+    ).outerjoin(
+        User, Booking.user_id == User.id
+    ).filter(
+        Booking.id.in_(booking_ids),
+        Event.user_id == user_id
+    ).with_for_update(of=Booking).all()
+    
+    owned = {booking.id for booking, _, _ in rows}
+    if len(owned) != len(booking_ids):
+        return jsonify({
+            'error': 'Some bookings were not found or belong to another facilitator',
+            'booking_ids': [booking_id for booking_id in booking_ids if booking_id not in owned]
+        }), 403
+    
+    status, payment_status, crm_action = BULK_ACTIONS[action]
+    # Cancelled and rejected bookings have given up their seat, so neither action may move them
+    movable = [(booking, event, booking_user) for booking, event, booking_user in rows
+               if booking.status not in ENDED_BOOKING_STATUSES]
+    updated = sorted(booking.id for booking, _, _ in movable)
+    skipped = [booking_id for booking_id in booking_ids if booking_id not in set(updated)]
+    if not updated:
+        db.session.rollback()
+        return jsonify({
+            'message': '0 bookings updated successfully',
+            'action': action,
+            'booking_ids': [],
+            'skipped_booking_ids': skipped
+        }), 200
+    
+    try:
+        if action == 'reject':
+            record_activity(user.id, cancellations=len(updated))
+        # The bookings are loaded, so the update only visits the partitions they are in
+        since = min(booking.created_at for booking, _, _ in movable)
+        Booking.query.filter(Booking.id.in_(updated), created_since(Booking, since)).update({
+            'status': status,
+            'payment_status': payment_status
+        }, synchronize_session=False)
+        db.session.execute(db.insert(CRMNotification), [{
+            'booking_id': booking_id,
+            'status': f'facilitator_{crm_action}',
+            'response': 'Notification queued'
+        } for booking_id in updated])
+        invalidate_segments(user.id)
+        # Built before the commit expires the loaded rows, which would reload them one by one
+        payloads = [
+            build_notification(crm_action, booking_user, event, user, booking,
+                               status=status, payment_status=payment_status)
+            for booking, event, booking_user in movable
+        ]
+        db.session.commit()
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'error': f'Failed to {action} bookings', 'details': str(e)}), 400
+    
+    enqueue_notifications(payloads)
+    
+    return jsonify({
+        'message': f'{len(updated)} bookings updated successfully',
+        'action': action,
+        'booking_ids': updated,
+        'skipped_booking_ids': skipped
+    }), 200
+
 @bp.route('/facilitator/transactions', methods=['GET'])
 @jwt_required()
+@read_only
 def facilitator_transactions():
     user_id = get_jwt_identity()
     user = User.query.get(user_id)
@@ -376,13 +594,158 @@ def facilitator_transactions():
             } if booking_user else None
         })
     
+    if include_archived():
+        live_events = {booking.event_id for booking in bookings}
+        for document in archive_reader.documents(facilitator_id=int(user_id), exclude_event_ids=live_events):
+            event = document['event']
+            for booking in document['bookings']:
+                if booking['payment_status'] != 'completed':
+                    continue
+                revenue = float(event['price'])
+                total_revenue += revenue
+                result.append({
+                    'id': booking['id'],
+                    'booking_reference': booking['booking_reference'],
+                    'amount': revenue,
+                    'currency': event['currency'],
+                    'status': booking['status'],
+                    'created_at': booking['created_at'],
+                    'event': {'id': event['id'], 'title': event['title']},
+                    'user': booking['user'],
+                    'archived': True
+                })
+        result.sort(key=lambda t: t['created_at'] or '', reverse=True)
+    
     return jsonify({
         'transactions': result,
         'total_revenue': round(total_revenue, 2)
     })
 
+EXPORT_MIMETYPES = {
+    'csv': 'text/csv',
+    'ndjson': 'application/x-ndjson'
+}
+
+def export_value(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    if isinstance(value, Decimal):
+        return float(value)
+    return value
+
+def stream_export(query, columns, fmt, filename):
+    """Stream query rows as CSV or NDJSON without materializing the result.
+
+    Rows come off a server-side cursor via yield_per, are encoded as they
+    arrive and flushed in ~64KB chunks. The CSV header goes out before the
+    first fetch and the first row is flushed on its own, so clients of
+    either format start receiving immediately.
+    """
+    flush_at = 64 * 1024
+    
+    def generate():
+        buffer = io.StringIO()
+        writer = csv.writer(buffer) if fmt == 'csv' else None
+        if writer:
+            writer.writerow(columns)
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+        
+        threshold = 0
+        for row in query.yield_per(int(os.getenv('EXPORT_YIELD_PER', '1000'))):
+            values = [export_value(value) for value in row]
+            if writer:
+                writer.writerow(values)
+            else:
+                buffer.write(json.dumps(dict(zip(columns, values))))
+                buffer.write('\n')
+            if buffer.tell() >= threshold:
+                yield buffer.getvalue()
+                buffer.seek(0)
+                buffer.truncate()
+                threshold = flush_at
+        
+        if buffer.tell():
+            yield buffer.getvalue()
+    
+    return Response(
+        stream_with_context(generate()),
+        mimetype=EXPORT_MIMETYPES[fmt],
+        headers={'Content-Disposition': f'attachment; filename={filename}.{fmt}'}
+    )
+
+@bp.route('/facilitator/bookings/export', methods=['GET'])
+@jwt_required()
+@read_only
+def export_facilitator_bookings():
+    user_id = get_jwt_identity()
+    user = User.query.get(user_id)
+    if not user or user.role != 'facilitator':
+        return jsonify({'error': 'Not authorized'}), 403
+    
+    fmt = request.args.get('format', 'csv')
+    if fmt not in EXPORT_MIMETYPES:
+        return jsonify({'error': 'Format must be one of: csv, ndjson'}), 400
+    
+    columns = [
+        'id', 'booking_reference', 'status', 'payment_status', 'notes', 'created_at', 'cancelled_at',
+        'event_id', 'event_title', 'event_start_datetime', 'event_end_datetime', 'event_price',
+        'user_id', 'user_name', 'user_email'
+    ]
+    query = db.session.query(
+        Booking.id, Booking.booking_reference, Booking.status, Booking.payment_status, Booking.notes,
+        Booking.created_at, Booking.cancelled_at,
+        Event.id, Event.title, Event.start_datetime, Event.end_datetime, Event.price,
+        User.id, User.name, User.email
+    ).select_from(Booking).join(
+        Event, Booking.event_id == Event.id
+    ).outerjoin(
+        User, Booking.user_id == User.id
+    ).filter(
+        Event.user_id == user_id
+    ).order_by(Booking.created_at.desc(), Booking.id.desc())
+    
+    return stream_export(query, columns, fmt, 'bookings')
+
+@bp.route('/facilitator/transactions/export', methods=['GET'])
+@jwt_required()
+@read_only
+def export_facilitator_transactions():
+    user_id = get_jwt_identity()
+    user = User.query.get(user_id)
+    if not user or user.role != 'facilitator':
+        return jsonify({'error': 'Not authorized'}), 403
+    
+    fmt = request.args.get('format', 'csv')
+    if fmt not in EXPORT_MIMETYPES:
+        return jsonify({'error': 'Format must be one of: csv, ndjson'}), 400
+    
+    columns = [
+        'id', 'payment_id', 'amount', 'currency', 'status', 'payment_method', 'created_at',
+        'booking_id', 'booking_reference', 'event_id', 'event_title',
+        'user_id', 'user_name', 'user_email'
+    ]
+    query = db.session.query(
+        Transaction.id, Transaction.payment_id, Transaction.amount, Transaction.currency, Transaction.status,
+        Transaction.payment_method, Transaction.created_at,
+        Booking.id, Booking.booking_reference, Event.id, Event.title,
+        User.id, User.name, User.email
+    ).select_from(Transaction).join(
+        Booking, Transaction.booking_id == Booking.id
+    ).join(
+        Event, Booking.event_id == Event.id
+    ).outerjoin(
+        User, Booking.user_id == User.id
+    ).filter(
+        Event.user_id == user_id
+    ).order_by(Transaction.created_at.desc(), Transaction.id.desc())
+    
+    return stream_export(query, columns, fmt, 'transactions')
+
 @bp.route('/facilitator/crm/stats', methods=['GET'])
 @jwt_required()
+@read_only
 def facilitator_crm_stats():
     user_id = get_jwt_identity()
     user = User.query.get(user_id)
@@ -390,87 +753,156 @@ def facilitator_crm_stats():
         return jsonify({'error': 'Not authorized'}), 403
     
     try:
-        # Get all bookings for facilitator's events with explicit joins
-        bookings = db.session.query(Booking).join(
-            Event, Booking.event_id == Event.id
-        ).filter(
-            Event.user_id == user_id
-        ).all()
-        
-        # Get unique customers with explicit joins
-        unique_customers = db.session.query(Booking.user_id).join(
+        # Customers, revenue and completed bookings in one grouped statement;
+        # revenue comes from the recorded transactions, not the current event price
+        completed = Booking.payment_status == 'completed'
+        unique_customers, total_revenue, completed_bookings = db.session.query(
+            db.func.count(db.distinct(Booking.user_id)),
+            db.func.coalesce(db.func.sum(db.case((completed, Transaction.amount), else_=0)), 0),
+            db.func.count(db.distinct(db.case((completed, Booking.id))))
+        ).select_from(Booking).join(
             Event, Booking.event_id == Event.id
+        ).outerjoin(
+            Transaction, db.and_(
+                Transaction.booking_id == Booking.id,
+                Transaction.status == 'completed'
+            )
         ).filter(
             Event.user_id == user_id
-        ).distinct().count()
-        
-        # Calculate total revenue
-        total_revenue = 0
-        for booking in bookings:
-            if booking.payment_status == 'completed':
-                event = Event.query.get(booking.event_id)
-                if event:
-                    total_revenue += float(event.price)
+        ).one()
         
-        # Calculate average booking value
-        completed_bookings = [b for b in bookings if b.payment_status == 'completed']
-        avg_booking_value = total_revenue / len(completed_bookings) if completed_bookings else 0
+        total_revenue = float(total_revenue)
+        avg_booking_value = total_revenue / completed_bookings if completed_bookings else 0
         
-        # Get total notifications from CRM service
+        # Get notification count from CRM service
         try:
-            import requests
-            crm_response = requests.get('http://crm-service:5001/notifications', timeout=3)
-            total_notifications = len(crm_response.json()) if crm_response.ok else 0
-        except:
+            total_notifications = fetch_notification_count(user_id)
+        except Exception:
             total_notifications = 0
         
         return jsonify({
             'total_customers': unique_customers,
             'total_notifications': total_notifications,
             'total_revenue': round(total_revenue, 2),
+            'completed_bookings': completed_bookings,
             'average_booking_value': round(avg_booking_value, 2)
         })
         
     except Exception as e:
         return jsonify({'error': 'Failed to get CRM stats', 'details': str(e)}), 400
 
+# sort parameter -> summary column
+CUSTOMER_SORTS = {
+    'last_booking': CustomerSummary.last_booking_at,
+    'total_spent': CustomerSummary.total_spent,
+    'total_bookings': CustomerSummary.total_bookings
+}
+
+def encode_cursor(value, customer_id):
+    value = export_value(value)
+    return base64.urlsafe_b64encode(json.dumps([value, customer_id]).encode()).decode()
+
+def decode_cursor(sort, cursor):
+    value, customer_id = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+    if sort == 'last_booking':
+        value = datetime.fromisoformat(value)
+    elif sort == 'total_spent':
+        value = Decimal(str(value))
+    return value, int(customer_id)
+
+@bp.route('/facilitator/crm/notification-settings', methods=['GET'])
+@jwt_required()
+def facilitator_notification_settings():
+    user_id = get_jwt_identity()
+    user = User.query.get(user_id)
+    if not user or user.role != 'facilitator':
+        return jsonify({'error': 'Not authorized'}), 403
+    
+    try:
+        return jsonify(fetch_notification_settings(user.id))
+    except Exception as e:
+        return jsonify({'error': 'Failed to load notification settings', 'details': str(e)}), 400
+
+@bp.route('/facilitator/crm/notification-settings', methods=['PUT'])
+@jwt_required()
+def update_facilitator_notification_settings():
+    user_id = get_jwt_identity()
+    user = User.query.get(user_id)
+    if not user or user.role != 'facilitator':
+        return jsonify({'error': 'Not authorized'}), 403
+    
+    data = request.get_json(silent=True) or {}
+    settings = {key: data[key] for key in ('mode', 'window_minutes') if key in data}
+    try:
+        status, body = update_notification_settings(user.id, settings)
+    except Exception as e:
+        return jsonify({'error': 'Failed to update notification settings', 'details': str(e)}), 400
+    return jsonify(body), status
+
 @bp.route('/facilitator/crm/customers', methods=['GET'])
 @jwt_required()
+@read_only
 def facilitator_crm_customers():
     user_id = get_jwt_identity()
     user = User.query.get(user_id)
     if not user or user.role != 'facilitator':
         return jsonify({'error': 'Not authorized'}), 403
     
+    sort = request.args.get('sort', 'last_booking')
+    if sort not in CUSTOMER_SORTS:
+        return jsonify({'error': 'Sort must be one of: last_booking, total_spent, total_bookings'}), 400
+    order = request.args.get('order', 'desc')
+    if order not in ('asc', 'desc'):
+        return jsonify({'error': 'Order must be asc or desc'}), 400
+    limit = min(max(request.args.get('limit', 50, type=int), 1), 200)
+    search = (request.args.get('q') or '').strip().lower()
+    
     try:
-        # Get all unique customers for facilitator's events with explicit joins
-        customer_bookings = db.session.query(
-            Booking.user_id,
-            User.name,
-            User.email,
-            db.func.count(Booking.id).label('total_bookings'),
-            db.func.sum(Event.price).label('total_spent'),
-            db.func.max(Booking.created_at).label('last_booking')
-        ).select_from(Booking).join(
-            Event, Booking.event_id == Event.id
-        ).join(
-            User, Booking.user_id == User.id
-        ).filter(
-            Event.user_id == user_id
-        ).group_by(Booking.user_id, User.name, User.email).all()
+        column = CUSTOMER_SORTS[sort]
+        # Keyset pagination on (sort column, user_id) so every page is an index range scan
+        query = CustomerSummary.query.filter(CustomerSummary.facilitator_id == user_id)
+        
+        if search:
+            prefix = search.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_') + '%'
+            query = query.filter(db.or_(
+                CustomerSummary.search_name.like(prefix, escape='\\'),
+                CustomerSummary.search_email.like(prefix, escape='\\')
+            ))
+        
+        cursor = request.args.get('cursor')
+        if cursor:
+            try:
+                value, customer_id = decode_cursor(sort, cursor)
+            except (ValueError, TypeError):
+                return jsonify({'error': 'Invalid cursor'}), 400
+            key = db.tuple_(column, CustomerSummary.user_id)
+            query = query.filter(key < (value, customer_id) if order == 'desc' else key > (value, customer_id))
+        
+        if order == 'desc':
+            query = query.order_by(column.desc(), CustomerSummary.user_id.desc())
+        else:
+            query = query.order_by(column.asc(), CustomerSummary.user_id.asc())
+        
+        rows = query.limit(limit + 1).all()
+        page = rows[:limit]
         
         customers = []
-        for customer in customer_bookings:
+        for customer in page:
             customers.append({
                 'id': customer.user_id,
                 'name': customer.name,
                 'email': customer.email,
                 'total_bookings': customer.total_bookings,
                 'total_spent': float(customer.total_spent) if customer.total_spent else 0,
-                'last_booking': customer.last_booking.isoformat() if customer.last_booking else None
+                'last_booking': customer.last_booking_at.isoformat() if customer.last_booking_at else None
             })
         
-        return jsonify(customers)
+        next_cursor = None
+        if len(rows) > limit:
+            last = page[-1]
+            next_cursor = encode_cursor(getattr(last, column.key), last.user_id)
+        
+        return jsonify({'customers': customers, 'next_cursor': next_cursor})
         
     except Exception as e:
         return jsonify({'error': 'Failed to get customer data', 'details': str(e)}), 400
@@ -0,0 +1,50 @@
+"""Production gunicorn settings for the booking API.
+
+    gunicorn -c gunicorn.conf.py app:app
+
+The app is imported once in the master (preload_app), tables are created
+there before any worker exists, and workers are forked from it. Requests
+spend most of their time waiting on Postgres, Razorpay and the CRM, so the
+default worker class is gthread; set GUNICORN_WORKER_CLASS=gevent after
+installing gevent to use green threads instead.
+"""
+import multiprocessing
+import os
+
+bind = os.getenv('GUNICORN_BIND', '0.0.0.0:5000')
+workers = int(os.getenv('GUNICORN_WORKERS', multiprocessing.cpu_count() * 2 + 1))
+worker_class = os.getenv('GUNICORN_WORKER_CLASS', 'gthread')
+threads = int(os.getenv('GUNICORN_THREADS', '8'))
+timeout = int(os.getenv('GUNICORN_TIMEOUT', '30'))
+graceful_timeout = int(os.getenv('GUNICORN_GRACEFUL_TIMEOUT', '30'))
+keepalive = int(os.getenv('GUNICORN_KEEPALIVE', '5'))
+# Recycle workers now and then so slow leaks cannot accumulate; jitter avoids restarting them all at once
+max_requests = int(os.getenv('GUNICORN_MAX_REQUESTS', '2000'))
+max_requests_jitter = int(os.getenv('GUNICORN_MAX_REQUESTS_JITTER', '200'))
+preload_app = True
+# Code reloading is for development only; with preload_app a HUP (graceful reload) re-reads the config
+reload = os.getenv('GUNICORN_RELOAD', 'false').lower() == 'true'
+# An empty GUNICORN_ACCESS_LOG turns the access log off
+accesslog = os.getenv('GUNICORN_ACCESS_LOG', '-') or None
+errorlog = '-'
+
+
+def on_starting(server):
+    # Runs once in the master, after the app was preloaded and before any worker is forked
+    from app import init_db
+    init_db()
+    # The app imports these lazily; load them once here so forked workers share them
+    import numpy
+    import razorpay
+
+
+def post_fork(server, worker):
+    # Never share the master's pooled connections with a forked worker
+    from app import app
+    from extensions import db
+    with app.app_context():
+        for engine in db.engines.values():
+            engine.dispose(close=False)
+    from dbpool import pool_metrics
+    for metrics in pool_metrics.values():
+        metrics.reset()
@@ -0,0 +1,51 @@
+from flask import Blueprint, jsonify
+from extensions import db
+from dbrouting import REPLICA_BIND
+from crm_client import check_crm
+import time
+
+bp = Blueprint('health', __name__)
+
+
+def probe(check):
+    """Run one readiness check, returning its result and latency"""
+    started = time.perf_counter()
+    try:
+        check()
+        result = {'status': 'ok'}
+    except Exception as e:
+        result = {'status': 'error', 'details': str(e)}
+    result['latency_ms'] = round((time.perf_counter() - started) * 1000, 2)
+    return result
+
+
+def ping(engine):
+    with engine.connect() as connection:
+        connection.exec_driver_sql('SELECT 1')
+
+
+@bp.route('/healthz', methods=['GET'])
+def healthz():
+    """Liveness: the process is up and serving requests; touches nothing else"""
+    return jsonify({'status': 'ok'})
+
+
+@bp.route('/readyz', methods=['GET'])
+def readyz():
+    """Readiness: a connection can be checked out of the pool and the CRM is reachable.
+
+    Only the database decides readiness. CRM notifications are best effort:
+    a failed send is logged and dropped, never retried, and bookings still
+    go through. An unreachable CRM is therefore reported as degraded rather
+    than taking the API out of rotation, which would not bring it back.
+    """
+    checks = {'database': probe(lambda: ping(db.engine))}
+    replica = db.engines.get(REPLICA_BIND)
+    if replica is not None:
+        checks['replica'] = probe(lambda: ping(replica))
+    checks['crm'] = probe(check_crm)
+
+    ready = checks['database']['status'] == 'ok'
+    degraded = any(check['status'] != 'ok' for check in checks.values())
+    status = 'degraded' if ready and degraded else 'ok' if ready else 'unavailable'
+    return jsonify({'status': status, 'checks': checks}), 200 if ready else 503
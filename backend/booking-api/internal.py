@@ -0,0 +1,27 @@
+from flask import Blueprint, jsonify, request
+from extensions import db
+from dbpool import pool_status
+from dbrouting import REPLICA_BIND
+import os
+
+bp = Blueprint('internal', __name__, url_prefix='/internal')
+
+
+@bp.before_request
+def check_internal_token():
+    # Internal endpoints are hidden entirely unless a token is configured
+    token = os.getenv('INTERNAL_API_TOKEN')
+    if not token:
+        return jsonify({'error': 'Not found'}), 404
+    if request.headers.get('Authorization', '') != f'Bearer {token}':
+        return jsonify({'error': 'Unauthorized'}), 401
+
+
+@bp.route('/pool', methods=['GET'])
+def pool():
+    """Connection pool state and checkout metrics for this worker process, per engine"""
+    status = {'pid': os.getpid(), 'status': db.engine.pool.status(), **pool_status(db.engine)}
+    replica = db.engines.get(REPLICA_BIND)
+    if replica is not None:
+        status['replica'] = {'status': replica.pool.status(), **pool_status(replica)}
+    return jsonify(status)
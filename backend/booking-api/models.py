@@ -1,4 +1,5 @@
 from extensions import db
+from dbutils import range_partitioned
 from datetime import datetime
 
 class User(db.Model):
@@ -21,6 +22,10 @@ class User(db.Model):
 
 class Event(db.Model):
     __tablename__ = 'events'
+    __table_args__ = (
+        # Range scans for upcoming events, e.g. the reminder scheduler
+        db.Index('ix_events_start_datetime', 'start_datetime'),
+    )
     id = db.Column(db.Integer, primary_key=True)
     title = db.Column(db.String(200), nullable=False)
     description = db.Column(db.Text)
@@ -34,6 +39,7 @@ class Event(db.Model):
     price = db.Column(db.Numeric(10, 2), nullable=False, default=0.00)
     currency = db.Column(db.String(3), nullable=False, default='INR')
     is_active = db.Column(db.Boolean, default=True)
+    deleted_at = db.Column(db.DateTime)
     user_id = db.Column(db.Integer, db.ForeignKey('users.id', ondelete='CASCADE'), nullable=False)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
@@ -42,8 +48,16 @@ class Event(db.Model):
 
 class Booking(db.Model):
     __tablename__ = 'bookings'
-    id = db.Column(db.Integer, primary_key=True)
-    booking_reference = db.Column(db.String(50), unique=True, nullable=False)
+    __table_args__ = (
+        # Unique constraints on a partitioned table must include the partition key, so
+        # booking_reference is kept unique by BookingReference instead
+        db.Index('ix_bookings_event_id_user_id', 'event_id', 'user_id'),
+        range_partitioned('created_at'),
+    )
+    # (id, created_at) is the table's primary key so it can be partitioned by month;
+    # the ORM still identifies bookings by id alone
+    id = db.Column(db.Integer, primary_key=True, autoincrement=True)
+    booking_reference = db.Column(db.String(50), nullable=False)
     status = db.Column(db.String(20), nullable=False, default='confirmed')
     notes = db.Column(db.Text)
     payment_status = db.Column(db.String(20), nullable=False, default='pending')
@@ -53,28 +67,144 @@ class Booking(db.Model):
     crm_notified = db.Column(db.Boolean, default=False)
     user_id = db.Column(db.Integer, db.ForeignKey('users.id', ondelete='CASCADE'))
     event_id = db.Column(db.Integer, db.ForeignKey('events.id', ondelete='CASCADE'))
-    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    created_at = db.Column(db.DateTime, primary_key=True, nullable=False, default=datetime.utcnow)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
-    # Relationships
-    crm_notifications = db.relationship('CRMNotification', backref='booking', lazy=True)
-    transactions = db.relationship('Transaction', backref='booking', lazy=True)
+    __mapper_args__ = {'primary_key': [id]}
+    # Relationships; bookings.id alone is not unique to Postgres, so nothing can hold a foreign key to it
+    crm_notifications = db.relationship(
+        'CRMNotification', primaryjoin='Booking.id == foreign(CRMNotification.booking_id)', backref='booking', lazy=True
+    )
+    transactions = db.relationship(
+        'Transaction', primaryjoin='Booking.id == foreign(Transaction.booking_id)', backref='booking', lazy=True
+    )
+
+class BookingReference(db.Model):
+    """Unpartitioned index of booking references, one row per booking"""
+    __tablename__ = 'booking_references'
+    booking_reference = db.Column(db.String(50), primary_key=True)
+    booking_id = db.Column(db.Integer, nullable=False)
+    # The booking's created_at, so looking it up by reference touches a single partition
+    booking_created_at = db.Column(db.DateTime, nullable=False)
 
 class Transaction(db.Model):
     __tablename__ = 'transactions'
-    id = db.Column(db.Integer, primary_key=True)
-    booking_id = db.Column(db.Integer, db.ForeignKey('bookings.id', ondelete='CASCADE'), nullable=False)
+    __table_args__ = (
+        db.Index('ix_transactions_booking_id', 'booking_id'),
+        range_partitioned('created_at'),
+    )
+    id = db.Column(db.Integer, primary_key=True, autoincrement=True)
+    booking_id = db.Column(db.Integer, nullable=False)
     payment_id = db.Column(db.String(100), nullable=False)  # PayPal payment ID
     amount = db.Column(db.Numeric(10, 2), nullable=False)
     currency = db.Column(db.String(3), nullable=False, default='INR')
     status = db.Column(db.String(20), nullable=False, default='pending')
     payment_method = db.Column(db.String(20), nullable=False, default='razorpay')
-    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    created_at = db.Column(db.DateTime, primary_key=True, nullable=False, default=datetime.utcnow)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    __mapper_args__ = {'primary_key': [id]}
 
 class CRMNotification(db.Model):
     __tablename__ = 'crm_notifications'
     id = db.Column(db.Integer, primary_key=True)
-    booking_id = db.Column(db.Integer, db.ForeignKey('bookings.id', ondelete='CASCADE'))
+    booking_id = db.Column(db.Integer)
     status = db.Column(db.String(20), nullable=False)
     sent_at = db.Column(db.DateTime, default=datetime.utcnow)
-    response = db.Column(db.Text) 
\ No newline at end of file
+    response = db.Column(db.Text) 
+
+class WaitlistEntry(db.Model):
+    __tablename__ = 'waitlist_entries'
+    __table_args__ = (
+        # Serves the "next waiting user for this event" pop as a single index probe
+        db.Index('ix_waitlist_entries_event_status_id', 'event_id', 'status', 'id'),
+    )
+    id = db.Column(db.Integer, primary_key=True)
+    event_id = db.Column(db.Integer, db.ForeignKey('events.id', ondelete='CASCADE'), nullable=False)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id', ondelete='CASCADE'), nullable=False)
+    status = db.Column(db.String(20), nullable=False, default='waiting')  # waiting, promoted, booked, expired, left, cancelled
+    notes = db.Column(db.Text)
+    promoted_at = db.Column(db.DateTime)
+    expires_at = db.Column(db.DateTime)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+class EventReminder(db.Model):
+    __tablename__ = 'event_reminders'
+    __table_args__ = (
+        # One reminder per booking and window; claiming a reminder is an insert against this
+        db.UniqueConstraint('booking_id', 'reminder_window', name='uq_event_reminders_booking_window'),
+        db.Index('ix_event_reminders_status_claimed_at', 'status', 'claimed_at'),
+    )
+    id = db.Column(db.Integer, primary_key=True)
+    booking_id = db.Column(db.Integer, nullable=False)
+    reminder_window = db.Column(db.String(10), nullable=False)  # e.g. 24h, 1h
+    status = db.Column(db.String(20), nullable=False, default='claimed')  # claimed, sent, skipped
+    remind_at = db.Column(db.DateTime, nullable=False)
+    claimed_at = db.Column(db.DateTime, default=datetime.utcnow)
+    sent_at = db.Column(db.DateTime)
+
+class BookingStatsBucket(db.Model):
+    __tablename__ = 'booking_stats_buckets'
+    __table_args__ = (
+        # Doubles as the index for per-facilitator range scans
+        db.UniqueConstraint('facilitator_id', 'granularity', 'bucket_start', name='uq_booking_stats_buckets_key'),
+    )
+    id = db.Column(db.Integer, primary_key=True)
+    facilitator_id = db.Column(db.Integer, db.ForeignKey('users.id', ondelete='CASCADE'), nullable=False)
+    granularity = db.Column(db.String(10), nullable=False)  # day, month
+    bucket_start = db.Column(db.Date, nullable=False)
+    bookings = db.Column(db.Integer, nullable=False, default=0)
+    cancellations = db.Column(db.Integer, nullable=False, default=0)
+    revenue = db.Column(db.Numeric(12, 2), nullable=False, default=0)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+class CustomerSummary(db.Model):
+    __tablename__ = 'customer_summaries'
+    __table_args__ = (
+        db.UniqueConstraint('facilitator_id', 'user_id', name='uq_customer_summaries_facilitator_user'),
+        # One index per sort order, ending in user_id to make the keyset unique
+        db.Index('ix_customer_summaries_last_booking', 'facilitator_id', 'last_booking_at', 'user_id'),
+        db.Index('ix_customer_summaries_total_spent', 'facilitator_id', 'total_spent', 'user_id'),
+        db.Index('ix_customer_summaries_total_bookings', 'facilitator_id', 'total_bookings', 'user_id'),
+        db.Index('ix_customer_summaries_search_name', 'facilitator_id', 'search_name',
+                 postgresql_ops={'search_name': 'text_pattern_ops'}),
+        db.Index('ix_customer_summaries_search_email', 'facilitator_id', 'search_email',
+                 postgresql_ops={'search_email': 'text_pattern_ops'}),
+    )
+    id = db.Column(db.Integer, primary_key=True)
+    facilitator_id = db.Column(db.Integer, db.ForeignKey('users.id', ondelete='CASCADE'), nullable=False)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id', ondelete='CASCADE'), nullable=False)
+    name = db.Column(db.String(100))
+    email = db.Column(db.String(120))
+    search_name = db.Column(db.String(100))  # lower(name), for prefix search
+    search_email = db.Column(db.String(120))  # lower(email), for prefix search
+    total_bookings = db.Column(db.Integer, nullable=False, default=0)
+    total_spent = db.Column(db.Numeric(12, 2), nullable=False, default=0)
+    last_booking_at = db.Column(db.DateTime)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+class SegmentGeneration(db.Model):
+    __tablename__ = 'segment_generations'
+    # Bumped with every booking change of the facilitator; cached segments of an older generation are stale
+    facilitator_id = db.Column(db.Integer, db.ForeignKey('users.id', ondelete='CASCADE'), primary_key=True)
+    generation = db.Column(db.BigInteger, nullable=False, default=0)
+
+# Nothing can hold a foreign key to the partitioned bookings table, so a trigger stands in
+# for ON DELETE CASCADE: deleting a booking, directly or through its user or event, deletes these
+BOOKING_DEPENDENTS = ('transactions', 'crm_notifications', 'event_reminders', 'booking_references')
+# Set for the transaction while rows move between partitions, which deletes and re-inserts them
+MOVING_ROWS_SETTING = 'partitions.moving_rows'
+
+def _delete_dependents_sql():
+    return ' '.join(f'DELETE FROM {table} WHERE booking_id = OLD.id;' for table in BOOKING_DEPENDENTS)
+
+db.event.listen(db.metadata, 'after_create', db.DDL(
+    'CREATE OR REPLACE FUNCTION delete_booking_dependents() RETURNS trigger AS $$ '
+    f"BEGIN IF current_setting('{MOVING_ROWS_SETTING}', true) = 'on' THEN RETURN OLD; END IF; "
+    f'{_delete_dependents_sql()} RETURN OLD; END; $$ LANGUAGE plpgsql; '
+    'CREATE OR REPLACE TRIGGER bookings_delete_dependents AFTER DELETE ON bookings '
+    'FOR EACH ROW EXECUTE FUNCTION delete_booking_dependents()'
+).execute_if(dialect='postgresql'))
+db.event.listen(db.metadata, 'after_create', db.DDL(
+    'CREATE TRIGGER IF NOT EXISTS bookings_delete_dependents AFTER DELETE ON bookings '
+    f'BEGIN {_delete_dependents_sql()} END'
+).execute_if(dialect='sqlite'))
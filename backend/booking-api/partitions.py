@@ -0,0 +1,165 @@
+from flask import Blueprint
+from extensions import db
+from models import MOVING_ROWS_SETTING
+from datetime import date, datetime
+import click
+import os
+
+bp = Blueprint('partitions', __name__)
+
+# Range-partitioned by month on created_at in Postgres (see range_partitioned in dbutils)
+PARTITIONED_TABLES = ('bookings', 'transactions')
+
+
+def month_start(value):
+    return date(value.year, value.month, 1)
+
+
+def add_months(month, count):
+    index = month.year * 12 + month.month - 1 + count
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def partition_name(table, month):
+    return f'{table}_{month:%Y_%m}'
+
+
+def default_partition(table):
+    # Catches rows for months without a partition, so inserts never fail if ensure falls behind
+    return f'{table}_default'
+
+
+def is_postgres():
+    return db.engine.dialect.name == 'postgresql'
+
+
+def is_partitioned(table):
+    relkind = db.session.execute(db.text('SELECT relkind FROM pg_class WHERE relname = :table'), {'table': table}).scalar()
+    return relkind == 'p'
+
+
+def create_partition(table, name, start, end):
+    """Create the partition for [start, end), moving in rows the default partition took meanwhile"""
+    bounds = f"FOR VALUES FROM ('{start.isoformat()}') TO ('{end.isoformat()}')"
+    in_range = {'start': start, 'end': end}
+    default = default_partition(table)
+    overflow = db.session.execute(db.text(
+        f'SELECT 1 FROM {default} WHERE created_at >= :start AND created_at < :end LIMIT 1'
+    ), in_range).first()
+    if not overflow:
+        db.session.execute(db.text(f'CREATE TABLE IF NOT EXISTS {name} PARTITION OF {table} {bounds}'))
+        return
+
+    # Postgres refuses a partition for rows the default partition holds, so they move first;
+    # the setting keeps the bookings delete trigger from deleting their dependents on the way
+    db.session.execute(db.text(f"SET LOCAL {MOVING_ROWS_SETTING} = 'on'"))
+    db.session.execute(db.text(f'CREATE TABLE {name} (LIKE {table} INCLUDING DEFAULTS)'))
+    db.session.execute(db.text(
+        f'INSERT INTO {name} SELECT * FROM {default} WHERE created_at >= :start AND created_at < :end'
+    ), in_range)
+    db.session.execute(db.text(f'DELETE FROM {default} WHERE created_at >= :start AND created_at < :end'), in_range)
+    db.session.execute(db.text(f'ALTER TABLE {table} ATTACH PARTITION {name} {bounds}'))
+    db.session.execute(db.text(f'RESET {MOVING_ROWS_SETTING}'))
+
+
+def attached_partitions(table):
+    """Names of the partitions currently attached to table"""
+    rows = db.session.execute(db.text(
+        'SELECT child.relname FROM pg_inherits '
+        'JOIN pg_class parent ON pg_inherits.inhparent = parent.oid '
+        'JOIN pg_class child ON pg_inherits.inhrelid = child.oid '
+        'WHERE parent.relname = :table ORDER BY child.relname'
+    ), {'table': table})
+    return [row[0] for row in rows]
+
+
+def ensure_partitions(months_ahead=None, start=None):
+    """Create any missing monthly partitions from start (default: this month) to months_ahead months out.
+
+    Also creates each table's default partition. Returns the names of the
+    partitions created; a no-op outside Postgres. Raises if a table was
+    created before partitioning and has not been converted yet.
+    """
+    if not is_postgres():
+        return []
+    months_ahead = months_ahead if months_ahead is not None else int(os.getenv('PARTITION_MONTHS_AHEAD', '3'))
+    first = month_start(start or datetime.utcnow())
+    last = add_months(month_start(datetime.utcnow()), months_ahead)
+    created = []
+    for table in PARTITIONED_TABLES:
+        if not is_partitioned(table):
+            raise RuntimeError(f'{table} is not partitioned; convert it with database/migration.sql')
+        existing = set(attached_partitions(table))
+        if default_partition(table) not in existing:
+            db.session.execute(db.text(f'CREATE TABLE IF NOT EXISTS {default_partition(table)} PARTITION OF {table} DEFAULT'))
+            created.append(default_partition(table))
+        month = first
+        while month <= last:
+            name = partition_name(table, month)
+            if name not in existing:
+                create_partition(table, name, month, add_months(month, 1))
+                created.append(name)
+            month = add_months(month, 1)
+    db.session.commit()
+    return created
+
+
+def detach_partitions(before):
+    """Detach every monthly partition that ends on or before the month `before` starts.
+
+    Detached partitions stay in the database as ordinary tables, so they can
+    be dumped and dropped at leisure without touching the live tables. The
+    booking_references rows of detached bookings are deleted with them.
+    """
+    if not is_postgres():
+        return []
+    cutoff = month_start(before)
+    detached = []
+    for table in PARTITIONED_TABLES:
+        for name in attached_partitions(table):
+            suffix = name[len(table) + 1:]
+            try:
+                month = datetime.strptime(suffix, '%Y_%m').date()
+            except ValueError:
+                continue
+            if month < cutoff:
+                db.session.execute(db.text(f'ALTER TABLE {table} DETACH PARTITION {name}'))
+                if table == 'bookings':
+                    db.session.execute(db.text(
+                        'DELETE FROM booking_references WHERE booking_created_at >= :start AND booking_created_at < :end'
+                    ), {'start': month, 'end': add_months(month, 1)})
+                detached.append(name)
+    db.session.commit()
+    return detached
+
+
+def created_since(model, since):
+    """created_at >= since on a partitioned model, or no restriction when since is unknown"""
+    return model.created_at >= since if since is not None else db.true()
+
+
+@bp.cli.command('ensure')
+@click.option('--months-ahead', type=int, default=None, help='Months past the current one to create partitions for')
+@click.option('--start', type=click.DateTime(formats=['%Y-%m']), default=None, help='First month, e.g. 2024-01')
+def ensure_command(months_ahead, start):
+    """Create upcoming monthly partitions of bookings and transactions (run e.g. daily from cron)."""
+    created = ensure_partitions(months_ahead, start)
+    print(f"Created {len(created)} partitions{': ' + ', '.join(created) if created else ''}")
+
+
+@bp.cli.command('detach')
+@click.option('--before', type=click.DateTime(formats=['%Y-%m']), required=True, help='Detach months before this one, e.g. 2024-01')
+def detach_command(before):
+    """Detach old monthly partitions of bookings and transactions for archival."""
+    detached = detach_partitions(before)
+    print(f"Detached {len(detached)} partitions{': ' + ', '.join(detached) if detached else ''}")
+
+
+@bp.cli.command('list')
+def list_command():
+    """List the attached partitions of bookings and transactions."""
+    if not is_postgres():
+        print('Partitioning is only used on Postgres')
+        return
+    for table in PARTITIONED_TABLES:
+        print(f"{table}: {', '.join(attached_partitions(table)) or '(none)'}")
@@ -0,0 +1,256 @@
+from flask import Blueprint
+from models import Event, Booking, User, EventReminder
+from extensions import db
+from dbutils import dialect_insert
+from crm_client import build_notification, post_notification_batch
+from datetime import datetime, timedelta
+import click
+import heapq
+import os
+import requests
+import time
+
+bp = Blueprint('reminders', __name__)
+
+
+def reminder_windows():
+    """Reminder windows from REMINDER_WINDOWS, e.g. '24h,1h', widest first"""
+    windows = []
+    for name in os.getenv('REMINDER_WINDOWS', '24h,1h').split(','):
+        name = name.strip()
+        unit = {'h': 'hours', 'm': 'minutes'}[name[-1]]
+        windows.append((name, timedelta(**{unit: int(name[:-1])})))
+    return sorted(windows, key=lambda window: window[1], reverse=True)
+
+
+class ReminderScheduler:
+    """Finds booking reminders that fall due and hands them to the CRM in batches.
+
+    Each scan is one range query on events.start_datetime for the events
+    starting from now up to the widest window beyond the next scan. Events
+    already scanned are read again, so a booking confirmed after its reminder
+    time (say, half an hour before the event) still gets the nearest one;
+    reminders already recorded in event_reminders or queued are skipped.
+    Wider windows whose time had passed when the booking was made are
+    skipped too: a booking made ten hours ahead gets no "24h" reminder.
+    Reminders due before the next scan wait in a min-heap keyed by remind_at.
+
+    A reminder is claimed by inserting its event_reminders row before it is
+    sent and marked sent once the CRM accepts it, so a restart neither
+    repeats nor loses reminders. A claim that was never marked sent is
+    picked up again once its lease runs out.
+    """
+
+    def __init__(self, windows=None, lookahead=timedelta(minutes=2), claim_lease=timedelta(minutes=10),
+                 batch_size=200):
+        self.windows = windows or reminder_windows()
+        self.lookahead = lookahead
+        self.claim_lease = claim_lease
+        self.batch_size = batch_size
+        self._heap = []
+        self._queued = set()
+
+    def _push(self, remind_at, booking_id, window, superseded=False):
+        if (booking_id, window) not in self._queued:
+            self._queued.add((booking_id, window))
+            heapq.heappush(self._heap, (remind_at, booking_id, window, superseded))
+
+    def scan(self, now):
+        """Queue every reminder falling due before now + lookahead; returns how many were queued"""
+        upper = now + self.lookahead
+        widest = self.windows[0][1]
+
+        rows = db.session.query(
+            Booking.id, Booking.created_at, Event.start_datetime, EventReminder.reminder_window
+        ).join(
+            Event, Booking.event_id == Event.id
+        ).outerjoin(
+            EventReminder, EventReminder.booking_id == Booking.id
+        ).filter(
+            Event.start_datetime > now,
+            Event.start_datetime <= upper + widest,
+            Booking.status == 'confirmed',
+            Booking.payment_status == 'completed',
+            Event.is_active.is_(True),
+            Event.deleted_at.is_(None)
+        ).all()
+
+        bookings = {}
+        recorded = set()
+        for booking_id, booked_at, start, window in rows:
+            bookings[booking_id] = (booked_at, start)
+            if window:
+                recorded.add((booking_id, window))
+
+        nearest = self.windows[-1][0]
+        before = len(self._heap)
+        for booking_id, (booked_at, start) in bookings.items():
+            pending = [(start - offset, name) for name, offset in self.windows
+                       if start - offset <= upper and (booking_id, name) not in recorded]
+            # After downtime several windows can be due together; only the nearest one is sent
+            # and the wider ones are recorded as skipped so they never fire later. So is a wider
+            # window that was already past when the booking was made
+            for index, (remind_at, name) in enumerate(pending):
+                late = booked_at is not None and remind_at < booked_at and name != nearest
+                self._push(remind_at, booking_id, name, superseded=late or index < len(pending) - 1)
+
+        # Claims left behind by a crash or a failed hand-off
+        stale = db.session.query(
+            EventReminder.booking_id, EventReminder.reminder_window, EventReminder.remind_at
+        ).filter(
+            EventReminder.status == 'claimed',
+            EventReminder.claimed_at < now - self.claim_lease
+        ).all()
+        for booking_id, window, remind_at in stale:
+            self._push(remind_at, booking_id, window)
+
+        return len(self._heap) - before
+
+    def next_due(self):
+        return self._heap[0][0] if self._heap else None
+
+    def take_due(self, now):
+        due = []
+        while self._heap and self._heap[0][0] <= now:
+            reminder = heapq.heappop(self._heap)
+            self._queued.discard((reminder[1], reminder[2]))
+            due.append(reminder)
+        return due
+
+    def _claim(self, reminders, now):
+        """Insert claim rows, returning the (booking_id, window) pairs this process now owns"""
+        stmt = dialect_insert(EventReminder).values([{
+            'booking_id': booking_id,
+            'reminder_window': window,
+            'status': 'claimed',
+            'remind_at': remind_at,
+            'claimed_at': now
+        } for remind_at, booking_id, window, _ in reminders])
+        stmt = stmt.on_conflict_do_update(
+            index_elements=['booking_id', 'reminder_window'],
+            set_={'claimed_at': stmt.excluded.claimed_at},
+            where=db.and_(EventReminder.status == 'claimed', EventReminder.claimed_at < now - self.claim_lease)
+        ).returning(EventReminder.booking_id, EventReminder.reminder_window)
+        claimed = {tuple(row) for row in db.session.execute(stmt)}
+        db.session.commit()
+        return claimed
+
+    def _mark(self, pairs, status, now):
+        for window in {window for _, window in pairs}:
+            booking_ids = [booking_id for booking_id, w in pairs if w == window]
+            db.session.execute(db.update(EventReminder).where(
+                EventReminder.booking_id.in_(booking_ids),
+                EventReminder.reminder_window == window
+            ).values(status=status, sent_at=now if status == 'sent' else None))
+        db.session.commit()
+
+    def dispatch(self, now, session=None):
+        """Claim and send every due reminder; returns (sent, skipped)"""
+        due = self.take_due(now)
+        sent = skipped = 0
+        for start in range(0, len(due), self.batch_size):
+            result = self._dispatch_batch(due[start:start + self.batch_size], now, session)
+            sent += result[0]
+            skipped += result[1]
+        return sent, skipped
+
+    def _dispatch_batch(self, due, now, session):
+        superseded = {(booking_id, window) for _, booking_id, window, skip in due if skip}
+        claimed = self._claim(due, now)
+        if not claimed:
+            return 0, 0
+
+        facilitator = db.aliased(User)
+        rows = db.session.query(Booking, Event, User, facilitator).join(
+            Event, Booking.event_id == Event.id
+        ).join(
+            User, Booking.user_id == User.id
+        ).join(
+            facilitator, Event.user_id == facilitator.id
+        ).filter(
+            Booking.id.in_({booking_id for booking_id, _ in claimed}),
+            Booking.status == 'confirmed',
+            Event.is_active.is_(True),
+            Event.deleted_at.is_(None),
+            Event.start_datetime > now
+        ).all()
+        eligible = {booking.id: (booking, event, user, host) for booking, event, user, host in rows}
+
+        to_send = []
+        to_skip = []
+        for booking_id, window in claimed:
+            if booking_id in eligible and (booking_id, window) not in superseded:
+                to_send.append((booking_id, window))
+            else:
+                to_skip.append((booking_id, window))
+
+        payloads = []
+        for booking_id, window in to_send:
+            booking, event, user, host = eligible[booking_id]
+            payloads.append(build_notification(
+                'reminder', user, event, host, booking,
+                reminder_window=window,
+                event_start=event.start_datetime.isoformat(),
+                event_location=event.location or event.virtual_link
+            ))
+
+        accepted = []
+        if payloads:
+            try:
+                results = post_notification_batch(payloads, session)
+                accepted = [pair for pair, result in zip(to_send, results) if result.get('status') == 'accepted']
+            except Exception as e:
+                # Claims stay open and are retried once their lease runs out
+                print(f'Failed to hand {len(payloads)} reminders to the CRM: {e}')
+
+        if accepted:
+            self._mark(accepted, 'sent', now)
+        if to_skip:
+            self._mark(to_skip, 'skipped', now)
+        return len(accepted), len(to_skip)
+
+
+def scheduler_from_env():
+    return ReminderScheduler(
+        lookahead=timedelta(seconds=2 * float(os.getenv('REMINDER_TICK_SECONDS', '60'))),
+        claim_lease=timedelta(minutes=int(os.getenv('REMINDER_CLAIM_LEASE_MINUTES', '10'))),
+        batch_size=int(os.getenv('REMINDER_BATCH_SIZE', '200'))
+    )
+
+
+@bp.cli.command('tick')
+def tick_command():
+    """Send every reminder that is due now (for running from cron)."""
+    scheduler = scheduler_from_env()
+    now = datetime.utcnow()
+    scheduler.scan(now)
+    sent, skipped = scheduler.dispatch(now)
+    print(f'Sent {sent} reminders, skipped {skipped}')
+
+
+@bp.cli.command('run')
+def run_command():
+    """Run the reminder scheduler until interrupted."""
+    tick = float(os.getenv('REMINDER_TICK_SECONDS', '60'))
+    scheduler = scheduler_from_env()
+    session = requests.Session()
+    next_scan = 0
+    print(f"Reminder scheduler running for windows {', '.join(name for name, _ in scheduler.windows)}")
+    while True:
+        if time.monotonic() >= next_scan:
+            queued = scheduler.scan(datetime.utcnow())
+            next_scan = time.monotonic() + tick
+            if queued:
+                print(f'Queued {queued} reminders')
+        sent, skipped = scheduler.dispatch(datetime.utcnow(), session)
+        if sent or skipped:
+            print(f'Sent {sent} reminders, skipped {skipped}')
+        # End the read transaction so the next scan sees fresh rows
+        db.session.remove()
+
+        # Sleep until the next reminder is due or the next scan, whichever comes first
+        wait = next_scan - time.monotonic()
+        due = scheduler.next_due()
+        if due is not None:
+            wait = min(wait, (due - datetime.utcnow()).total_seconds())
+        time.sleep(max(wait, 0.05))
@@ -0,0 +1,196 @@
+from flask import Blueprint, jsonify, request
+from flask_jwt_extended import jwt_required, get_jwt_identity
+from models import Event, Booking, User, Transaction, SegmentGeneration
+from extensions import db
+from dbutils import upsert_increment
+from dbrouting import read_only
+from datetime import datetime
+import os
+import threading
+import time
+
+bp = Blueprint('segments', __name__)
+
+# Evaluated in order; the first matching rule wins
+SEGMENT_RULES = (
+    ('champions', lambda r, f, m: (r >= 4) & (f >= 4)),
+    ('loyal', lambda r, f, m: f >= 4),
+    ('new', lambda r, f, m: (r >= 4) & (f <= 1)),
+    ('potential_loyalists', lambda r, f, m: r >= 4),
+    ('at_risk', lambda r, f, m: (r <= 2) & (f >= 3)),
+    ('hibernating', lambda r, f, m: r <= 2),
+)
+DEFAULT_SEGMENT = 'needs_attention'
+SEGMENT_NAMES = [name for name, _ in SEGMENT_RULES] + [DEFAULT_SEGMENT]
+
+_cache = {}
+_cache_lock = threading.Lock()
+
+def cache_ttl():
+    return float(os.getenv('SEGMENT_CACHE_TTL', '600'))
+
+def invalidate_segments(facilitator_id):
+    """Bump the facilitator's segment generation as part of the caller's transaction.
+
+    The generation lives in the database so every worker process sees it and
+    drops its cached segmentation, not just the one that handled the write.
+    """
+    if not facilitator_id:
+        return
+    upsert_increment(SegmentGeneration, {'facilitator_id': int(facilitator_id)}, {'generation': 1})
+
+def segment_generation(facilitator_id):
+    generation = db.session.query(SegmentGeneration.generation).filter_by(facilitator_id=facilitator_id).scalar()
+    return generation or 0
+
+def numpy():
+    """numpy, imported on first use: it is only needed once segments are computed, not at startup"""
+    import numpy
+    return numpy
+
+def quintile_scores(values):
+    """Score values 1-5 by quintile, higher values scoring higher; ties share the lower score"""
+    np = numpy()
+    if values.size == 0:
+        return values.astype(np.int8)
+    edges = np.quantile(values, [0.2, 0.4, 0.6, 0.8])
+    return (np.searchsorted(edges, values, side='left') + 1).astype(np.int8)
+
+def load_customer_columns(facilitator_id):
+    """Per-customer recency, frequency and monetary columns from one aggregate query"""
+    np = numpy()
+    rows = db.session.query(
+        Booking.user_id,
+        db.func.max(Booking.created_at),
+        db.func.count(db.distinct(Booking.id)),
+        db.func.coalesce(db.func.sum(Transaction.amount), 0)
+    ).select_from(Booking).join(
+        Event, Booking.event_id == Event.id
+    ).outerjoin(
+        Transaction, db.and_(Transaction.booking_id == Booking.id, Transaction.status == 'completed')
+    ).filter(
+        Event.user_id == facilitator_id,
+        Booking.user_id.isnot(None),
+        Booking.status.notin_(['cancelled', 'rejected'])
+    ).group_by(Booking.user_id).all()
+
+    if not rows:
+        return None
+    user_ids, last_booked, frequency, monetary = zip(*rows)
+    return {
+        'user_id': np.array(user_ids, dtype=np.int64),
+        'last_booking': np.array(last_booked, dtype='datetime64[s]'),
+        'frequency': np.array(frequency, dtype=np.int64),
+        'monetary': np.array(monetary, dtype=np.float64)
+    }
+
+def compute_segments(facilitator_id):
+    np = numpy()
+    columns = load_customer_columns(facilitator_id)
+    if columns is None:
+        return None
+
+    now = np.datetime64(datetime.utcnow().replace(microsecond=0), 's')
+    recency_days = (now - columns['last_booking']).astype(np.float64) / 86400.0
+
+    # Recent customers score high, so recency is scored on its negation
+    r = quintile_scores(-recency_days)
+    f = quintile_scores(columns['frequency'])
+    m = quintile_scores(columns['monetary'])
+
+    conditions = [rule(r, f, m) for _, rule in SEGMENT_RULES]
+    segment = np.select(conditions, [name for name, _ in SEGMENT_RULES], default=DEFAULT_SEGMENT)
+
+    columns.update({
+        'recency_days': recency_days,
+        'r': r,
+        'f': f,
+        'm': m,
+        'segment': segment
+    })
+    return columns
+
+def get_segments(facilitator_id):
+    facilitator_id = int(facilitator_id)
+    # Read before computing: a change landing mid-computation bumps the generation past the stored one
+    generation = segment_generation(facilitator_id)
+    with _cache_lock:
+        cached = _cache.get(facilitator_id)
+    if cached and cached[1] == generation and time.monotonic() - cached[0] < cache_ttl():
+        return cached[2], cached[3]
+
+    columns = compute_segments(facilitator_id)
+    generated_at = datetime.utcnow()
+    with _cache_lock:
+        current = _cache.get(facilitator_id)
+        if not current or current[1] <= generation:
+            _cache[facilitator_id] = (time.monotonic(), generation, columns, generated_at)
+    return columns, generated_at
+
+@bp.route('/facilitator/crm/segments', methods=['GET'])
+@jwt_required()
+@read_only
+def facilitator_crm_segments():
+    np = numpy()
+    user_id = get_jwt_identity()
+    user = User.query.get(user_id)
+    if not user or user.role != 'facilitator':
+        return jsonify({'error': 'Not authorized'}), 403
+
+    segment_filter = request.args.get('segment')
+    if segment_filter and segment_filter not in SEGMENT_NAMES:
+        return jsonify({'error': f"Segment must be one of: {', '.join(SEGMENT_NAMES)}"}), 400
+    limit = min(max(request.args.get('limit', 50, type=int), 1), 500)
+
+    try:
+        columns, generated_at = get_segments(user_id)
+    except Exception as e:
+        return jsonify({'error': 'Failed to compute customer segments', 'details': str(e)}), 400
+
+    if columns is None:
+        return jsonify({
+            'generated_at': generated_at.isoformat(),
+            'total_customers': 0,
+            'segments': {name: {'customers': 0, 'revenue': 0, 'avg_recency_days': None, 'avg_bookings': None}
+                         for name in SEGMENT_NAMES},
+            'customers': []
+        })
+
+    segment = columns['segment']
+    summary = {}
+    for name in SEGMENT_NAMES:
+        mask = segment == name
+        count = int(mask.sum())
+        summary[name] = {
+            'customers': count,
+            'revenue': round(float(columns['monetary'][mask].sum()), 2),
+            'avg_recency_days': round(float(columns['recency_days'][mask].mean()), 1) if count else None,
+            'avg_bookings': round(float(columns['frequency'][mask].mean()), 2) if count else None
+        }
+
+    # Top customers by spend, optionally within one segment
+    indices = np.flatnonzero(segment == segment_filter) if segment_filter else np.arange(segment.size)
+    top = indices[np.argsort(-columns['monetary'][indices], kind='stable')[:limit]]
+    # Names are only needed for the customers actually listed
+    users = {u.id: u for u in User.query.filter(User.id.in_(columns['user_id'][top].tolist())).all()}
+    customers = []
+    for i in top:
+        customer_id = int(columns['user_id'][i])
+        customer = users.get(customer_id)
+        customers.append({
+            'id': customer_id,
+            'name': customer.name if customer else None,
+            'email': customer.email if customer else None,
+            'segment': str(segment[i]),
+            'recency_days': round(float(columns['recency_days'][i]), 1),
+            'total_bookings': int(columns['frequency'][i]),
+            'total_spent': round(float(columns['monetary'][i]), 2),
+            'rfm_score': f"{columns['r'][i]}{columns['f'][i]}{columns['m'][i]}"
+        })
+
+    return jsonify({
+        'generated_at': generated_at.isoformat(),
+        'total_customers': int(segment.size),
+        'segments': summary,
+        'customers': customers
+    })
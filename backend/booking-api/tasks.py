@@ -0,0 +1,34 @@
+from concurrent.futures import ThreadPoolExecutor
+from flask import current_app
+import os
+import threading
+import traceback
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def executor():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=int(os.getenv('BACKGROUND_WORKERS', '2')),
+                thread_name_prefix='background'
+            )
+        return _executor
+
+
+def submit(fn, *args, **kwargs):
+    """Run fn on a background thread inside an app context of the current app"""
+    app = current_app._get_current_object()  # type: ignore
+
+    def run():
+        with app.app_context():
+            try:
+                return fn(*args, **kwargs)
+            except Exception as e:
+                print(f'Background task {fn.__name__} failed: {e}')
+                traceback.print_exc()
+
+    return executor().submit(run)
@@ -1,22 +1,42 @@
-import time
-import sys
-import psycopg2
-from psycopg2 import OperationalError
 import os
+import random
+import sys
+import time
+from sqlalchemy import create_engine, text
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.pool import NullPool
 
 def wait_for_db():
+    """Probe the database until it accepts connections, backing off exponentially.
+
+    Probes start after DB_WAIT_INITIAL_DELAY seconds and double (with jitter)
+    up to DB_WAIT_MAX_DELAY, so a database that is almost up is noticed
+    quickly without hammering one that is still initialising.
+    """
     db_url = os.getenv('DATABASE_URL', 'postgresql://postgres:postgres@db:5432/booking')
-    for _ in range(30):
+    timeout = float(os.getenv('DB_WAIT_TIMEOUT', '60'))
+    delay = float(os.getenv('DB_WAIT_INITIAL_DELAY', '0.1'))
+    max_delay = float(os.getenv('DB_WAIT_MAX_DELAY', '5'))
+
+    engine = create_engine(db_url, poolclass=NullPool, connect_args={'connect_timeout': 3} if db_url.startswith('postgresql') else {})
+    started = time.monotonic()
+    attempt = 0
+    while True:
+        attempt += 1
         try:
-            conn = psycopg2.connect(db_url)
-            conn.close()
-            print('Database is ready!')
+            with engine.connect() as conn:
+                conn.execute(text('SELECT 1'))
+            print(f'Database is ready after {time.monotonic() - started:.2f}s ({attempt} attempts)')
             return
-        except OperationalError:
-            print('Waiting for database to be ready...')
-            time.sleep(2)
-    print('Database not available after waiting, exiting.')
-    sys.exit(1)
+        except OperationalError as e:
+            remaining = timeout - (time.monotonic() - started)
+            if remaining <= 0:
+                print(f'Database not available after {timeout:.0f}s, exiting: {e.orig}')
+                sys.exit(1)
+            sleep = min(random.uniform(delay / 2, delay), remaining)
+            print(f'Waiting for database to be ready (attempt {attempt}, retrying in {sleep:.2f}s)...')
+            time.sleep(sleep)
+            delay = min(delay * 2, max_delay)
 
 if __name__ == '__main__':
-    wait_for_db() 
\ No newline at end of file
+    wait_for_db()
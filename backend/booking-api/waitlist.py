@@ -0,0 +1,243 @@
+from flask import Blueprint, jsonify, request
+from flask_jwt_extended import jwt_required, get_jwt_identity
+from models import Event, Booking, User, WaitlistEntry
+from extensions import db
+from dbrouting import read_only
+from crm_client import build_notification, send_notification
+from datetime import datetime, timedelta
+import os
+
+bp = Blueprint('waitlist', __name__)
+
+ACTIVE_STATUSES = ('waiting', 'promoted')
+ENDED_BOOKING_STATUSES = ('cancelled', 'rejected')
+
+def payment_window():
+    return timedelta(minutes=int(os.getenv('WAITLIST_PAYMENT_WINDOW_MINUTES', '30')))
+
+def lock_event(event_id):
+    """Load an event with a row lock so seat accounting for it is serialized"""
+    return Event.query.filter_by(id=event_id).with_for_update().first()
+
+def live_booking(user_id, event_id):
+    """Return the user's booking for an event unless it was cancelled or rejected"""
+    return Booking.query.filter(
+        Booking.user_id == user_id,
+        Booking.event_id == event_id,
+        Booking.status.notin_(ENDED_BOOKING_STATUSES)
+    ).first()
+
+def active_hold(user_id, event_id):
+    """Return the user's unexpired promotion for an event, if any"""
+    return WaitlistEntry.query.filter(
+        WaitlistEntry.event_id == event_id,
+        WaitlistEntry.user_id == user_id,
+        WaitlistEntry.status == 'promoted',
+        WaitlistEntry.expires_at > datetime.utcnow()
+    ).first()
+
+def promote_next(event):
+    """Hand a freed seat of a locked event to the head of its waitlist.
+
+    The seat stays counted in current_participants while the promoted user's
+    payment window is open. The caller holds the event lock and commits.
+    """
+    entry = WaitlistEntry.query.filter_by(
+        event_id=event.id, status='waiting'
+    ).order_by(WaitlistEntry.id).with_for_update(skip_locked=True).first()
+    if not entry:
+        return None
+    now = datetime.utcnow()
+    entry.status = 'promoted'
+    entry.promoted_at = now
+    entry.expires_at = now + payment_window()
+    return entry
+
+def release_seat(event):
+    """Free one seat of a locked event, passing it down the waitlist when someone is waiting"""
+    entry = promote_next(event)
+    if not entry:
+        event.current_participants = max(0, event.current_participants - 1)
+    return entry
+
+def expire_holds(event):
+    """Expire lapsed payment windows on a locked event and pass their seats on"""
+    lapsed = WaitlistEntry.query.filter(
+        WaitlistEntry.event_id == event.id,
+        WaitlistEntry.status == 'promoted',
+        WaitlistEntry.expires_at <= datetime.utcnow()
+    ).all()
+    promoted = []
+    for entry in lapsed:
+        entry.status = 'expired'
+        next_entry = release_seat(event)
+        if next_entry:
+            promoted.append(next_entry)
+    return promoted
+
+def notify_promoted(entries):
+    """Tell the CRM about promotions; call after the promoting transaction has committed"""
+    for entry in entries:
+        event = Event.query.get(entry.event_id)
+        user = User.query.get(entry.user_id)
+        facilitator = User.query.get(event.user_id) if event else None
+        send_notification(build_notification(
+            'waitlist_promoted', user, event, facilitator,
+            waitlist_entry_id=entry.id,
+            payment_deadline=entry.expires_at.isoformat() if entry.expires_at else None
+        ))
+
+def waitlist_position(entry):
+    return WaitlistEntry.query.filter(
+        WaitlistEntry.event_id == entry.event_id,
+        WaitlistEntry.status == 'waiting',
+        WaitlistEntry.id <= entry.id
+    ).count()
+
+@bp.route('/user/events/<int:event_id>/waitlist', methods=['POST'])
+@jwt_required()
+def join_waitlist(event_id):
+    user_id = get_jwt_identity()
+    user = User.query.get(user_id)
+    if not user or user.role != 'user':
+        return jsonify({'error': 'Not authorized'}), 403
+
+    event = lock_event(event_id)
+    if not event:
+        return jsonify({'error': 'Event not found'}), 404
+
+    if not event.is_active:
+        return jsonify({'error': 'Event is not active'}), 400
+
+    data = request.get_json(silent=True) or {}
+
+    try:
+        promoted = expire_holds(event)
+
+        if event.current_participants < event.max_participants:
+            db.session.commit()
+            notify_promoted(promoted)
+            return jsonify({'error': 'Event has free seats, book it directly'}), 400
+
+        existing_booking = live_booking(user_id, event_id)
+        if existing_booking:
+            db.session.commit()
+            notify_promoted(promoted)
+            return jsonify({'error': 'You already have a booking for this event'}), 400
+
+        existing_entry = WaitlistEntry.query.filter(
+            WaitlistEntry.user_id == user_id,
+            WaitlistEntry.event_id == event_id,
+            WaitlistEntry.status.in_(ACTIVE_STATUSES)
+        ).first()
+        if existing_entry:
+            db.session.commit()
+            notify_promoted(promoted)
+            return jsonify({'error': 'You are already on the waitlist for this event'}), 400
+
+        entry = WaitlistEntry(
+            event_id=event_id,
+            user_id=user.id,
+            status='waiting',
+            notes=data.get('notes', '')
+        )  # type: ignore
+        db.session.add(entry)
+        db.session.commit()
+        notify_promoted(promoted)
+
+        return jsonify({
+            'message': 'Added to waitlist',
+            'waitlist_entry_id': entry.id,
+            'position': waitlist_position(entry)
+        }), 201
+
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'error': 'Failed to join waitlist', 'details': str(e)}), 400
+
+@bp.route('/user/events/<int:event_id>/waitlist', methods=['DELETE'])
+@jwt_required()
+def leave_waitlist(event_id):
+    user_id = get_jwt_identity()
+    user = User.query.get(user_id)
+    if not user or user.role != 'user':
+        return jsonify({'error': 'Not authorized'}), 403
+
+    event = lock_event(event_id)
+    if not event:
+        return jsonify({'error': 'Event not found'}), 404
+
+    entry = WaitlistEntry.query.filter(
+        WaitlistEntry.user_id == user_id,
+        WaitlistEntry.event_id == event_id,
+        WaitlistEntry.status.in_(ACTIVE_STATUSES)
+    ).with_for_update().first()
+    if not entry:
+        db.session.rollback()
+        return jsonify({'error': 'You are not on the waitlist for this event'}), 404
+
+    try:
+        promoted = []
+        if entry.status == 'promoted':
+            # Giving up a held seat passes it straight to the next in line
+            next_entry = release_seat(event)
+            if next_entry:
+                promoted.append(next_entry)
+        entry.status = 'left'
+        db.session.commit()
+        notify_promoted(promoted)
+        return jsonify({'message': 'Removed from waitlist'}), 200
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'error': 'Failed to leave waitlist', 'details': str(e)}), 400
+
+@bp.route('/user/waitlist', methods=['GET'])
+@jwt_required()
+@read_only
+def user_waitlist():
+    user_id = get_jwt_identity()
+    user = User.query.get(user_id)
+    if not user or user.role != 'user':
+        return jsonify({'error': 'Not authorized'}), 403
+
+    rows = db.session.query(WaitlistEntry, Event).join(
+        Event, WaitlistEntry.event_id == Event.id
+    ).filter(
+        WaitlistEntry.user_id == user_id,
+        WaitlistEntry.status.in_(ACTIVE_STATUSES)
+    ).order_by(WaitlistEntry.created_at.desc()).all()
+
+    result = []
+    for entry, event in rows:
+        result.append({
+            'id': entry.id,
+            'status': entry.status,
+            'position': waitlist_position(entry) if entry.status == 'waiting' else None,
+            'expires_at': entry.expires_at.isoformat() if entry.expires_at else None,
+            'created_at': entry.created_at.isoformat() if entry.created_at else None,
+            'event': {
+                'id': event.id,
+                'title': event.title,
+                'start_datetime': event.start_datetime.isoformat() if event.start_datetime else None,
+                'price': float(event.price),
+                'currency': event.currency
+            }
+        })
+    return jsonify(result)
+
+@bp.cli.command('expire')
+def expire_command():
+    """Expire lapsed waitlist payment windows and promote the next users in line."""
+    event_ids = [row[0] for row in db.session.query(WaitlistEntry.event_id).filter(
+        WaitlistEntry.status == 'promoted',
+        WaitlistEntry.expires_at <= datetime.utcnow()
+    ).distinct().all()]
+
+    total = 0
+    for event_id in event_ids:
+        event = lock_event(event_id)
+        promoted = expire_holds(event) if event else []
+        db.session.commit()
+        notify_promoted(promoted)
+        total += len(promoted)
+    print(f'Processed {len(event_ids)} events, promoted {total} waitlisted users')
@@ -0,0 +1 @@
+"""Code shared by the booking API and the CRM service; both images install this package."""
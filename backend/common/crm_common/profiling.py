@@ -0,0 +1,203 @@
+"""On-demand profiling of single requests.
+
+Nothing here is wired into the app unless PROFILING_ENABLED is set; even
+then only requests that ask for it (`X-Profile: cprofile|sample` or
+`?profile=cprofile|sample`) and pass the service's authorization check are
+profiled. Where a token secret is configured, an authorized caller can also
+issue a short-lived profile token for one path; requests to that path
+carrying it in X-Profile-Token are profiled whoever makes them, so e.g. a
+facilitator's own view can be profiled with their credentials. Both the
+booking API and the CRM service install it.
+
+    cprofile  deterministic cProfile run, stored as <profile id>.prof (pstats)
+    sample    stack samples every PROFILE_SAMPLE_INTERVAL_MS, stored as
+              <profile id>.collapsed (collapsed stacks for flamegraph.pl/speedscope)
+
+The profile id is the caller's X-Request-ID, when it is a safe file name,
+followed by a random suffix, so no request can overwrite another's profile.
+"""
+from flask import Blueprint, g, jsonify, request, send_file
+from itsdangerous import BadData, URLSafeTimedSerializer
+import cProfile
+import os
+import re
+import sys
+import threading
+import time
+import uuid
+
+MODES = {'1': 'cprofile', 'true': 'cprofile', 'cprofile': 'cprofile', 'sample': 'sample', 'sampling': 'sample'}
+EXTENSIONS = {'cprofile': '.prof', 'sample': '.collapsed'}
+REQUEST_ID = re.compile(r'^[A-Za-z0-9_-]{1,64}$')
+PROFILE_ID = re.compile(r'^[A-Za-z0-9_-]{1,80}$')
+
+
+def profiling_enabled():
+    return os.getenv('PROFILING_ENABLED', 'false').lower() in ('1', 'true', 'yes')
+
+
+def profile_dir(app):
+    return os.getenv('PROFILE_DIR', os.path.join(app.root_path, 'profiles'))
+
+
+class SamplingProfiler:
+    """Samples one thread's stack on a timer and counts identical stacks.
+
+    While any sampler runs, the interpreter's thread switch interval is
+    lowered to the sample interval; at the default 5ms the sampler would
+    rarely get the GIL from a busy request thread.
+    """
+    _lock = threading.Lock()
+    _running = 0
+    _switch_interval = None
+
+    def __init__(self, thread_id, interval):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.stacks = {}
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name='request-sampler', daemon=True)
+
+    def enable(self):
+        with SamplingProfiler._lock:
+            if SamplingProfiler._running == 0:
+                SamplingProfiler._switch_interval = sys.getswitchinterval()
+                sys.setswitchinterval(min(self.interval, SamplingProfiler._switch_interval))
+            SamplingProfiler._running += 1
+        self._thread.start()
+
+    def disable(self):
+        if self._stop.is_set():
+            return
+        self._stop.set()
+        self._thread.join()
+        with SamplingProfiler._lock:
+            SamplingProfiler._running -= 1
+            if SamplingProfiler._running == 0:
+                sys.setswitchinterval(SamplingProfiler._switch_interval)
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(f'{os.path.basename(code.co_filename)}:{code.co_name}:{code.co_firstlineno}')
+                frame = frame.f_back
+            if stack:
+                key = ';'.join(reversed(stack))
+                self.stacks[key] = self.stacks.get(key, 0) + 1
+
+    def dump(self, path):
+        with open(path, 'w') as fh:
+            for stack, count in sorted(self.stacks.items()):
+                fh.write(f'{stack} {count}\n')
+
+
+def requested_mode():
+    value = request.headers.get('X-Profile') or request.args.get('profile')
+    return MODES.get(value.lower()) if value else None
+
+
+def profile_id():
+    # Start with the caller's (or proxy's) request id so the profile can be matched with its logs
+    candidate = request.headers.get('X-Request-ID', '')
+    suffix = uuid.uuid4().hex
+    return f'{candidate}-{suffix[:12]}' if REQUEST_ID.match(candidate) else suffix
+
+
+def prune(directory, keep):
+    """Delete the oldest profiles beyond the newest `keep`"""
+    paths = [os.path.join(directory, name) for name in os.listdir(directory) if name.endswith(tuple(EXTENSIONS.values()))]
+    paths.sort(key=os.path.getmtime)
+    for path in paths[:-keep] if keep else paths:
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+
+def install(app, authorize, token_secret=None):
+    """Profile requests that ask for it when authorize() allows, and serve the stored profiles.
+
+    authorize is called inside the request and returns whether the caller may profile.
+    With token_secret, authorized callers may issue profile tokens from POST /profiles/tokens;
+    each token is bound to the path given when it was issued.
+    """
+    directory = profile_dir(app)
+    keep = int(os.getenv('PROFILE_MAX_FILES', '100'))
+    interval = float(os.getenv('PROFILE_SAMPLE_INTERVAL_MS', '1')) / 1000
+    token_ttl = int(os.getenv('PROFILE_TOKEN_TTL_SECONDS', '900'))
+    tokens = URLSafeTimedSerializer(token_secret, salt='request-profile') if token_secret else None
+
+    def may_profile():
+        token = request.headers.get('X-Profile-Token')
+        if token and tokens:
+            try:
+                return tokens.loads(token, max_age=token_ttl).get('path') == request.path
+            except BadData:
+                return False
+        return authorize()
+
+    def start_profile():
+        mode = requested_mode()
+        if not mode or not may_profile():
+            return
+        profiler = cProfile.Profile() if mode == 'cprofile' else SamplingProfiler(threading.get_ident(), interval)
+        g.profile = {'mode': mode, 'id': profile_id(), 'profiler': profiler, 'started': time.perf_counter()}
+        profiler.enable()
+
+    def stop_profile(response):
+        profile = g.pop('profile', None)
+        if profile is None:
+            return response
+        profile['profiler'].disable()
+        elapsed_ms = (time.perf_counter() - profile['started']) * 1000
+        os.makedirs(directory, exist_ok=True)
+        name = profile['id'] + EXTENSIONS[profile['mode']]
+        if profile['mode'] == 'cprofile':
+            profile['profiler'].dump_stats(os.path.join(directory, name))
+        else:
+            profile['profiler'].dump(os.path.join(directory, name))
+        prune(directory, keep)
+        response.headers['X-Profile-Id'] = profile['id']
+        response.headers['X-Profile-Url'] = f'/profiles/{name}'
+        response.headers['X-Profile-Duration-Ms'] = f'{elapsed_ms:.1f}'
+        return response
+
+    def abandon_profile(exc):
+        # A request that died before after_request must not leave its profiler running
+        profile = g.pop('profile', None)
+        if profile is not None:
+            profile['profiler'].disable()
+
+    app.before_request(start_profile)
+    app.after_request(stop_profile)
+    app.teardown_request(abandon_profile)
+
+    bp = Blueprint('profiling', __name__)
+
+    @bp.route('/profiles/<name>', methods=['GET'])
+    def download_profile(name):
+        if not authorize():
+            return jsonify({'error': 'Not authorized'}), 403
+        stem, extension = os.path.splitext(name)
+        if not PROFILE_ID.match(stem) or extension not in EXTENSIONS.values():
+            return jsonify({'error': 'Profile not found'}), 404
+        path = os.path.join(directory, name)
+        if not os.path.exists(path):
+            return jsonify({'error': 'Profile not found'}), 404
+        return send_file(path, as_attachment=True, download_name=name)
+
+    if tokens:
+        @bp.route('/profiles/tokens', methods=['POST'])
+        def issue_token():
+            if not authorize():
+                return jsonify({'error': 'Not authorized'}), 403
+            path = (request.get_json(silent=True) or {}).get('path')
+            if not isinstance(path, str) or not path.startswith('/'):
+                return jsonify({'error': 'path must be the request path to profile, e.g. /facilitator/dashboard'}), 400
+            token = tokens.dumps({'path': path, 'nonce': uuid.uuid4().hex})
+            return jsonify({'token': token, 'path': path, 'expires_in': token_ttl}), 201
+
+    app.register_blueprint(bp)
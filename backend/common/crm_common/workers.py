@@ -0,0 +1,25 @@
+import threading
+
+
+class BackgroundWorker:
+    """A daemon thread running `target`, started on first use.
+
+    Threads do not survive a fork (gunicorn forks workers after preloading
+    the app), so `ensure_started` checks liveness rather than just existence
+    and starts a fresh thread in the child.
+    """
+
+    def __init__(self, target, name):
+        self.target = target
+        self.name = name
+        self._lock = threading.Lock()
+        self._thread = None
+
+    def ensure_started(self):
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self.target, name=self.name, daemon=True)
+                self._thread.start()
+
+    def is_alive(self):
+        return self._thread is not None and self._thread.is_alive()
@@ -1,4 +1,4 @@
-from flask import Flask, request, jsonify
+from flask import Flask, Response, request, jsonify
 from flask_cors import CORS
 import os
 from datetime import datetime
@@ -6,6 +6,12 @@ import smtplib
 from email.mime.text import MIMEText
 from email.mime.multipart import MIMEMultipart
 from dotenv import load_dotenv
+from notification_store import NotificationStore
+from mail_pipeline import MailPipeline, RetryScheduler, DeadLetterStore
+from email_templates import templates, render
+from digests import DigestBuffer, MODES as DIGEST_MODES
+from sse import Broadcaster
+from crm_common.profiling import profiling_enabled, install as install_profiling
 
 # Load environment variables from .env file
 load_dotenv()
@@ -16,6 +22,8 @@ CORS(app)
 CRM_BEARER_TOKEN = os.getenv('CRM_BEARER_TOKEN', 'super-crm-token')
 GMAIL_USER = os.getenv('GMAIL_USER', 'your-email@gmail.com')
 GMAIL_PASSWORD = os.getenv('GMAIL_PASSWORD', 'your-app-password')
+# The defaults above are placeholders, not credentials
+GMAIL_PLACEHOLDERS = {'your-email@gmail.com', 'your-app-password'}
 
 # Debug environment variables
 print("=== CRM Service Environment Variables ===")
@@ -24,7 +32,18 @@ print(f"GMAIL_USER: {GMAIL_USER}")
 print(f"GMAIL_PASSWORD: {GMAIL_PASSWORD[:5]}..." if GMAIL_PASSWORD else "Not set")
 print("========================================")
 
-notifications = []  # In-memory store
+store = NotificationStore()  # In-memory store with secondary indexes
+broadcaster = Broadcaster(
+    lambda last_id, facilitator_id: store.after(last_id, facilitator_id),
+    buffer_size=int(os.getenv('CRM_SSE_BUFFER_SIZE', '1000'))
+)
+store.add_listener(broadcaster.publish)
+
+# Compile the email templates at startup rather than on the first notification
+templates()
+
+# Actions that only concern the user; e.g. deleting an event cancels every booking at once
+USER_ONLY_ACTIONS = {'waitlist_promoted', 'cancelled', 'reminder'}
 
 def log_email_fallback(to_email, subject, html_content, text_content=None):
     """Log email content instead of sending when Gmail fails"""
@@ -36,6 +55,28 @@ def log_email_fallback(to_email, subject, html_content, text_content=None):
     print(f"=====================================\n")
     return True
 
+def build_mime(to_email, subject, html_content, text_content=None):
+    msg = MIMEMultipart('alternative')
+    msg['Subject'] = subject
+    msg['From'] = GMAIL_USER
+    msg['To'] = to_email
+    
+    # Add text and HTML parts
+    if text_content:
+        text_part = MIMEText(text_content, 'plain')
+        msg.attach(text_part)
+    
+    html_part = MIMEText(html_content, 'html')
+    msg.attach(html_part)
+    return msg
+
+def email_message(to_email, subject, html_content, text_content=None):
+    """A composed email waiting to be handed to the mail pipeline"""
+    return {'to': to_email, 'subject': subject, 'html': html_content, 'text': text_content}
+
+def gmail_configured():
+    return bool(GMAIL_USER and GMAIL_PASSWORD) and not {GMAIL_USER, GMAIL_PASSWORD} & GMAIL_PLACEHOLDERS
+
 def send_email(to_email, subject, html_content, text_content=None):
     """Send email using Gmail SMTP with fallback to logging"""
     try:
@@ -47,18 +88,7 @@ def send_email(to_email, subject, html_content, text_content=None):
             print("Gmail credentials not configured, logging email instead")
             return log_email_fallback(to_email, subject, html_content, text_content)
             
-        msg = MIMEMultipart('alternative')
-        msg['Subject'] = subject
-        msg['From'] = GMAIL_USER
-        msg['To'] = to_email
-        
-        # Add text and HTML parts
-        if text_content:
-            text_part = MIMEText(text_content, 'plain')
-            msg.attach(text_part)
-        
-        html_part = MIMEText(html_content, 'html')
-        msg.attach(html_part)
+        msg = build_mime(to_email, subject, html_content, text_content)
         
         print(f"Connecting to Gmail SMTP...")
         # Send email
@@ -83,120 +113,104 @@ def send_email(to_email, subject, html_content, text_content=None):
         print("Falling back to email logging...")
         return log_email_fallback(to_email, subject, html_content, text_content)
 
-def send_booking_confirmation_email(user_data, event_data, facilitator_data, booking_id):
-    """Send booking confirmation email to user"""
-    subject = f"Booking Confirmed - {event_data.get('title', 'Event')}"
-    
-    html_content = f"""
-    <html>
-    <body style="font-family: Arial, sans-serif; max-width: 600px; margin: 0 auto; padding: 20px;">
-        <div style="background-color: #f8f9fa; padding: 20px; border-radius: 8px;">
-            <h2 style="color: #28a745; margin-bottom: 20px;">✅ Booking Confirmed!</h2>
-            
-            <div style="background-color: white; padding: 20px; border-radius: 8px; margin-bottom: 20px;">
-                <h3 style="color: #333; margin-bottom: 15px;">Event Details</h3>
-                <p><strong>Event:</strong> {event_data.get('title', 'Unknown Event')}</p>
-                <p><strong>Facilitator:</strong> {facilitator_data.get('name', 'Unknown')}</p>
-                <p><strong>Booking ID:</strong> #{booking_id}</p>
-                <p><strong>Status:</strong> <span style="color: #28a745; font-weight: bold;">Confirmed</span></p>
-            </div>
-            
-            <div style="background-color: #e7f3ff; padding: 15px; border-radius: 8px; border-left: 4px solid #007bff;">
-                <h4 style="margin-top: 0; color: #007bff;">What's Next?</h4>
-                <ul style="margin-bottom: 0;">
-                    <li>You'll receive a reminder before the event</li>
-                    <li>Check your dashboard for event updates</li>
-                    <li>Contact the facilitator if you have questions</li>
-                </ul>
-            </div>
-            
-            <p style="margin-top: 20px; color: #666; font-size: 14px;">
-                Thank you for choosing our platform!
-            </p>
-        </div>
-    </body>
-    </html>
-    """
-    
-    text_content = f"""
-    Booking Confirmed!
-    
-    Event: {event_data.get('title', 'Unknown Event')}
-    Facilitator: {facilitator_data.get('name', 'Unknown')}
-    Booking ID: #{booking_id}
-    Status: Confirmed
-    
-    What's Next?
-    - You'll receive a reminder before the event
-    - Check your dashboard for event updates
-    - Contact the facilitator if you have questions
-    
-    Thank you for choosing our platform!
+def send_emails(messages):
+    """Send a batch of composed emails over one Gmail SMTP session.
+
+    Returns (message, error, permanent) for every email that was not sent,
+    so the mail pipeline can schedule retries. Without working credentials
+    retrying cannot help, so the emails are logged instead, as before.
     """
-    
-    return send_email(user_data.get('email'), subject, html_content, text_content)
-
-def send_facilitator_notification_email(facilitator_data, user_data, event_data, booking_id, action):
-    """Send notification email to facilitator"""
-    action_text = {
-        'payment_completed': 'New Booking Payment',
-        'approved': 'Booking Approved',
-        'rejected': 'Booking Rejected'
-    }.get(action, action)
+    if not gmail_configured():
+        print("Gmail credentials not configured, logging emails instead")
+        for message in messages:
+            log_email_fallback(message['to'], message['subject'], message['html'], message['text'])
+        return []
+    
+    failures = []
+    sent = 0
+    try:
+        print(f"Connecting to Gmail SMTP for {len(messages)} emails...")
+        with smtplib.SMTP_SSL('smtp.gmail.com', 465) as server:
+            server.login(GMAIL_USER, GMAIL_PASSWORD)
+            for message in messages:
+                try:
+                    server.send_message(build_mime(message['to'], message['subject'], message['html'], message['text']))
+                    print(f"Email sent successfully to {message['to']}")
+                except smtplib.SMTPRecipientsRefused as e:
+                    # The address itself was refused; retrying will not help
+                    print(f"Failed to send email to {message['to']}: {e}")
+                    failures.append((message, str(e), True))
+                sent += 1
+    except smtplib.SMTPAuthenticationError as e:
+        print(f"Gmail authentication failed: {e}")
+        print("Falling back to email logging...")
+        for message in messages[sent:]:
+            log_email_fallback(message['to'], message['subject'], message['html'], message['text'])
+    except Exception as e:
+        # Connection failure; everything not yet handled is retried later
+        print(f"Gmail batch send failed: {e}")
+        failures.extend((message, str(e), False) for message in messages[sent:])
+    return failures
+
+def log_dead_letter(entry):
+    """Keep the old behaviour of logging an email we gave up on"""
+    message = entry['message']
+    print(f"Email to {message['to']} moved to dead letters after {entry['attempts']} attempts: {entry['last_error']}")
+    log_email_fallback(message['to'], message['subject'], message['html'], message['text'])
+
+dead_letters = DeadLetterStore()
+retries = RetryScheduler(
+    dead_letters,
+    max_attempts=int(os.getenv('CRM_MAIL_MAX_ATTEMPTS', '5')),
+    base_delay=float(os.getenv('CRM_MAIL_RETRY_BASE_SECONDS', '30')),
+    max_delay=float(os.getenv('CRM_MAIL_RETRY_MAX_SECONDS', '1800')),
+    on_dead_letter=log_dead_letter
+)
+mailer = MailPipeline(send_emails, batch_size=int(os.getenv('CRM_MAIL_BATCH_SIZE', '50')), retries=retries)
+retries.attach(mailer)
+
+def compose_booking_confirmation_email(user_data, event_data, facilitator_data, booking_id):
+    """Compose booking confirmation email to user"""
+    subject = f"Booking Confirmed - {event_data.get('title', 'Event')}"
+    context = {
+        'event_title': event_data.get('title', 'Unknown Event'),
+        'facilitator_name': facilitator_data.get('name', 'Unknown'),
+        'booking_id': booking_id
+    }
+    return email_message(
+        user_data.get('email'),
+        subject,
+        render('booking_confirmation.html', **context),
+        render('booking_confirmation.txt', **context)
+    )
+
+FACILITATOR_ACTION_TEXT = {
+    'payment_completed': 'New Booking Payment',
+    'approved': 'Booking Approved',
+    'rejected': 'Booking Rejected'
+}
+
+def compose_facilitator_notification_email(facilitator_data, user_data, event_data, booking_id, action):
+    """Compose notification email to facilitator"""
+    action_text = FACILITATOR_ACTION_TEXT.get(action, action)
     
     subject = f"{action_text} - {event_data.get('title', 'Event')}"
-    
-    html_content = f"""
-    <html>
-    <body style="font-family: Arial, sans-serif; max-width: 600px; margin: 0 auto; padding: 20px;">
-        <div style="background-color: #f8f9fa; padding: 20px; border-radius: 8px;">
-            <h2 style="color: #007bff; margin-bottom: 20px;">🔔 {action_text}</h2>
-            
-            <div style="background-color: white; padding: 20px; border-radius: 8px; margin-bottom: 20px;">
-                <h3 style="color: #333; margin-bottom: 15px;">Booking Details</h3>
-                <p><strong>Event:</strong> {event_data.get('title', 'Unknown Event')}</p>
-                <p><strong>Customer:</strong> {user_data.get('name', 'Unknown')} ({user_data.get('email', 'No email')})</p>
-                <p><strong>Booking ID:</strong> #{booking_id}</p>
-                <p><strong>Action:</strong> <span style="color: #007bff; font-weight: bold;">{action_text}</span></p>
-            </div>
-            
-            <div style="background-color: #fff3cd; padding: 15px; border-radius: 8px; border-left: 4px solid #ffc107;">
-                <h4 style="margin-top: 0; color: #856404;">Quick Actions</h4>
-                <ul style="margin-bottom: 0;">
-                    <li>Review the booking in your dashboard</li>
-                    <li>Contact the customer if needed</li>
-                    <li>Update event details if necessary</li>
-                </ul>
-            </div>
-            
-            <p style="margin-top: 20px; color: #666; font-size: 14px;">
-                Manage your bookings at your facilitator dashboard.
-            </p>
-        </div>
-    </body>
-    </html>
-    """
-    
-    text_content = f"""
-    {action_text}
-    
-    Event: {event_data.get('title', 'Unknown Event')}
-    Customer: {user_data.get('name', 'Unknown')} ({user_data.get('email', 'No email')})
-    Booking ID: #{booking_id}
-    Action: {action_text}
-    
-    Quick Actions:
-    - Review the booking in your dashboard
-    - Contact the customer if needed
-    - Update event details if necessary
-    
-    Manage your bookings at your facilitator dashboard.
-    """
-    
-    return send_email(facilitator_data.get('email'), subject, html_content, text_content)
+    context = {
+        'action_text': action_text,
+        'event_title': event_data.get('title', 'Unknown Event'),
+        'customer_name': user_data.get('name', 'Unknown'),
+        'customer_email': user_data.get('email', 'No email'),
+        'booking_id': booking_id
+    }
+    return email_message(
+        facilitator_data.get('email'),
+        subject,
+        render('facilitator_notification.html', **context),
+        render('facilitator_notification.txt', **context)
+    )
 
-def send_booking_status_email(user_data, event_data, facilitator_data, booking_id, status):
-    """Send booking status update email to user"""
+def compose_booking_status_email(user_data, event_data, facilitator_data, booking_id, status):
+    """Compose booking status update email to user"""
     status_text = {
         'approved': 'Approved',
         'rejected': 'Rejected',
@@ -210,238 +224,437 @@ def send_booking_status_email(user_data, event_data, facilitator_data, booking_i
     }.get(status, '#6c757d')
     
     subject = f"Booking {status_text} - {event_data.get('title', 'Event')}"
-    
-    html_content = f"""
-    <html>
-    <body style="font-family: Arial, sans-serif; max-width: 600px; margin: 0 auto; padding: 20px;">
-        <div style="background-color: #f8f9fa; padding: 20px; border-radius: 8px;">
-            <h2 style="color: {status_color}; margin-bottom: 20px;">
-                {'✅' if status == 'approved' else '❌'} Booking {status_text}!
-            </h2>
-            
-            <div style="background-color: white; padding: 20px; border-radius: 8px; margin-bottom: 20px;">
-                <h3 style="color: #333; margin-bottom: 15px;">Event Details</h3>
-                <p><strong>Event:</strong> {event_data.get('title', 'Unknown Event')}</p>
-                <p><strong>Facilitator:</strong> {facilitator_data.get('name', 'Unknown')}</p>
-                <p><strong>Booking ID:</strong> #{booking_id}</p>
-                <p><strong>Status:</strong> <span style="color: {status_color}; font-weight: bold;">{status_text}</span></p>
-            </div>
-            
-            {f'''
-            <div style="background-color: #d4edda; padding: 15px; border-radius: 8px; border-left: 4px solid #28a745;">
-                <h4 style="margin-top: 0; color: #155724;">Next Steps</h4>
-                <ul style="margin-bottom: 0;">
-                    <li>Prepare for your session</li>
-                    <li>Check event details and timing</li>
-                    <li>Contact facilitator if you have questions</li>
-                </ul>
-            </div>
-            ''' if status == 'approved' else f'''
-            <div style="background-color: #f8d7da; padding: 15px; border-radius: 8px; border-left: 4px solid #dc3545;">
-                <h4 style="margin-top: 0; color: #721c24;">What Happened?</h4>
-                <p style="margin-bottom: 0;">Your booking was {status_text.lower()}. This could be due to:</p>
-                <ul style="margin-bottom: 0;">
-                    <li>Event cancellation by facilitator</li>
-                    <li>Payment issues</li>
-                    <li>Event capacity reached</li>
-                </ul>
-            </div>
-            '''}
-            
-            <p style="margin-top: 20px; color: #666; font-size: 14px;">
-                Thank you for choosing our platform!
-            </p>
-        </div>
-    </body>
-    </html>
-    """
-    
-    text_content = f"""
-    Booking {status_text}!
-    
-    Event: {event_data.get('title', 'Unknown Event')}
-    Facilitator: {facilitator_data.get('name', 'Unknown')}
-    Booking ID: #{booking_id}
-    Status: {status_text}
-    
-    {f'''
-    Next Steps:
-    - Prepare for your session
-    - Check event details and timing
-    - Contact facilitator if you have questions
-    ''' if status == 'approved' else f'''
-    What Happened?
-    Your booking was {status_text.lower()}. This could be due to:
-    - Event cancellation by facilitator
-    - Payment issues
-    - Event capacity reached
-    '''}
-    
-    Thank you for choosing our platform!
-    """
-    
-    return send_email(user_data.get('email'), subject, html_content, text_content)
+    context = {
+        'status_text': status_text,
+        'status_lower': status_text.lower(),
+        'status_color': status_color,
+        'status_icon': '✅' if status == 'approved' else '❌',
+        'event_title': event_data.get('title', 'Unknown Event'),
+        'facilitator_name': facilitator_data.get('name', 'Unknown'),
+        'booking_id': booking_id
+    }
+    details = 'booking_status_approved' if status == 'approved' else 'booking_status_declined'
+    return email_message(
+        user_data.get('email'),
+        subject,
+        render('booking_status.html', details=render(f'{details}.html', **context), **context),
+        render('booking_status.txt', details=render(f'{details}.txt', **context), **context)
+    )
 
-def send_event_cancellation_email(user_data, event_data, facilitator_data, booking_id):
-    """Send event cancellation email to user"""
+def compose_event_cancellation_email(user_data, event_data, facilitator_data, booking_id):
+    """Compose event cancellation email to user"""
     subject = f"Event Cancelled - {event_data.get('title', 'Event')}"
-    
-    html_content = f"""
-    <html>
-    <body style="font-family: Arial, sans-serif; max-width: 600px; margin: 0 auto; padding: 20px;">
-        <div style="background-color: #f8f9fa; padding: 20px; border-radius: 8px;">
-            <h2 style="color: #dc3545; margin-bottom: 20px;">❌ Event Cancelled</h2>
-            
-            <div style="background-color: white; padding: 20px; border-radius: 8px; margin-bottom: 20px;">
-                <h3 style="color: #333; margin-bottom: 15px;">Event Details</h3>
-                <p><strong>Event:</strong> {event_data.get('title', 'Unknown Event')}</p>
-                <p><strong>Facilitator:</strong> {facilitator_data.get('name', 'Unknown')}</p>
-                <p><strong>Booking ID:</strong> #{booking_id}</p>
-                <p><strong>Status:</strong> <span style="color: #dc3545; font-weight: bold;">Cancelled</span></p>
-            </div>
-            
-            <div style="background-color: #f8d7da; padding: 15px; border-radius: 8px; border-left: 4px solid #dc3545;">
-                <h4 style="margin-top: 0; color: #721c24;">What This Means</h4>
-                <ul style="margin-bottom: 0;">
-                    <li>Your booking has been cancelled</li>
-                    <li>Any payment will be refunded automatically</li>
-                    <li>You can book other events in our platform</li>
-                </ul>
-            </div>
-            
-            <div style="background-color: #e7f3ff; padding: 15px; border-radius: 8px; border-left: 4px solid #007bff; margin-top: 15px;">
-                <h4 style="margin-top: 0; color: #007bff;">Next Steps</h4>
-                <ul style="margin-bottom: 0;">
-                    <li>Check your dashboard for refund status</li>
-                    <li>Browse other available events</li>
-                    <li>Contact support if you have questions</li>
-                </ul>
-            </div>
-            
-            <p style="margin-top: 20px; color: #666; font-size: 14px;">
-                We apologize for any inconvenience caused.
-            </p>
-        </div>
-    </body>
-    </html>
-    """
-    
-    text_content = f"""
-    Event Cancelled
-    
-    Event: {event_data.get('title', 'Unknown Event')}
-    Facilitator: {facilitator_data.get('name', 'Unknown')}
-    Booking ID: #{booking_id}
-    Status: Cancelled
-    
-    What This Means:
-    - Your booking has been cancelled
-    - Any payment will be refunded automatically
-    - You can book other events in our platform
-    
-    Next Steps:
-    - Check your dashboard for refund status
-    - Browse other available events
-    - Contact support if you have questions
-    
-    We apologize for any inconvenience caused.
-    """
-    
-    return send_email(user_data.get('email'), subject, html_content, text_content)
+    context = {
+        'event_title': event_data.get('title', 'Unknown Event'),
+        'facilitator_name': facilitator_data.get('name', 'Unknown'),
+        'booking_id': booking_id
+    }
+    return email_message(
+        user_data.get('email'),
+        subject,
+        render('event_cancellation.html', **context),
+        render('event_cancellation.txt', **context)
+    )
 
-@app.route('/notify', methods=['POST'])
-def notify():
+def compose_waitlist_promotion_email(user_data, event_data, facilitator_data, payment_deadline):
+    """Compose waitlist promotion email to user"""
+    subject = f"A Seat Opened Up - {event_data.get('title', 'Event')}"
+    context = {
+        'event_title': event_data.get('title', 'Unknown Event'),
+        'facilitator_name': facilitator_data.get('name', 'Unknown'),
+        'payment_deadline': payment_deadline or 'soon'
+    }
+    return email_message(
+        user_data.get('email'),
+        subject,
+        render('waitlist_promotion.html', **context),
+        render('waitlist_promotion.txt', **context)
+    )
+
+REMINDER_STARTS_IN = {
+    '24h': 'Tomorrow',
+    '1h': 'in an Hour'
+}
+
+def compose_event_reminder_email(user_data, event_data, facilitator_data, booking_id, reminder_window, event_start, event_location):
+    """Compose event reminder email to user"""
+    starts_in = REMINDER_STARTS_IN.get(reminder_window, 'Soon')
+    subject = f"Reminder: {event_data.get('title', 'Event')} Starts {starts_in}"
+    context = {
+        'starts_in': starts_in,
+        'event_title': event_data.get('title', 'Unknown Event'),
+        'facilitator_name': facilitator_data.get('name', 'Unknown'),
+        'event_start': (event_start or 'Unknown').replace('T', ' ')[:16],
+        'event_location': event_location or 'See your dashboard',
+        'booking_id': booking_id
+    }
+    return email_message(
+        user_data.get('email'),
+        subject,
+        render('event_reminder.html', **context),
+        render('event_reminder.txt', **context)
+    )
+
+def compose_facilitator_digest_email(facilitator_data, notifications):
+    """Compose one summary email covering a facilitator's buffered notifications"""
+    counts = {}
+    html_rows = []
+    text_rows = []
+    for notification in notifications:
+        action_text = FACILITATOR_ACTION_TEXT.get(notification.get('action'), notification.get('action'))
+        counts[action_text] = counts.get(action_text, 0) + 1
+        user = notification.get('user') or {}
+        row = {
+            'time': notification['timestamp'][11:16],
+            'action_text': action_text,
+            'event_title': (notification.get('event') or {}).get('title', 'Unknown Event'),
+            'customer_name': user.get('name', 'Unknown'),
+            'customer_email': user.get('email', 'No email'),
+            'booking_id': notification.get('booking_id')
+        }
+        html_rows.append(render('facilitator_digest_row.html', **row))
+        text_rows.append(render('facilitator_digest_row.txt', **row))
+    
+    heading = f"{len(notifications)} Booking Update{'s' if len(notifications) != 1 else ''}"
+    context = {
+        'heading': heading,
+        'summary': ', '.join(f'{count} {action_text}' for action_text, count in counts.items())
+    }
+    return email_message(
+        facilitator_data.get('email'),
+        f"Booking Digest - {heading}",
+        render('facilitator_digest.html', rows=''.join(html_rows), **context),
+        render('facilitator_digest.txt', rows=''.join(text_rows), **context)
+    )
+
+def send_digests(pending):
+    """Compose every due digest and hand them to the mail pipeline as one batch"""
+    messages = [
+        compose_facilitator_digest_email(digest['facilitator'], digest['notifications'])
+        for digest in pending
+        if digest['facilitator'].get('email')
+    ]
+    print(f"Flushing {len(messages)} notification digests")
+    mailer.submit(messages)
+
+digests = DigestBuffer(
+    send_digests,
+    default_mode=os.getenv('CRM_DIGEST_DEFAULT_MODE', 'immediate'),
+    default_window_minutes=int(os.getenv('CRM_DIGEST_WINDOW_MINUTES', '15')),
+    tick_seconds=float(os.getenv('CRM_DIGEST_TICK_SECONDS', '30')),
+    settings_path=os.getenv(
+        'CRM_DIGEST_SETTINGS_FILE', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'digest_settings.json')
+    )
+)
+
+def notification_emails(data):
+    """Compose the emails a notification should trigger"""
+    action = data.get('action', 'unknown')
+    user = data.get('user') or {}
+    facilitator = data.get('facilitator') or {}
+    messages = []
+    
+    # Email the user for payment completed
+    if action == 'payment_completed' and user.get('email'):
+        messages.append(compose_booking_confirmation_email(user, data['event'], facilitator, data['booking_id']))
+    
+    # Email the user for booking status changes
+    if action in ['approved', 'rejected'] and user.get('email'):
+        messages.append(compose_booking_status_email(user, data['event'], facilitator, data['booking_id'], action))
+    
+    # Email the user for event cancellations
+    if action == 'cancelled' and user.get('email'):
+        messages.append(compose_event_cancellation_email(user, data['event'], facilitator, data['booking_id']))
+    
+    # Email the user when a waitlist seat is held for them
+    if action == 'waitlist_promoted' and user.get('email'):
+        messages.append(compose_waitlist_promotion_email(user, data['event'], facilitator, data.get('payment_deadline')))
+    
+    # Remind the user of an upcoming event
+    if action == 'reminder' and user.get('email'):
+        messages.append(compose_event_reminder_email(
+            user, data['event'], facilitator, data['booking_id'],
+            data.get('reminder_window'), data.get('event_start'), data.get('event_location')
+        ))
+    
+    # Email the facilitator for booking actions they did not trigger in bulk themselves,
+    # unless they asked for digests, in which case the notification waits for the next one.
+    # Without a facilitator_id their settings are unknown, so only their email is skipped
+    if action not in USER_ONLY_ACTIONS and facilitator.get('email') and data.get('facilitator_id') is not None \
+            and not digests.add(int(data['facilitator_id']), facilitator, data):
+        messages.append(compose_facilitator_notification_email(facilitator, user, data['event'], data['booking_id'], action))
+    
+    return messages
+
+def check_bearer():
+    """Return an error response unless the request carries the CRM bearer token"""
     auth = request.headers.get('Authorization', '')
     if not auth.startswith('Bearer '):
         return jsonify({'error': 'Missing or invalid Authorization header'}), 401
     token = auth.split(' ', 1)[1]
     if token != CRM_BEARER_TOKEN:
         return jsonify({'error': 'Invalid Bearer token'}), 403
+    return None
+
+if profiling_enabled():
+    # Callers holding the CRM bearer token may profile requests and download the profiles
+    install_profiling(app, lambda: check_bearer() is None)
+
+REQUIRED_FIELDS = ['booking_id', 'user', 'event', 'facilitator_id']
+
+def validate_notification(data):
+    """Return an error message for a malformed notification, or None"""
+    if not isinstance(data, dict):
+        return 'Notification must be an object'
+    if not all(field in data for field in REQUIRED_FIELDS):
+        return 'Missing required fields'
+    return None
+
+def queue_emails(notifications):
+    """Compose the emails for stored notifications and hand them to the mail pipeline in one go"""
+    messages = []
+    for notification in notifications:
+        try:
+            messages.extend(notification_emails(notification))
+        except Exception as e:
+            print(f"Failed to compose emails for notification {notification['id']}: {e}")
+            import traceback
+            traceback.print_exc()
+    mailer.submit(messages)
+    return len(messages)
+
+@app.route('/healthz', methods=['GET'])
+def healthz():
+    return jsonify({'status': 'ok', 'mail_queue': mailer.pending()})
+
+@app.route('/notify', methods=['POST'])
+def notify():
+    error = check_bearer()
+    if error:
+        return error
     data = request.get_json()
-    required = ['booking_id', 'user', 'event', 'facilitator_id']
-    if not all(field in data for field in required):
+    if validate_notification(data):
         return jsonify({'error': 'Missing required fields'}), 400
     
-    # Add timestamp to notification
-    notification_data = {
-        **data,
-        'timestamp': datetime.now().isoformat(),
-        'id': len(notifications) + 1
-    }
-    
-    notifications.append(notification_data)
+    # Store with id and timestamp
+    notification_data = store.add(data)
     print('CRM Notification received:', notification_data)
-    
-    # Send email notifications
-    try:
-        action = data.get('action', 'unknown')
-        print(f"Processing notification for action: {action}")
-        
-        # Send email to user for payment completed
-        if action == 'payment_completed' and data.get('user', {}).get('email'):
-            print(f"Sending payment confirmation email to user: {data['user']['email']}")
-            send_booking_confirmation_email(
-                data['user'],
-                data['event'],
-                data.get('facilitator', {}),
-                data['booking_id']
-            )
-        
-        # Send email to user for booking status changes
-        if action in ['approved', 'rejected'] and data.get('user', {}).get('email'):
-            print(f"Sending status email to user: {data['user']['email']}")
-            send_booking_status_email(
-                data['user'],
-                data['event'],
-                data.get('facilitator', {}),
-                data['booking_id'],
-                action
-            )
-        
-        # Send email to user for event cancellations
-        if action == 'cancelled' and data.get('user', {}).get('email'):
-            print(f"Sending cancellation email to user: {data['user']['email']}")
-            send_event_cancellation_email(
-                data['user'],
-                data['event'],
-                data.get('facilitator', {}),
-                data['booking_id']
-            )
-        
-        # Send email to facilitator for all actions
-        if data.get('facilitator', {}).get('email'):
-            print(f"Sending notification email to facilitator: {data['facilitator']['email']}")
-            send_facilitator_notification_email(
-                data['facilitator'],
-                data['user'],
-                data['event'],
-                data['booking_id'],
-                action
-            )
-            
-    except Exception as e:
-        print(f"Failed to send email notifications: {e}")
-        import traceback
-        traceback.print_exc()
+    queue_emails([notification_data])
     
     return jsonify({'message': 'Notification received', 'id': notification_data['id']}), 200
 
+@app.route('/notify/batch', methods=['POST'])
+def notify_batch():
+    error = check_bearer()
+    if error:
+        return error
+    data = request.get_json(silent=True)
+    items = data.get('notifications') if isinstance(data, dict) else data
+    if not isinstance(items, list):
+        return jsonify({'error': 'Expected a JSON array of notifications'}), 400
+    max_batch = int(os.getenv('CRM_MAX_BATCH_SIZE', '500'))
+    if len(items) > max_batch:
+        return jsonify({'error': f'At most {max_batch} notifications per batch'}), 413
+    
+    # Validate everything first so the store sees a single write
+    errors = [validate_notification(item) for item in items]
+    stored = iter(store.add_many([item for item, error in zip(items, errors) if not error]))
+    
+    results = []
+    accepted = []
+    for index, error in enumerate(errors):
+        if error:
+            results.append({'index': index, 'status': 'rejected', 'error': error})
+        else:
+            notification = next(stored)
+            accepted.append(notification)
+            results.append({'index': index, 'status': 'accepted', 'id': notification['id']})
+    
+    emails = queue_emails(accepted)
+    print(f"CRM batch received: {len(accepted)} accepted, {len(items) - len(accepted)} rejected, {emails} emails queued")
+    
+    return jsonify({
+        'accepted': len(accepted),
+        'rejected': len(items) - len(accepted),
+        'results': results
+    }), 200
+
+def parse_since(value):
+    """Parse an ISO 8601 time as the naive local time the store stamps notifications with"""
+    since = datetime.fromisoformat(value)
+    # An offset (e.g. +00:00 or Z) is converted, as aware and naive times do not compare
+    return since.astimezone().replace(tzinfo=None) if since.tzinfo else since
+
+def parse_notification_filters():
+    """Read the shared notification filters from the query string, raising ValueError when malformed"""
+    facilitator_id = request.args.get('facilitator_id')
+    since = request.args.get('since')
+    return {
+        'facilitator_id': int(facilitator_id) if facilitator_id else None,
+        'action': request.args.get('action') or None,
+        'since': parse_since(since) if since else None
+    }
+
 @app.route('/notifications', methods=['GET'])
 def get_notifications():
-    return jsonify(notifications)
+    try:
+        filters = parse_notification_filters()
+        cursor = request.args.get('cursor')
+        cursor = int(cursor) if cursor else None
+    except ValueError:
+        return jsonify({'error': 'Invalid facilitator_id, since or cursor'}), 400
+    
+    order = request.args.get('order', 'desc')
+    if order not in ('asc', 'desc'):
+        return jsonify({'error': 'Order must be asc or desc'}), 400
+    limit = min(max(request.args.get('limit', 50, type=int), 1), 500)
+    
+    page, next_cursor, total = store.query(cursor=cursor, limit=limit, order=order, **filters)
+    
+    # The body stays a plain list; paging metadata travels in headers
+    response = jsonify(page)
+    response.headers['X-Total-Count'] = str(total)
+    if next_cursor is not None:
+        response.headers['X-Next-Cursor'] = str(next_cursor)
+    return response
+
+@app.route('/notifications/stream', methods=['GET'])
+def stream_notifications():
+    """Push new notifications as Server-Sent Events, optionally for one facilitator"""
+    try:
+        facilitator_id = request.args.get('facilitator_id')
+        facilitator_id = int(facilitator_id) if facilitator_id else None
+        # Browsers resend Last-Event-ID on reconnect; the query parameter covers the first connect
+        last_event_id = request.headers.get('Last-Event-ID') or request.args.get('last_event_id')
+        last_event_id = int(last_event_id) if last_event_id else None
+    except ValueError:
+        return jsonify({'error': 'Invalid facilitator_id or Last-Event-ID'}), 400
+    
+    heartbeat = float(os.getenv('CRM_SSE_HEARTBEAT_SECONDS', '15'))
+    return Response(
+        broadcaster.subscribe(facilitator_id, last_event_id, heartbeat),
+        mimetype='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    )
+
+@app.route('/notifications/count', methods=['GET'])
+def count_notifications():
+    try:
+        filters = parse_notification_filters()
+    except ValueError:
+        return jsonify({'error': 'Invalid facilitator_id or since'}), 400
+    return jsonify({'count': store.count(**filters)})
 
 @app.route('/notifications/<int:notification_id>', methods=['DELETE'])
 def delete_notification(notification_id):
-    global notifications
-    notifications = [n for n in notifications if n.get('id') != notification_id]
+    store.delete(notification_id)
     return jsonify({'message': 'Notification deleted'}), 200
 
 @app.route('/notifications/clear', methods=['DELETE'])
 def clear_notifications():
-    global notifications
-    notifications = []
+    store.clear()
     return jsonify({'message': 'All notifications cleared'}), 200
 
+@app.route('/facilitators/<int:facilitator_id>/notification-settings', methods=['GET'])
+def get_notification_settings(facilitator_id):
+    settings = digests.settings(facilitator_id)
+    return jsonify({
+        'facilitator_id': facilitator_id,
+        **settings,
+        'pending': digests.pending().get(facilitator_id)
+    })
+
+@app.route('/facilitators/<int:facilitator_id>/notification-settings', methods=['PUT'])
+def update_notification_settings(facilitator_id):
+    error = check_bearer()
+    if error:
+        return error
+    data = request.get_json(silent=True) or {}
+    mode = data.get('mode')
+    if mode is not None and mode not in DIGEST_MODES:
+        return jsonify({'error': f"Mode must be one of: {', '.join(DIGEST_MODES)}"}), 400
+    window_minutes = data.get('window_minutes')
+    if window_minutes is not None and (not isinstance(window_minutes, int) or not 1 <= window_minutes <= 1440):
+        return jsonify({'error': 'window_minutes must be an integer between 1 and 1440'}), 400
+    
+    settings = digests.configure(facilitator_id, mode=mode, window_minutes=window_minutes)
+    return jsonify({'facilitator_id': facilitator_id, **settings})
+
+@app.route('/digests', methods=['GET'])
+def pending_digests():
+    return jsonify(digests.pending())
+
+@app.route('/digests/flush', methods=['POST'])
+def flush_digests():
+    error = check_bearer()
+    if error:
+        return error
+    everything = request.args.get('all', 'false').lower() == 'true'
+    return jsonify({'flushed': digests.flush_due(everything=everything)})
+
+def dead_letter_summary(entry):
+    message = entry['message']
+    return {
+        'id': entry['id'],
+        'to': message['to'],
+        'subject': message['subject'],
+        'attempts': entry['attempts'],
+        'last_error': entry['last_error'],
+        'failed_at': entry['failed_at']
+    }
+
+def replay(entries):
+    """Give dead-lettered emails a fresh set of attempts"""
+    mailer.submit([{**entry['message'], 'attempts': 0} for entry in entries])
+    return len(entries)
+
+@app.route('/dead-letters', methods=['GET'])
+def list_dead_letters():
+    error = check_bearer()
+    if error:
+        return error
+    return jsonify({
+        'dead_letters': [dead_letter_summary(entry) for entry in dead_letters.list()],
+        'pending_retries': retries.pending(),
+        'queued': mailer.pending()
+    })
+
+@app.route('/dead-letters/<int:entry_id>', methods=['GET'])
+def get_dead_letter(entry_id):
+    error = check_bearer()
+    if error:
+        return error
+    entry = dead_letters.get(entry_id)
+    if not entry:
+        return jsonify({'error': 'Dead letter not found'}), 404
+    return jsonify({**dead_letter_summary(entry), 'html': entry['message']['html'], 'text': entry['message']['text']})
+
+@app.route('/dead-letters/<int:entry_id>/replay', methods=['POST'])
+def replay_dead_letter(entry_id):
+    error = check_bearer()
+    if error:
+        return error
+    entry = dead_letters.pop(entry_id)
+    if not entry:
+        return jsonify({'error': 'Dead letter not found'}), 404
+    return jsonify({'replayed': replay([entry])})
+
+@app.route('/dead-letters/replay', methods=['POST'])
+def replay_dead_letters():
+    error = check_bearer()
+    if error:
+        return error
+    return jsonify({'replayed': replay(dead_letters.pop_all())})
+
+@app.route('/dead-letters/<int:entry_id>', methods=['DELETE'])
+def delete_dead_letter(entry_id):
+    error = check_bearer()
+    if error:
+        return error
+    if not dead_letters.pop(entry_id):
+        return jsonify({'error': 'Dead letter not found'}), 404
+    return jsonify({'message': 'Dead letter deleted'}), 200
+
 @app.route('/test-email', methods=['POST'])
 def test_email():
     """Test endpoint to verify email functionality"""
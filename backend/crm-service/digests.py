@@ -0,0 +1,136 @@
+from datetime import datetime, timedelta
+import json
+import os
+import threading
+import time
+from crm_common.workers import BackgroundWorker
+
+MODES = ('immediate', 'digest')
+
+
+class DigestBuffer:
+    """Coalesces facilitator notifications into periodic digest emails.
+
+    Facilitators in digest mode have their notifications buffered; the first
+    notification of a window fixes when that digest is due. A scheduler thread
+    wakes up at least every `tick_seconds`, takes every due digest and hands
+    them to `flush` together so they go out as one mail batch.
+
+    Per-facilitator settings are saved to `settings_path`, when given, so they
+    survive restarts; buffered notifications do not.
+    """
+
+    def __init__(self, flush, default_mode='immediate', default_window_minutes=15, tick_seconds=30,
+                 settings_path=None):
+        self._flush = flush
+        self.default_mode = default_mode
+        self.default_window_minutes = default_window_minutes
+        self.tick_seconds = tick_seconds
+        self.settings_path = settings_path
+        self._lock = threading.Lock()
+        self._settings = self._load_settings()
+        self._pending = {}
+        self._wakeup = threading.Event()
+        self._worker = BackgroundWorker(self._run, 'crm-digests')
+
+    def _load_settings(self):
+        if not self.settings_path or not os.path.exists(self.settings_path):
+            return {}
+        with open(self.settings_path) as fh:
+            return {int(facilitator_id): settings for facilitator_id, settings in json.load(fh).items()}
+
+    def _save_settings(self):
+        # Written to a temporary file and renamed, so a crash never leaves half a file behind
+        if not self.settings_path:
+            return
+        directory = os.path.dirname(os.path.abspath(self.settings_path))
+        os.makedirs(directory, exist_ok=True)
+        temporary = f'{self.settings_path}.tmp'
+        with open(temporary, 'w') as fh:
+            json.dump(self._settings, fh)
+        os.replace(temporary, self.settings_path)
+
+    def settings(self, facilitator_id):
+        with self._lock:
+            return self._settings_for(facilitator_id)
+
+    def _settings_for(self, facilitator_id):
+        return self._settings.get(facilitator_id, {
+            'mode': self.default_mode,
+            'window_minutes': self.default_window_minutes
+        })
+
+    def configure(self, facilitator_id, mode=None, window_minutes=None):
+        """Update a facilitator's settings; switching to immediate sends anything buffered right away"""
+        with self._lock:
+            current = dict(self._settings_for(facilitator_id))
+            if mode is not None:
+                current['mode'] = mode
+            if window_minutes is not None:
+                current['window_minutes'] = window_minutes
+            self._settings[facilitator_id] = current
+            self._save_settings()
+            if current['mode'] == 'immediate' and facilitator_id in self._pending:
+                self._pending[facilitator_id]['due_at'] = datetime.now()
+                self._wakeup.set()
+        return current
+
+    def add(self, facilitator_id, facilitator, notification):
+        """Buffer a notification if the facilitator wants digests; returns False in immediate mode"""
+        with self._lock:
+            settings = self._settings_for(facilitator_id)
+            if settings['mode'] != 'digest':
+                return False
+            digest = self._pending.get(facilitator_id)
+            if digest is None:
+                digest = self._pending[facilitator_id] = {
+                    'facilitator': facilitator,
+                    'notifications': [],
+                    'due_at': datetime.now() + timedelta(minutes=settings['window_minutes'])
+                }
+            digest['notifications'].append(notification)
+        self._worker.ensure_started()
+        return True
+
+    def pending(self):
+        with self._lock:
+            return {
+                facilitator_id: {
+                    'notifications': len(digest['notifications']),
+                    'due_at': digest['due_at'].isoformat()
+                }
+                for facilitator_id, digest in self._pending.items()
+            }
+
+    def take_due(self, now=None, everything=False):
+        now = now or datetime.now()
+        with self._lock:
+            due = [facilitator_id for facilitator_id, digest in self._pending.items()
+                   if everything or digest['due_at'] <= now]
+            return [self._pending.pop(facilitator_id) for facilitator_id in due]
+
+    def flush_due(self, everything=False):
+        """Send every due digest in one batch, returning how many were sent"""
+        digests = self.take_due(everything=everything)
+        if digests:
+            self._flush(digests)
+        return len(digests)
+
+    def _seconds_until_next(self):
+        with self._lock:
+            if not self._pending:
+                return self.tick_seconds
+            earliest = min(digest['due_at'] for digest in self._pending.values())
+        return min(self.tick_seconds, max((earliest - datetime.now()).total_seconds(), 0))
+
+    def _run(self):
+        while True:
+            self._wakeup.wait(self._seconds_until_next())
+            self._wakeup.clear()
+            try:
+                self.flush_due()
+            except Exception as e:
+                print(f"Failed to flush notification digests: {e}")
+                import traceback
+                traceback.print_exc()
+                time.sleep(1)
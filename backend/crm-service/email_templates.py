@@ -0,0 +1,70 @@
+from html import escape
+import os
+import re
+
+TEMPLATE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'templates')
+
+# {{ name }} is escaped in HTML templates; {{ name|raw }} is for fragments we rendered ourselves
+PLACEHOLDER = re.compile(r'\{\{\s*(\w+)\s*(\|raw)?\s*\}\}')
+
+
+class CompiledTemplate:
+    """A template split once into its static fragments and the fields between them.
+
+    Rendering only converts the fields and joins them with the cached static
+    text, so no parsing happens per message. HTML templates escape every field
+    unless it is marked `|raw`.
+    """
+
+    def __init__(self, name, source, autoescape):
+        parts = PLACEHOLDER.split(source)
+        self.name = name
+        self._static = tuple(parts[0::3])
+        self._fields = tuple(
+            (field, autoescape and not raw)
+            for field, raw in zip(parts[1::3], parts[2::3])
+        )
+
+    @property
+    def fields(self):
+        return {field for field, _ in self._fields}
+
+    def render(self, context):
+        static = self._static
+        out = [static[0]]
+        for index, (field, escaped) in enumerate(self._fields, 1):
+            value = context[field]
+            value = '' if value is None else str(value)
+            out.append(escape(value) if escaped else value)
+            out.append(static[index])
+        return ''.join(out)
+
+
+def compile_template(name, source):
+    return CompiledTemplate(name, source, autoescape=name.endswith('.html'))
+
+
+def load_templates(directory=TEMPLATE_DIR):
+    """Read and compile every template in the directory, keyed by file name"""
+    templates = {}
+    for filename in sorted(os.listdir(directory)):
+        if not filename.endswith(('.html', '.txt')):
+            continue
+        with open(os.path.join(directory, filename), encoding='utf-8') as f:
+            templates[filename] = compile_template(filename, f.read())
+    return templates
+
+
+_templates = None
+
+
+def templates():
+    global _templates
+    if _templates is None:
+        _templates = load_templates()
+    return _templates
+
+
+def render(name, **context):
+    """Render a compiled template; a missing field raises KeyError"""
+    return templates()[name].render(context)
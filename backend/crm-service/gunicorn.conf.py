@@ -0,0 +1,25 @@
+"""Production gunicorn settings for the CRM service.
+
+    gunicorn -c gunicorn.conf.py app:app
+
+Notifications, digests, retries and SSE subscribers all live in process
+memory, so the service runs exactly one worker and scales with threads.
+Each open /notifications/stream connection holds a thread, so size
+GUNICORN_THREADS for the expected number of dashboards plus regular
+traffic, or use GUNICORN_WORKER_CLASS=gevent after installing gevent.
+"""
+import os
+
+bind = os.getenv('GUNICORN_BIND', '0.0.0.0:5001')
+# In-memory state: more than one worker would split notifications between processes
+workers = 1
+worker_class = os.getenv('GUNICORN_WORKER_CLASS', 'gthread')
+threads = int(os.getenv('GUNICORN_THREADS', '32'))
+timeout = int(os.getenv('GUNICORN_TIMEOUT', '30'))
+graceful_timeout = int(os.getenv('GUNICORN_GRACEFUL_TIMEOUT', '30'))
+keepalive = int(os.getenv('GUNICORN_KEEPALIVE', '5'))
+preload_app = True
+reload = os.getenv('GUNICORN_RELOAD', 'false').lower() == 'true'
+# An empty GUNICORN_ACCESS_LOG turns the access log off
+accesslog = os.getenv('GUNICORN_ACCESS_LOG', '-') or None
+errorlog = '-'
@@ -0,0 +1,172 @@
+from datetime import datetime
+import heapq
+import itertools
+import queue
+import random
+import threading
+import time
+from crm_common.workers import BackgroundWorker
+
+
+class MailPipeline:
+    """Background email sender.
+
+    Requests hand over composed messages and return immediately; a single
+    worker thread drains the queue in batches and passes each batch to
+    `send_batch`, which can deliver it over one SMTP session. `send_batch`
+    returns the (message, error, permanent) triples it could not deliver,
+    and those go to the retry scheduler.
+    """
+
+    def __init__(self, send_batch, batch_size=50, retries=None):
+        self._send_batch = send_batch
+        self._batch_size = batch_size
+        self._retries = retries
+        self._queue = queue.Queue()
+        self._worker = BackgroundWorker(self._drain, 'crm-mailer')
+
+    def submit(self, messages):
+        """Queue composed messages for delivery"""
+        if not messages:
+            return
+        self._worker.ensure_started()
+        for message in messages:
+            self._queue.put(message)
+
+    def pending(self):
+        return self._queue.qsize()
+
+    def _next_batch(self):
+        batch = [self._queue.get()]
+        while len(batch) < self._batch_size:
+            try:
+                batch.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _drain(self):
+        while True:
+            batch = self._next_batch()
+            try:
+                failures = self._send_batch(batch) or []
+            except Exception as e:
+                print(f"Failed to send email batch: {e}")
+                import traceback
+                traceback.print_exc()
+                failures = [(message, str(e), False) for message in batch]
+            if failures and self._retries is not None:
+                self._retries.schedule(failures)
+
+
+class DeadLetterStore:
+    """Emails that exhausted their retries, kept for inspection and replay"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._next_id = 1
+        self._entries = {}
+
+    def add(self, message, error):
+        with self._lock:
+            entry = {
+                'id': self._next_id,
+                'message': message,
+                'attempts': message.get('attempts', 0),
+                'last_error': error,
+                'failed_at': datetime.now().isoformat()
+            }
+            self._entries[entry['id']] = entry
+            self._next_id += 1
+            return entry
+
+    def list(self):
+        with self._lock:
+            return list(self._entries.values())
+
+    def get(self, entry_id):
+        with self._lock:
+            return self._entries.get(entry_id)
+
+    def pop(self, entry_id):
+        with self._lock:
+            return self._entries.pop(entry_id, None)
+
+    def pop_all(self):
+        with self._lock:
+            entries = list(self._entries.values())
+            self._entries.clear()
+            return entries
+
+    def __len__(self):
+        return len(self._entries)
+
+
+class RetryScheduler:
+    """Re-submits failed emails on a timer heap with exponential backoff and jitter.
+
+    Failures are pushed onto a heap keyed by when they are next due. The
+    worker thread sleeps until the earliest entry is due and hands due
+    messages back to the pipeline's queue, so it never sends anything itself
+    and never holds up new notifications. A message that has failed
+    `max_attempts` times, or failed permanently, goes to the dead-letter store.
+    """
+
+    def __init__(self, dead_letters, max_attempts=5, base_delay=30, max_delay=1800, on_dead_letter=None):
+        self.dead_letters = dead_letters
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self._on_dead_letter = on_dead_letter
+        self._pipeline = None
+        self._heap = []
+        self._sequence = itertools.count()
+        self._condition = threading.Condition()
+        self._worker = BackgroundWorker(self._run, 'crm-mail-retries')
+
+    def attach(self, pipeline):
+        self._pipeline = pipeline
+
+    def backoff(self, attempts):
+        """Seconds before the next attempt: doubling per attempt, capped, with half of it jittered"""
+        delay = min(self.base_delay * 2 ** (attempts - 1), self.max_delay)
+        return delay / 2 + random.uniform(0, delay / 2)
+
+    def schedule(self, failures):
+        due = []
+        for message, error, permanent in failures:
+            message = {**message, 'attempts': message.get('attempts', 0) + 1, 'last_error': error}
+            if permanent or message['attempts'] >= self.max_attempts:
+                entry = self.dead_letters.add(message, error)
+                if self._on_dead_letter:
+                    self._on_dead_letter(entry)
+                continue
+            due.append((time.monotonic() + self.backoff(message['attempts']), next(self._sequence), message))
+        if not due:
+            return
+        with self._condition:
+            for item in due:
+                heapq.heappush(self._heap, item)
+            self._condition.notify()
+        self._worker.ensure_started()
+
+    def pending(self):
+        with self._condition:
+            return len(self._heap)
+
+    def _take_due(self):
+        with self._condition:
+            while True:
+                now = time.monotonic()
+                if self._heap and self._heap[0][0] <= now:
+                    due = []
+                    while self._heap and self._heap[0][0] <= now:
+                        due.append(heapq.heappop(self._heap)[2])
+                    return due
+                self._condition.wait(self._heap[0][0] - now if self._heap else None)
+
+    def _run(self):
+        while True:
+            due = self._take_due()
+            print(f"Retrying {len(due)} failed emails")
+            self._pipeline.submit(due)
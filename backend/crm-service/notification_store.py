@@ -0,0 +1,143 @@
+from bisect import bisect_left, bisect_right
+from collections import defaultdict
+from datetime import datetime
+import threading
+
+
+def facilitator_key(notification):
+    """The notification's facilitator id as an int, or None when missing or malformed"""
+    facilitator_id = notification.get('facilitator_id')
+    try:
+        return int(facilitator_id) if facilitator_id is not None else None
+    except (TypeError, ValueError):
+        return None
+
+
+class NotificationStore:
+    """In-memory notification store with secondary indexes.
+
+    Ids are handed out in increasing order under the lock, so the primary
+    id list and every secondary index (per facilitator, per action and per
+    facilitator+action) are sorted lists of ids. Filtered pages, counts and
+    `since` lookups are binary searches instead of scans over every
+    notification.
+    """
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._next_id = 1
+        self._by_id = {}
+        self._created = {}
+        self._ids = []
+        self._by_facilitator = defaultdict(list)
+        self._by_action = defaultdict(list)
+        self._by_facilitator_action = defaultdict(list)
+        self._listeners = []
+
+    def add_listener(self, listener):
+        """Call `listener(stored)` after every write, still under the lock so listeners see ids in order"""
+        self._listeners.append(listener)
+
+    def _index_lists(self, notification):
+        facilitator_id = facilitator_key(notification)
+        action = notification.get('action')
+        lists = [self._ids, self._by_action[action]]
+        if facilitator_id is not None:
+            lists.append(self._by_facilitator[facilitator_id])
+            lists.append(self._by_facilitator_action[(facilitator_id, action)])
+        return lists
+
+    def add_many(self, items):
+        """Store notifications in one locked write, returning them with id and timestamp"""
+        stored = []
+        with self._lock:
+            for data in items:
+                now = datetime.now()
+                notification = {
+                    **data,
+                    'timestamp': now.isoformat(),
+                    'id': self._next_id
+                }
+                self._next_id += 1
+                self._by_id[notification['id']] = notification
+                self._created[notification['id']] = now
+                for ids in self._index_lists(notification):
+                    ids.append(notification['id'])
+                stored.append(notification)
+            for listener in self._listeners:
+                listener(stored)
+        return stored
+
+    def add(self, data):
+        return self.add_many([data])[0]
+
+    def get(self, notification_id):
+        with self._lock:
+            return self._by_id.get(notification_id)
+
+    def delete(self, notification_id):
+        with self._lock:
+            notification = self._by_id.pop(notification_id, None)
+            if notification is None:
+                return False
+            del self._created[notification_id]
+            for ids in self._index_lists(notification):
+                position = bisect_left(ids, notification_id)
+                if position < len(ids) and ids[position] == notification_id:
+                    del ids[position]
+            return True
+
+    def clear(self):
+        with self._lock:
+            self._by_id.clear()
+            self._created.clear()
+            self._ids.clear()
+            self._by_facilitator.clear()
+            self._by_action.clear()
+            self._by_facilitator_action.clear()
+
+    def _select(self, facilitator_id, action):
+        if facilitator_id is not None and action is not None:
+            return self._by_facilitator_action.get((facilitator_id, action), [])
+        if facilitator_id is not None:
+            return self._by_facilitator.get(facilitator_id, [])
+        if action is not None:
+            return self._by_action.get(action, [])
+        return self._ids
+
+    def _range(self, ids, since):
+        start = bisect_left(ids, since, key=self._created.__getitem__) if since else 0
+        return start, len(ids)
+
+    def count(self, facilitator_id=None, action=None, since=None):
+        with self._lock:
+            start, end = self._range(self._select(facilitator_id, action), since)
+            return end - start
+
+    def query(self, facilitator_id=None, action=None, since=None, cursor=None, limit=50, order='desc'):
+        """Return (page, next_cursor, total) for the filters; cursor is the last id already seen"""
+        with self._lock:
+            ids = self._select(facilitator_id, action)
+            start, end = self._range(ids, since)
+            total = end - start
+            if order == 'desc':
+                if cursor is not None:
+                    end = max(start, min(end, bisect_left(ids, cursor)))
+                page_ids = ids[max(start, end - limit):end][::-1]
+                has_more = end - limit > start
+            else:
+                if cursor is not None:
+                    start = min(end, max(start, bisect_right(ids, cursor)))
+                page_ids = ids[start:start + limit]
+                has_more = start + limit < end
+            page = [self._by_id[notification_id] for notification_id in page_ids]
+        next_cursor = page_ids[-1] if has_more and page_ids else None
+        return page, next_cursor, total
+
+    def after(self, last_id, facilitator_id=None, limit=None):
+        """Notifications with an id above last_id, oldest first"""
+        with self._lock:
+            ids = self._select(facilitator_id, None)
+            start = bisect_right(ids, last_id)
+            end = len(ids) if limit is None else start + limit
+            return [self._by_id[notification_id] for notification_id in ids[start:end]]
@@ -0,0 +1,85 @@
+from bisect import bisect_right
+import json
+import threading
+
+from notification_store import facilitator_key
+
+
+def encode_event(notification):
+    return f"id: {notification['id']}\nevent: notification\ndata: {json.dumps(notification)}\n\n".encode()
+
+
+class Broadcaster:
+    """Fans new notifications out to Server-Sent Events subscribers.
+
+    The single writer encodes each notification once into an SSE frame and
+    appends it to a shared, bounded buffer. Subscribers only keep a cursor
+    (the last event id they sent) and yield the same frame objects from the
+    buffer, so a notification is never copied per subscriber. A subscriber
+    resuming from an id older than the buffer is caught up from `backfill`.
+    """
+
+    def __init__(self, backfill, buffer_size=1000):
+        self._backfill = backfill
+        self._buffer_size = buffer_size
+        self._ids = []
+        self._frames = []
+        self._condition = threading.Condition()
+        self.subscribers = 0
+
+    def publish(self, notifications):
+        frames = [(n['id'], facilitator_key(n), encode_event(n)) for n in notifications]
+        with self._condition:
+            for frame in frames:
+                self._ids.append(frame[0])
+                self._frames.append(frame)
+            # Trim in chunks so the buffer is not shifted on every publish
+            if len(self._frames) > 2 * self._buffer_size:
+                del self._ids[:-self._buffer_size]
+                del self._frames[:-self._buffer_size]
+            self._condition.notify_all()
+
+    def latest_id(self):
+        with self._condition:
+            return self._ids[-1] if self._ids else 0
+
+    def _frames_after(self, cursor):
+        return self._frames[bisect_right(self._ids, cursor):]
+
+    def subscribe(self, facilitator_id=None, last_event_id=None, heartbeat=15):
+        """Yield SSE frames for one subscriber, starting after last_event_id or from now"""
+        yield b'retry: 3000\n\n'
+
+        with self._condition:
+            cursor = self._ids[-1] if self._ids else 0
+            oldest = self._ids[0] if self._ids else None
+        if last_event_id is not None and last_event_id < cursor:
+            if oldest is None or last_event_id < oldest - 1:
+                # The buffer no longer reaches back far enough; replay older ones from the store
+                missed = self._backfill(last_event_id, facilitator_id)
+                missed = [n for n in missed if oldest is None or n['id'] < oldest]
+                for notification in missed:
+                    yield encode_event(notification)
+                if missed:
+                    last_event_id = missed[-1]['id']
+            cursor = last_event_id
+
+        with self._condition:
+            self.subscribers += 1
+        try:
+            while True:
+                with self._condition:
+                    frames = self._frames_after(cursor)
+                    if not frames:
+                        self._condition.wait(heartbeat)
+                        frames = self._frames_after(cursor)
+                if not frames:
+                    yield b': keep-alive\n\n'
+                    continue
+                cursor = frames[-1][0]
+                for _, frame_facilitator, frame in frames:
+                    if facilitator_id is None or frame_facilitator == facilitator_id:
+                        yield frame
+        finally:
+            with self._condition:
+                self.subscribers -= 1
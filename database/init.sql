@@ -33,16 +33,19 @@ CREATE TABLE IF NOT EXISTS events (
     price DECIMAL(10,2) NOT NULL DEFAULT 0.00,
     currency VARCHAR(3) NOT NULL DEFAULT 'INR',
     is_active BOOLEAN DEFAULT TRUE,
+    deleted_at TIMESTAMP NULL,
     user_id INTEGER NOT NULL,
     created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
     updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
     FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE CASCADE
 );
 
--- Create bookings table
+-- Create bookings table, range-partitioned by created_at month (partitions are created below
+-- and kept ahead by `flask partitions ensure`); unique keys must include the partition key,
+-- so booking_reference is kept unique by booking_references below
 CREATE TABLE IF NOT EXISTS bookings (
-    id SERIAL PRIMARY KEY,
-    booking_reference VARCHAR(50) UNIQUE NOT NULL,
+    id SERIAL,
+    booking_reference VARCHAR(50) NOT NULL,
     status VARCHAR(20) NOT NULL DEFAULT 'confirmed',
     notes TEXT,
     payment_status VARCHAR(20) NOT NULL DEFAULT 'pending',
@@ -52,25 +55,58 @@ CREATE TABLE IF NOT EXISTS bookings (
     crm_notified BOOLEAN DEFAULT FALSE,
     user_id INTEGER,
     event_id INTEGER,
-    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    created_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
     updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (id, created_at),
     FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE CASCADE,
     FOREIGN KEY (event_id) REFERENCES events(id) ON DELETE CASCADE
+) PARTITION BY RANGE (created_at);
+
+-- Create booking_references table (unpartitioned, one row per booking)
+CREATE TABLE IF NOT EXISTS booking_references (
+    booking_reference VARCHAR(50) PRIMARY KEY,
+    booking_id INTEGER NOT NULL,
+    booking_created_at TIMESTAMP NOT NULL
 );
 
--- Create transactions table
+-- Create transactions table, partitioned like bookings. booking_id has no foreign key:
+-- bookings.id alone is not unique to Postgres, so nothing can reference it
 CREATE TABLE IF NOT EXISTS transactions (
-    id SERIAL PRIMARY KEY,
+    id SERIAL,
     booking_id INTEGER NOT NULL,
     payment_id VARCHAR(100) NOT NULL,
     amount DECIMAL(10,2) NOT NULL,
     currency VARCHAR(3) NOT NULL DEFAULT 'INR',
     status VARCHAR(20) NOT NULL DEFAULT 'pending',
     payment_method VARCHAR(20) NOT NULL DEFAULT 'razorpay',
-    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    created_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
     updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-    FOREIGN KEY (booking_id) REFERENCES bookings(id) ON DELETE CASCADE
-);
+    PRIMARY KEY (id, created_at)
+) PARTITION BY RANGE (created_at);
+
+-- Monthly partitions from this month to three months ahead, and a default partition for rows
+-- outside them so inserts never fail if `flask partitions ensure` falls behind
+CREATE TABLE IF NOT EXISTS bookings_default PARTITION OF bookings DEFAULT;
+CREATE TABLE IF NOT EXISTS transactions_default PARTITION OF transactions DEFAULT;
+
+DO $$
+DECLARE
+    month DATE := date_trunc('month', CURRENT_DATE);
+    parent TEXT;
+BEGIN
+    WHILE month <= date_trunc('month', CURRENT_DATE) + INTERVAL '3 months' LOOP
+        FOREACH parent IN ARRAY ARRAY['bookings', 'transactions'] LOOP
+            EXECUTE format(
+                'CREATE TABLE IF NOT EXISTS %I PARTITION OF %I FOR VALUES FROM (%L) TO (%L)',
+                parent || '_' || to_char(month, 'YYYY_MM'), parent, month, (month + INTERVAL '1 month')::date
+            );
+        END LOOP;
+        month := (month + INTERVAL '1 month')::date;
+    END LOOP;
+END $$;
+
+CREATE INDEX IF NOT EXISTS ix_bookings_event_id_user_id ON bookings (event_id, user_id);
+CREATE INDEX IF NOT EXISTS ix_transactions_booking_id ON transactions (booking_id);
 
 -- Create crm_notifications table
 CREATE TABLE IF NOT EXISTS crm_notifications (
@@ -78,8 +114,104 @@ CREATE TABLE IF NOT EXISTS crm_notifications (
     booking_id INTEGER,
     status VARCHAR(20) NOT NULL,
     sent_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-    response TEXT,
-    FOREIGN KEY (booking_id) REFERENCES bookings(id) ON DELETE CASCADE
+    response TEXT
+);
+
+-- Create waitlist_entries table
+CREATE TABLE IF NOT EXISTS waitlist_entries (
+    id SERIAL PRIMARY KEY,
+    event_id INTEGER NOT NULL,
+    user_id INTEGER NOT NULL,
+    status VARCHAR(20) NOT NULL DEFAULT 'waiting',
+    notes TEXT,
+    promoted_at TIMESTAMP NULL,
+    expires_at TIMESTAMP NULL,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    FOREIGN KEY (event_id) REFERENCES events(id) ON DELETE CASCADE,
+    FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE CASCADE
+);
+
+CREATE INDEX IF NOT EXISTS ix_waitlist_entries_event_status_id ON waitlist_entries (event_id, status, id);
+
+-- Create event_reminders table (sent-state of booking reminders)
+CREATE TABLE IF NOT EXISTS event_reminders (
+    id SERIAL PRIMARY KEY,
+    booking_id INTEGER NOT NULL,
+    reminder_window VARCHAR(10) NOT NULL,
+    status VARCHAR(20) NOT NULL DEFAULT 'claimed',
+    remind_at TIMESTAMP NOT NULL,
+    claimed_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    sent_at TIMESTAMP NULL,
+    CONSTRAINT uq_event_reminders_booking_window UNIQUE (booking_id, reminder_window)
+);
+
+CREATE INDEX IF NOT EXISTS ix_event_reminders_status_claimed_at ON event_reminders (status, claimed_at);
+
+-- Nothing can reference bookings, so this stands in for ON DELETE CASCADE from the tables keyed
+-- on booking_id: deleting a booking, directly or through its user or event, deletes their rows.
+-- Rows moved out of the default partition by `flask partitions ensure` keep theirs
+CREATE OR REPLACE FUNCTION delete_booking_dependents() RETURNS trigger AS $$
+BEGIN
+    IF current_setting('partitions.moving_rows', true) = 'on' THEN
+        RETURN OLD;
+    END IF;
+    DELETE FROM transactions WHERE booking_id = OLD.id;
+    DELETE FROM crm_notifications WHERE booking_id = OLD.id;
+    DELETE FROM event_reminders WHERE booking_id = OLD.id;
+    DELETE FROM booking_references WHERE booking_id = OLD.id;
+    RETURN OLD;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE TRIGGER bookings_delete_dependents AFTER DELETE ON bookings
+    FOR EACH ROW EXECUTE FUNCTION delete_booking_dependents();
+
+CREATE INDEX IF NOT EXISTS ix_events_start_datetime ON events (start_datetime);
+
+-- Create booking_stats_buckets table (pre-aggregated facilitator analytics)
+CREATE TABLE IF NOT EXISTS booking_stats_buckets (
+    id SERIAL PRIMARY KEY,
+    facilitator_id INTEGER NOT NULL,
+    granularity VARCHAR(10) NOT NULL,
+    bucket_start DATE NOT NULL,
+    bookings INTEGER NOT NULL DEFAULT 0,
+    cancellations INTEGER NOT NULL DEFAULT 0,
+    revenue DECIMAL(12,2) NOT NULL DEFAULT 0,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    CONSTRAINT uq_booking_stats_buckets_key UNIQUE (facilitator_id, granularity, bucket_start),
+    FOREIGN KEY (facilitator_id) REFERENCES users(id) ON DELETE CASCADE
+);
+
+-- Create customer_summaries table (per-facilitator customer list, kept current on booking writes)
+CREATE TABLE IF NOT EXISTS customer_summaries (
+    id SERIAL PRIMARY KEY,
+    facilitator_id INTEGER NOT NULL,
+    user_id INTEGER NOT NULL,
+    name VARCHAR(100),
+    email VARCHAR(120),
+    search_name VARCHAR(100),
+    search_email VARCHAR(120),
+    total_bookings INTEGER NOT NULL DEFAULT 0,
+    total_spent DECIMAL(12,2) NOT NULL DEFAULT 0,
+    last_booking_at TIMESTAMP NULL,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    CONSTRAINT uq_customer_summaries_facilitator_user UNIQUE (facilitator_id, user_id),
+    FOREIGN KEY (facilitator_id) REFERENCES users(id) ON DELETE CASCADE,
+    FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE CASCADE
+);
+
+CREATE INDEX IF NOT EXISTS ix_customer_summaries_last_booking ON customer_summaries (facilitator_id, last_booking_at, user_id);
+CREATE INDEX IF NOT EXISTS ix_customer_summaries_total_spent ON customer_summaries (facilitator_id, total_spent, user_id);
+CREATE INDEX IF NOT EXISTS ix_customer_summaries_total_bookings ON customer_summaries (facilitator_id, total_bookings, user_id);
+CREATE INDEX IF NOT EXISTS ix_customer_summaries_search_name ON customer_summaries (facilitator_id, search_name text_pattern_ops);
+CREATE INDEX IF NOT EXISTS ix_customer_summaries_search_email ON customer_summaries (facilitator_id, search_email text_pattern_ops);
+
+-- Create segment_generations table (invalidates cached customer segments across workers)
+CREATE TABLE IF NOT EXISTS segment_generations (
+    facilitator_id INTEGER PRIMARY KEY,
+    generation BIGINT NOT NULL DEFAULT 0,
+    FOREIGN KEY (facilitator_id) REFERENCES users(id) ON DELETE CASCADE
 );
 
 -- Insert sample data
@@ -24,4 +24,102 @@ CREATE TABLE IF NOT EXISTS transactions (
     created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
     updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
     FOREIGN KEY (booking_id) REFERENCES bookings(id) ON DELETE CASCADE
-); 
\ No newline at end of file
+); 
+-- Convert bookings and transactions created before partitioning into monthly range partitions
+-- on created_at, as in init.sql. Rows are copied into the new tables, so run this with the API
+-- stopped; the API refuses to start while either table is still unpartitioned
+DO $$
+DECLARE
+    parent TEXT;
+    foreign_key RECORD;
+    month DATE;
+    last_month DATE := date_trunc('month', CURRENT_DATE) + INTERVAL '3 months';
+BEGIN
+    -- Nothing can reference a partitioned table's id alone; the trigger below replaces these
+    IF (SELECT relkind FROM pg_class WHERE relname = 'bookings') = 'r' THEN
+        FOR foreign_key IN
+            SELECT conrelid::regclass AS child, conname FROM pg_constraint
+            WHERE contype = 'f' AND confrelid = 'bookings'::regclass
+        LOOP
+            EXECUTE format('ALTER TABLE %s DROP CONSTRAINT %I', foreign_key.child, foreign_key.conname);
+        END LOOP;
+    END IF;
+
+    FOREACH parent IN ARRAY ARRAY['bookings', 'transactions'] LOOP
+        CONTINUE WHEN (SELECT relkind FROM pg_class WHERE relname = parent) <> 'r';
+
+        EXECUTE format('UPDATE %I SET created_at = CURRENT_TIMESTAMP WHERE created_at IS NULL', parent);
+        EXECUTE format('CREATE TABLE %I (LIKE %I INCLUDING DEFAULTS) PARTITION BY RANGE (created_at)',
+                       parent || '_partitioned', parent);
+        EXECUTE format('ALTER TABLE %I ALTER COLUMN created_at SET NOT NULL, ADD PRIMARY KEY (id, created_at)',
+                       parent || '_partitioned');
+        -- The id sequence outlives the old table
+        EXECUTE format('ALTER SEQUENCE %s OWNED BY %I.id', pg_get_serial_sequence(parent, 'id'), parent || '_partitioned');
+
+        -- A partition for every month from the oldest row to three months ahead, and the default
+        EXECUTE format('SELECT date_trunc(''month'', min(created_at))::date FROM %I', parent) INTO month;
+        month := LEAST(COALESCE(month, last_month), date_trunc('month', CURRENT_DATE)::date);
+        WHILE month <= last_month LOOP
+            EXECUTE format(
+                'CREATE TABLE %I PARTITION OF %I FOR VALUES FROM (%L) TO (%L)',
+                parent || '_' || to_char(month, 'YYYY_MM'), parent || '_partitioned', month, (month + INTERVAL '1 month')::date
+            );
+            month := (month + INTERVAL '1 month')::date;
+        END LOOP;
+        EXECUTE format('CREATE TABLE %I PARTITION OF %I DEFAULT', parent || '_default', parent || '_partitioned');
+
+        EXECUTE format('INSERT INTO %I SELECT * FROM %I', parent || '_partitioned', parent);
+        EXECUTE format('DROP TABLE %I', parent);
+        EXECUTE format('ALTER TABLE %I RENAME TO %I', parent || '_partitioned', parent);
+        IF parent = 'bookings' THEN
+            ALTER TABLE bookings
+                ADD FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE CASCADE,
+                ADD FOREIGN KEY (event_id) REFERENCES events(id) ON DELETE CASCADE;
+        END IF;
+    END LOOP;
+END $$;
+
+CREATE INDEX IF NOT EXISTS ix_bookings_event_id_user_id ON bookings (event_id, user_id);
+CREATE INDEX IF NOT EXISTS ix_transactions_booking_id ON transactions (booking_id);
+
+-- Booking references are kept unique here now that bookings can't hold the constraint
+CREATE TABLE IF NOT EXISTS booking_references (
+    booking_reference VARCHAR(50) PRIMARY KEY,
+    booking_id INTEGER NOT NULL,
+    booking_created_at TIMESTAMP NOT NULL
+);
+
+INSERT INTO booking_references (booking_reference, booking_id, booking_created_at)
+SELECT booking_reference, id, created_at FROM bookings
+ON CONFLICT (booking_reference) DO NOTHING;
+
+-- The trigger below deletes from event_reminders too, which older databases don't have yet
+CREATE TABLE IF NOT EXISTS event_reminders (
+    id SERIAL PRIMARY KEY,
+    booking_id INTEGER NOT NULL,
+    reminder_window VARCHAR(10) NOT NULL,
+    status VARCHAR(20) NOT NULL DEFAULT 'claimed',
+    remind_at TIMESTAMP NOT NULL,
+    claimed_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    sent_at TIMESTAMP NULL,
+    CONSTRAINT uq_event_reminders_booking_window UNIQUE (booking_id, reminder_window)
+);
+
+CREATE INDEX IF NOT EXISTS ix_event_reminders_status_claimed_at ON event_reminders (status, claimed_at);
+
+-- Stands in for the dropped ON DELETE CASCADE foreign keys, as in init.sql
+CREATE OR REPLACE FUNCTION delete_booking_dependents() RETURNS trigger AS $$
+BEGIN
+    IF current_setting('partitions.moving_rows', true) = 'on' THEN
+        RETURN OLD;
+    END IF;
+    DELETE FROM transactions WHERE booking_id = OLD.id;
+    DELETE FROM crm_notifications WHERE booking_id = OLD.id;
+    DELETE FROM event_reminders WHERE booking_id = OLD.id;
+    DELETE FROM booking_references WHERE booking_id = OLD.id;
+    RETURN OLD;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE TRIGGER bookings_delete_dependents AFTER DELETE ON bookings
+    FOR EACH ROW EXECUTE FUNCTION delete_booking_dependents();
@@ -36,6 +36,16 @@ export default function CRMNotifications() {
 
   useEffect(() => {
     fetchNotifications();
+
+    // Live updates; EventSource reconnects by itself and resumes from the last event id
+    const stream = new EventSource('http://localhost:5001/notifications/stream');
+    stream.addEventListener('notification', (event) => {
+      const notification: CRMNotification = JSON.parse((event as MessageEvent).data);
+      setNotifications((current) =>
+        current.some((n) => n.id === notification.id) ? current : [notification, ...current]
+      );
+    });
+    return () => stream.close();
   }, []);
 
   const fetchNotifications = async () => {
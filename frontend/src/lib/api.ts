@@ -29,8 +29,23 @@ api.interceptors.request.use((config) => {
       config.headers = config.headers || {};
       config.headers['Authorization'] = `Bearer ${token}`;
     }
+
+    // Echo our last write so every API worker keeps our reads on the primary database for a moment
+    const lastWrite = sessionStorage.getItem('last_write');
+    if (lastWrite) {
+      config.headers = config.headers || {};
+      config.headers['X-Last-Write'] = lastWrite;
+    }
   }
   return config;
 });
 
+api.interceptors.response.use((response) => {
+  const lastWrite = response.headers['x-last-write'];
+  if (lastWrite && typeof window !== 'undefined') {
+    sessionStorage.setItem('last_write', lastWrite);
+  }
+  return response;
+});
+
 export default api; 
\ No newline at end of file